@@ -11,292 +11,49 @@ try:
 except:
     df_raw = pd.read_csv(file_path, sep=';', header=None, dtype=str, encoding='utf-8')
 
-# A primeira linha contém as datas (ex: Janeiro/2020)
-header_row = df_raw.iloc[0]
+# Remodelagem vetorizada compartilhada com o pipeline (scripts/pipeline_utils.py).
+# A etapa 01 já aplica o mesmo adaptador direto nos brutos ("caged_largo" em cfg.ADAPTADORES),
+# filtrando os municípios TSBio antes; aqui sai a tabela nacional inteira.
+import sys
+from pathlib import Path
+SCRIPTS_DIR = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\scripts")
+sys.path.insert(0, str(SCRIPTS_DIR))
+from pipeline_utils import caged_wide_to_long
 
-# Mapeamento de meses para número
-meses_map = {
-    'Janeiro': 1, 'Fevereiro': 2, 'Março': 3, 'Abril': 4, 'Maio': 5, 'Junho': 6,
-    'Julho': 7, 'Agosto': 8, 'Setembro': 9, 'Outubro': 10, 'Novembro': 11, 'Dezembro': 12
-}
+# Linha 0: "Janeiro/2020" no início de cada bloco; linha 1: métricas; dados a partir da 2.
+# Colunas: Código do Município, Ano, Mês, Estoque, Admissões, Desligamentos, Saldos
+df_final = caged_wide_to_long(df_raw)
 
-processed_data = []
-
-# Iterar pelas colunas. O padrão é:
-# Coluna 0: Código Município
-# Colunas 1 a N: Blocos de 5 colunas (Estoque, Adm, Desl, Saldo, Variação/Separador)
-num_cols = df_raw.shape[1]
-
-for i in range(1, num_cols, 5):
-    # Verificar se ainda temos colunas suficientes (precisamos de pelo menos 4 dados)
-    if i + 3 >= num_cols:
-        break
-        
-    # Ler o cabeçalho da data (apenas na primeira coluna do bloco)
-    header_text = str(header_row[i])
-    
-    if pd.isna(header_text) or header_text.strip() == '' or header_text.lower() == 'nan':
-        continue
-        
-    try:
-        # Separar Mês e Ano (ex: "Janeiro/2020")
-        parts = header_text.split('/')
-        if len(parts) != 2:
-            continue
-            
-        mes_nome = parts[0].strip()
-        ano = int(parts[1].strip())
-        mes_num = meses_map.get(mes_nome, 0)
-        
-        if mes_num == 0: continue
-
-        # Extrair as colunas de dados para este mês
-        # Dados começam na linha 2 (índice 2), pois 0 é cabeçalho data, 1 é cabeçalho métrica vazio
-        # As colunas são: i=Estoque, i+1=Adm, i+2=Desl, i+3=Saldo
-        subset = df_raw.iloc[2:, [0, i, i+1, i+2, i+3]].copy()
-        subset.columns = ['Código do Município', 'Estoque', 'Admissões', 'Desligamentos', 'Saldos']
-        
-        # Adicionar colunas de tempo
-        subset['Ano'] = ano
-        subset['Mês'] = mes_num
-        
-        processed_data.append(subset)
-        
-    except Exception as e:
-        continue
-
-# Concatenar tudo
-if processed_data:
-    df_final = pd.concat(processed_data, ignore_index=True)
-
-    # Limpeza final
-    cols_numericas = ['Estoque', 'Admissões', 'Desligamentos', 'Saldos']
-    for col in cols_numericas:
-        df_final[col] = df_final[col].astype(str).str.replace('.', '', regex=False)
-        df_final[col] = pd.to_numeric(df_final[col], errors='coerce').fillna(0).astype(int)
-
-    # Reordenar colunas
-    df_final = df_final[['Código do Município', 'Ano', 'Mês', 'Estoque', 'Admissões', 'Desligamentos', 'Saldos']]
-    
-    # Remover linhas sem código de município (totais/vazios)
-    df_final = df_final[pd.to_numeric(df_final['Código do Município'], errors='coerce').notna()]
-    
-    # Ordenar
-    df_final = df_final.sort_values(by=['Código do Município', 'Ano', 'Mês'])
-
-    # Salvar
+if df_final is not None and not df_final.empty:
     df_final.to_csv('tabela_reorganizada.csv', index=False, sep=';', encoding='utf-8-sig')
     print("Arquivo processado com sucesso.")
 else:
     print("Nenhum dado pôde ser processado. Verifique o formato do arquivo.")
 
 #%% Ajustar censo AGRO
-import re
+# A etapa 01 lê a tabela do Censo Agro direto (adaptador "censo_agro" em
+# scripts/pipeline_adapters.py): basta copiar o CSV para data/Indicadores/<Categoria>/
+# com "censo agro" no nome. Cada coluna de cfg.CENSO_AGRO_COLUNAS vira um tema,
+# sem gerar um CSV por coluna. Esta célula só confere o que a etapa 01 vai gerar.
+import sys
 from pathlib import Path
-import pandas as pd
-
-# ========= CONFIG =========
-INPUT_CSV = Path(r"C:\Users\luiz.felipe\Downloads\censo_agro_basico_2017_v2.csv")  # <- ajuste
-OUT_DIR = Path(r"C:\Users\luiz.felipe\Downloads\censo_agro_2017_por_coluna_v2")       # <- ajuste
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-MUN_COL = "Código do Município"
-OUT_SEP = ";"          # bom para Excel pt-BR
-OUT_ENCODING = "utf-8-sig"
-
-# Se quiser forçar quais colunas virarão arquivos, coloque aqui (opcional).
-# Se deixar [] ou None, exporta todas (exceto MUN_COL).
-COLUNAS_ALVO = [
-    "Estabelecimento Agropecuário",
-    "Área média (ha)",
-    "Média de pessoal ocupado por estabelecimento",
-    "Média da área de lavouras por adubadeira (ha)",
-    "Média da área de lavouras por colheitadeira (ha)",
-    "Média da área de lavouras por semeadeira (ha)",
-    "Média da área de lavouras por trator (ha)",
-    "Atividade-Lavoura Temporária (%)",
-    "Atividade-Lavoura Permanente (%)",
-    "Atividade-Pecuária (%)",
-    "Atividade-Horticultura&Floricultura (%)",
-    "Atividade-Sementes&Mudas (%)",
-    "Atividade-Produção Florestal (%)",
-    "Atividade-Pesca (%)",
-    "Atividade-Aquicultura (%)",
-    "Uso das terras-Lavoura (%)",
-    "Uso das terras-Pastagem (%)",
-    "Aves-Corte (%)",
-    "Aves-Ovos (%)",
-    "Bovinos-Corte (%)",
-    "Bovinos-Leite (%)",
-    "Rendimento-Arroz (kg/ha)",
-    "Rendimento-Cana (kg/ha)",
-    "Rendimento-Mandioca (kg/ha)",
-    "Rendimento-Milho (kg/ha)",
-    "Rendimento-Soja (kg/ha)",
-    "Rendimento-Trigo (kg/ha)",
-    "Rendimento-Cacau (kg/ha)",
-    "Rendimento-Café (kg/ha)",
-    "Rendimento-Laranja (kg/ha)",
-    "Rendimento-Uva (kg/ha)",
-    "Carga de Bovinos (n/ha)",
-    "Cisterna (%)",
-    "Utilização de Agrotóxicos (%)",
-    "Despesa com Agrotóxicos (%)",
-    "Uso de irrigação (%)",
-    "Assistência Técnica (%)",
-    "Agricultura familiar (%)",
-    "Produtor com escolaridade até Ensino Fundamental (%)",
-]
-# =========================
-
-
-def sniff_sep_and_skiprows(path: Path):
-    """
-    Detecta separador (;, , ou tab) e identifica se existe linha inicial 'sep=;'
-    (muito comum em CSV exportado pelo Excel).
-    Retorna (sep, skiprows).
-    """
-    for enc in ("utf-8-sig", "latin1"):
-        try:
-            with open(path, "r", encoding=enc, errors="replace") as f:
-                first = f.readline()
-                second = f.readline()
-
-            skiprows = 0
-            header_line = first
-
-            if first.lower().startswith("sep="):
-                # a 1ª linha é "sep=;" então o header real é a 2ª linha
-                skiprows = 1
-                header_line = second
-
-            counts = {s: header_line.count(s) for s in [";", ",", "\t"]}
-            best = max(counts, key=counts.get)
-            sep = best if counts[best] > 0 else ";"
-            return sep, skiprows
-        except Exception:
-            pass
 
-    return ";", 0
-
-
-def safe_filename(name: str) -> str:
-    """Remove caracteres ruins pra Windows e encurta."""
-    name = (name or "").strip()
-    name = re.sub(r"\s+", " ", name)
-
-    name = name.replace("%", "pct")
-    name = name.replace("/", "-")
-    name = name.replace("\\", "-")
-    name = re.sub(r"[()]", "", name)
-    name = re.sub(r'[<>:"|?*]+', "_", name)
-
-    name = name.strip()
-    return name[:160] if len(name) > 160 else name
-
-
-def normalize_cols(cols):
-    """Padroniza espaços duplicados e remove BOM estranhos."""
-    out = []
-    for c in cols:
-        c = str(c).replace("\ufeff", "").strip()
-        c = re.sub(r"\s+", " ", c)
-        out.append(c)
-    return out
-
-
-def normalize_mun_code(series: pd.Series) -> pd.Series:
-    """
-    Normaliza código IBGE municipal para 7 dígitos.
-    Corrige o problema clássico: 1508159.0 -> "1508159" (não vira "15081590").
-    Estratégia:
-      1) converte para string e remove sufixo .0
-      2) extrai o primeiro bloco com exatamente 7 dígitos
-      3) fallback: remove não-dígitos e zfill(7) se ficar <=7
-      4) valida tamanho final
-    """
-    raw = series.astype(str).str.strip()
+# Funções compartilhadas com o pipeline (scripts/)
+SCRIPTS_DIR = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\scripts")
+sys.path.insert(0, str(SCRIPTS_DIR))
+from pipeline_adapters import encontrar_adaptador
 
-    # remove sufixo decimal típico do float lido como texto (ex.: "1508159.0")
-    raw = raw.str.replace(r"\.0+$", "", regex=True)
-
-    # pega exatamente 7 dígitos em qualquer lugar do texto (resolve "15081590" -> "1508159")
-    extracted = raw.str.extract(r"(\d{7})", expand=False)
-
-    # fallback: remove tudo que não for dígito
-    digits = raw.str.replace(r"\D+", "", regex=True)
-
-    # só aplica zfill se não estiver vazio e tiver <=7 (pra não inventar coisa em códigos grandes)
-    digits = digits.where(digits.eq(""), digits.where(digits.str.len() > 7, digits.str.zfill(7)))
-
-    out = extracted.fillna(digits).fillna("")
-
-    # valida: se não for vazio e não tiver 7 dígitos, zera e avisa
-    bad = (out != "") & (out.str.len() != 7)
-    if bad.any():
-        print("⚠️ Atenção: existem códigos fora do padrão (não 7 dígitos). Exemplos:")
-        print(raw.loc[bad].head(10).tolist())
-        out = out.mask(bad, "")
-
-    return out
-
-
-# ====== LEITURA ======
-sep, skiprows = sniff_sep_and_skiprows(INPUT_CSV)
-
-df = None
-last_err = None
-for enc in ("utf-8-sig", "latin1"):
-    try:
-        df = pd.read_csv(
-            INPUT_CSV,
-            sep=sep,
-            encoding=enc,
-            low_memory=False,
-            skiprows=skiprows
-        )
-        break
-    except Exception as e:
-        last_err = e
-
-if df is None:
-    raise RuntimeError(f"Falha ao ler {INPUT_CSV}: {last_err}")
-
-df.columns = normalize_cols(df.columns)
-
-# garante que a coluna do município exista
-if MUN_COL not in df.columns:
-    raise ValueError(
-        f"Coluna '{MUN_COL}' não encontrada.\n"
-        f"Colunas disponíveis: {list(df.columns)}"
-    )
-
-# corrige / normaliza código do município (7 dígitos)
-df[MUN_COL] = normalize_mun_code(df[MUN_COL])
-
-# se COLUNAS_ALVO estiver vazia, processa tudo exceto MUN_COL
-cols_to_export = COLUNAS_ALVO if COLUNAS_ALVO else [c for c in df.columns if c != MUN_COL]
-
-# valida colunas
-missing = [c for c in cols_to_export if c not in df.columns]
-if missing:
-    print("⚠️ Estas colunas não foram encontradas e serão ignoradas:")
-    for c in missing:
-        print(" -", c)
-    cols_to_export = [c for c in cols_to_export if c in df.columns]
-
-print(f"Separador detectado: '{sep}' | skiprows: {skiprows}")
-print(f"Vai gerar {len(cols_to_export)} arquivos em: {OUT_DIR}")
-
-# ====== EXPORTA UM CSV POR COLUNA ======
-for col in cols_to_export:
-    out_name = f"IBGE Censo Agro 2017 - {safe_filename(col)} - Municípios.csv"
-    out_path = OUT_DIR / out_name
-
-    out_df = df[[MUN_COL, col]].copy()
-    out_df.to_csv(out_path, index=False, sep=OUT_SEP, encoding=OUT_ENCODING)
+INPUT_CSV = Path(r"C:\Users\luiz.felipe\Downloads\censo_agro_basico_2017_v2.csv")  # <- ajuste
 
-print("✅ Concluído.")
+achado = encontrar_adaptador(INPUT_CSV)
+if not achado:
+    print("⚠️ Nenhum adaptador reconhece o arquivo (nome sem 'censo agro' ou sem 'Código do Município').")
+else:
+    adaptador, cab = achado
+    temas = adaptador.temas(INPUT_CSV, cab)
+    print(f"Adaptador: {adaptador.nome} | separador: '{cab.dialeto.sep}' | {len(temas)} temas")
+    for fonte, tema, recorte in temas:
+        print(f" - {fonte} - {tema} - {recorte}")
 
 # %% Ajustar Vulnerabilidade
 from __future__ import annotations
@@ -1,6 +1,5 @@
 # %% Imports
 import re
-import csv
 import sys
 import unicodedata
 from pathlib import Path
@@ -16,13 +15,10 @@ from tqdm import tqdm
 ROOT_LOCAL = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\data\Indicadores")
 OUT_DIR    = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\data\Indicadores_processado_por_tema")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+SCRIPTS_DIR = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\scripts")  # pipeline_*.py
 
 MUN_COL = "Código do Município"
 
-# Entrada: separador automático
-CSV_SEP_DEFAULT = ";"
-SEPS_CANDIDATES = [";", ",", "\t"]
-
 # Saída
 OUT_CSV_SEP = ";"          # recomendado para Excel pt-BR
 OUT_ENCODING = "utf-8-sig"
@@ -100,68 +96,13 @@ def parse_parts_from_filename(filename: str):
 
     return fonte, tema, recorte
 
-# Leitura CSV com auto-detect separador + encoding
-def detect_csv_sep(path: Path, encoding: str) -> str:
-    """Detecta o separador pelo cabeçalho (lida com linha opcional `sep=;`)."""
-    try:
-        with open(path, "r", encoding=encoding, errors="replace") as f:
-            header = f.readline()
-            if header.lower().startswith("sep="):
-                header = f.readline()
-    except Exception:
-        return CSV_SEP_DEFAULT
-
-    if not header:
-        return CSV_SEP_DEFAULT
-
-    counts = {s: header.count(s) for s in SEPS_CANDIDATES}
-    best = max(counts, key=counts.get)
-    return best if counts[best] > 0 else CSV_SEP_DEFAULT
+# Leitura CSV com auto-detect separador + encoding: mesma leitura dos scripts (pipeline_utils),
+# com o cache de sniff persistido ao lado das saídas (arquivos sem mudança não são re-sniffados)
+sys.path.insert(0, str(SCRIPTS_DIR))
+from pipeline_utils import load_sniff_cache, read_csv_local, save_sniff_cache
 
-
-def read_csv_local(path: Path) -> pd.DataFrame:
-    """Lê CSV detectando automaticamente `;` vs `,` (e tab)."""
-    last_err = None
-
-    for enc in ("utf-8-sig", "latin1"):
-        try:
-            sep = detect_csv_sep(path, enc)
-            df = pd.read_csv(path, sep=sep, encoding=enc)
-
-            # Sanidade: se não achou a coluna-chave, tenta separadores alternativos
-            if MUN_COL not in df.columns:
-                for s in SEPS_CANDIDATES:
-                    if s == sep:
-                        continue
-                    try:
-                        df2 = pd.read_csv(path, sep=s, encoding=enc)
-                        if MUN_COL in df2.columns:
-                            df = df2
-                            break
-                    except Exception:
-                        pass
-
-            return df
-
-        except UnicodeDecodeError as e:
-            last_err = e
-            continue
-        except Exception as e:
-            last_err = e
-            continue
-
-    # Último recurso: tentar o Sniffer do Python
-    try:
-        with open(path, "r", encoding="latin1", errors="replace") as f:
-            sample = f.read(8192)
-        try:
-            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
-            sep = dialect.delimiter
-        except Exception:
-            sep = CSV_SEP_DEFAULT
-        return pd.read_csv(path, sep=sep, encoding="latin1")
-    except Exception:
-        raise last_err
+CACHE_SNIFF = OUT_DIR / "_cache_sniff.json"
+load_sniff_cache(CACHE_SNIFF)
 
 
 # Construir mapas TSBio
@@ -179,14 +120,19 @@ print("ROOT_LOCAL existe?", ROOT_LOCAL.exists())
 print("Municípios esperados (TSBio):", len(expected_muns))
 print("Saída:", OUT_DIR)
 
-csv_files = sorted(ROOT_LOCAL.rglob("*.csv"))
+# Inventário persistido dos brutos (scripts/pipeline_inventario.py): só arquivos novos ou
+# alterados são revisitados; categoria/fonte/tema saem do índice, sem reinterpretar nomes.
+import pipeline_inventario as inventario
+
+brutos = inventario.atualizar(ROOT_LOCAL, OUT_DIR / "_inventario_brutos.sqlite")
+csv_files = [b.path for b in brutos]
 print("\nTotal de CSVs encontrados:", len(csv_files))
 if csv_files:
     print("Exemplo de arquivo:", csv_files[0])
 
 # categorias (top)
 if DEBUG_TEMAS and csv_files:
-    counts_cat = Counter(get_categoria_from_path(ROOT_LOCAL, p) for p in csv_files)
+    counts_cat = Counter(b.categoria for b in brutos)
     print("\nTop categorias por quantidade:")
     for cat, n in counts_cat.most_common(15):
         print(f" - {cat}: {n}")
@@ -197,11 +143,10 @@ if DEBUG_TEMAS and csv_files:
     tema_counter = Counter()
     tema_raw_map = {}
 
-    for p in csv_files:
-        fonte, tema, recorte = parse_parts_from_filename(p.name)
-        tn = norm_txt(tema)
+    for b in brutos:
+        tn = norm_txt(b.tema)
         tema_counter[tn] += 1
-        tema_raw_map.setdefault(tn, tema)
+        tema_raw_map.setdefault(tn, b.tema)
 
     total = len(csv_files)
     print("\n========== DEBUG: TEMAS ENCONTRADOS ==========")
@@ -297,6 +242,8 @@ for p in tqdm(csv_files, desc="Lendo CSVs"):
     buckets[(categoria, fonte, tema)].append(df)
     processed += 1
 
+save_sniff_cache(CACHE_SNIFF)
+
 print("\nResumo leitura:")
 print(" - Buckets (categoria+fonte+tema):", len(buckets))
 print(" - Arquivos processados:", processed)
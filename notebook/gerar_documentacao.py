@@ -10,13 +10,16 @@
 
 from pathlib import Path
 import pandas as pd
+import numpy as np
 import csv
 import re
+import sys
 
 # =======================
 # CONFIG
 # =======================
 OUT_DIR = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\data\Indicadores_processado_por_tema")
+SCRIPTS_DIR = Path(r"C:\Users\luiz.felipe\Desktop\FLP\MapiaEng\GitHub\fas_tsbio\scripts")  # pipeline_*.py
 
 DEFAULT_SAMPLE_ROWS = 5000
 SEPS_CANDIDATES = [";", ",", "\t"]
@@ -31,6 +34,9 @@ MAX_COLS_MD = 300  # None = sem limite
 OUT_XLSX = OUT_DIR / "_documentacao.xlsx"
 OUT_MD   = OUT_DIR / "_documentacao.md"
 
+sys.path.insert(0, str(SCRIPTS_DIR))
+from pipeline_utils import parse_numero_br  # mesmo parser de números da etapa 04
+
 # =======================
 # FUNÇÕES DE LEITURA
 # =======================
@@ -117,19 +123,11 @@ def infer_semantic_type(s: pd.Series, colname: str) -> str:
     if uniq and uniq.issubset(BOOL_SET):
         return "booleano"
 
-    # numérico: tenta pt-BR e en-US
-    s_pt = s_str.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
-    num_pt = pd.to_numeric(s_pt, errors="coerce")
-    ratio_pt = num_pt.notna().mean()
-
-    s_en = s_str.str.replace(",", "", regex=False)
-    num_en = pd.to_numeric(s_en, errors="coerce")
-    ratio_en = num_en.notna().mean()
-
-    if max(ratio_pt, ratio_en) >= 0.9:
-        num = num_pt if ratio_pt >= ratio_en else num_en
-        frac = (num.dropna() % 1 != 0).mean() if not num.dropna().empty else 0
-        return "decimal" if frac > 0 else "inteiro"
+    # numérico: pt-BR ou en-US, mesmo parser da etapa 04 (uma conversão só)
+    num = parse_numero_br(s_str)
+    num = num[~np.isnan(num)]
+    if len(num) / len(s_str) >= 0.9:
+        return "decimal" if (num % 1 != 0).any() else "inteiro"
 
     return "texto"
 
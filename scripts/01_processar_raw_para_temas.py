@@ -12,17 +12,35 @@ Regras:
 
 from __future__ import annotations
 
-from collections import defaultdict
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import unicodedata
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Deque, Dict, Iterator, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+import pipeline_adapters as adaptadores
 import pipeline_config as cfg
+import pipeline_inventario as inventario
+import pipeline_metrics as metrics
+from pipeline_metrics import Fases
 from pipeline_utils import (
-    safe_filename, parse_parts_from_filename, read_csv_local, load_dictionary,
-    normalize_column_name, zfill_mun, build_indicador_id,
+    safe_filename, read_csv_local, load_dictionary, load_dtype_plan, load_column_kinds,
+    normalize_column_name, build_indicador_id, file_sha1,
+    read_csv_mun_filtered, build_tsbio_lookup, match_tsbio,
+    LeituraAntecipada, SNIFF_CACHE, load_sniff_cache, save_sniff_cache, sniff_cache_entry,
+    write_xlsx_stream, parquet_sidecar_path, constant_categorical, concat_frames,
+    CoverageMatrix, coverage_keys,
 )
 
 # ---- Colunas a remover nos arquivos por TEMA (saída) ----
@@ -84,165 +102,925 @@ def find_mun_col(cols: List[str]) -> str | None:
             return c
     return None
 
-def processar() -> pd.DataFrame:
-    cfg.ensure_dirs()
+# ---- Ingestão por arquivo (roda no processo principal ou em workers) ----
+# Contexto compartilhado (dicionário + municípios TSBio). Nos workers é preenchido
+# pelo initializer do pool; não dependemos de `cfg` lá dentro, pois no Windows o
+# worker reimporta o módulo do zero (spawn).
+_CTX: Dict = {}
 
-    assert cfg.ROOT_RAW.exists(), f"ROOT_RAW não encontrado: {cfg.ROOT_RAW}"
-    assert cfg.DICT_PATH.exists(), f"DICT_PATH não encontrado: {cfg.DICT_PATH}"
+def _init_ingestao(ctx: Dict) -> None:
+    _CTX.clear()
+    _CTX.update(ctx)
+    SNIFF_CACHE.update(ctx.get("sniff_cache", {}))
+    PLANOS.update(ctx.get("planos", {}))
 
-    syn_map = load_dictionary(cfg.DICT_PATH)
+# ---- Planos de ingestão por cabeçalho (persistidos em cfg.CACHE_PLANOS) ----
+# Brutos da mesma fonte repetem o cabeçalho: renomeação, coluna de município, dtypes e
+# papel das colunas saem de um dicionário por hash(cabeçalho + versão do plano), em vez de
+# `normalize_column_name`/`find_mun_col` coluna a coluna em todo arquivo.
+_PLANO_VERSAO = 1
+# hash -> {"versao", "renomear", "mun", "mun_idx", "dtypes", "papeis"}
+PLANOS: Dict[str, Dict] = {}
+_PLANOS_NOVOS: Dict[str, Dict] = {}  # criados neste processo (workers devolvem ao principal)
+
+def _versao_planos(dict_path: Path, tipada: bool) -> str:
+    """Muda quando o dicionário, a leitura tipada ou a regra dos planos mudam."""
+    return f"{_PLANO_VERSAO}|{file_sha1(dict_path)}|{int(tipada)}"
+
+def _plano_ingestao(cols: List[str]) -> Dict:
+    """Plano do cabeçalho `cols` (nomes brutos, na ordem do arquivo), do cache ou montado agora."""
+    versao = _CTX["versao_planos"]
+    chave = hashlib.sha1("\x1f".join([versao, *map(str, cols)]).encode("utf-8")).hexdigest()
+    plano = PLANOS.get(chave)
+    if plano is None:
+        tipos, papeis = _CTX["dtype_plan"], _CTX["papeis"]
+        renomear = {c: normalize_column_name(c, _CTX["syn_map"]) for c in cols}
+        canon = [renomear[c] for c in cols]
+        mun = find_mun_col(canon)
+        plano = {
+            "versao": versao,
+            "renomear": renomear,
+            "mun": mun,
+            "mun_idx": canon.index(mun) if mun else None,
+            # dtypes por nome BRUTO (o que o `read_csv` recebe)
+            "dtypes": {c: tipos[k] for c, k in renomear.items() if k in tipos},
+            # papel pelo `kind` do dicionário; colunas fora dele são candidatas a valor
+            "papeis": {k: papeis.get(k, "valor") for k in canon if k},
+        }
+        PLANOS[chave] = _PLANOS_NOVOS[chave] = plano
+    return plano
+
+def _idx_mun_col(raw_cols: List[str]) -> int | None:
+    """Índice da coluna de município no cabeçalho BRUTO (mesma regra do DataFrame)."""
+    return _plano_ingestao(raw_cols)["mun_idx"]
+
+def _dtype_cols(raw_cols: List[str]) -> Dict[str, str]:
+    """dtypes de leitura pelo plano do dicionário (coluna `dtype`), por nome bruto."""
+    return _plano_ingestao(raw_cols)["dtypes"]
+
+def _planos_novos() -> Dict[str, Dict]:
+    """Planos criados desde a última chamada (para o processo principal persistir)."""
+    novos = dict(_PLANOS_NOVOS)
+    _PLANOS_NOVOS.clear()
+    return novos
+
+def _carregar_planos(path: Path, versao: str) -> None:
+    if not path.exists():
+        return
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return
+    PLANOS.update({k: v for k, v in data.items() if isinstance(v, dict) and v.get("versao") == versao})
+
+def _salvar_planos(path: Path, versao: str) -> None:
+    """Grava os planos da versão atual (dicionário/flags antigos saem do cache)."""
+    vivos = {k: v for k, v in PLANOS.items() if v.get("versao") == versao}
+    path.write_text(json.dumps(vivos, ensure_ascii=False), encoding="utf-8")
+
+def _ingerir_arquivo(item: Tuple[Path, str, str, str, str]) -> Dict:
+    """
+    Lê UM bruto e normaliza/filtra cada tema que ele gera (um só, salvo adaptadores).
+    Retorna dict com status do arquivo ("ok" | "erro") e, em `partes`, um resultado por
+    (categoria, fonte, tema): status ("ok" | "sem_mun" | "vazio") e o DataFrame filtrado.
+    """
+    p, categoria, fonte, tema, recorte = item
+    res = {"arquivo": str(p), "status": "ok", "erro": "", "partes": {}, "sniff": None}
+    # métricas (pipeline_metrics): `fases.tempos` é preenchido ao sair de cada `with`
+    fases = Fases()
+    m = res["metricas"] = {"bytes": p.stat().st_size, "linhas_entrada": None, "linhas_mantidas": 0,
+                           "sep": None, "encoding": None, "prefiltro": False, "adaptador": None,
+                           "fases": fases.tempos}
+
+    # bruto de um adaptador (pipeline_adapters): nome + temas pedidos pelo processo principal
+    nome, pedidos = _CTX.get("adaptados", {}).get(str(p), (None, None))
+    try:
+        with fases("leitura"):
+            if nome:
+                m["adaptador"] = nome
+                partes = [
+                    (c, f, t, df) for c, f, t, df in adaptadores.ADAPTADORES[nome].ler(p, categoria, _CTX["lookup"], m)
+                    if (c, f, t) in pedidos
+                ]
+            else:
+                df = None
+                dtype_for = _dtype_cols if _CTX.get("dtype_plan") else None
+                if _CTX.get("prefiltro_mun"):
+                    df = read_csv_mun_filtered(p, _CTX["prefiltro_chaves"], _idx_mun_col, stats=m, dtype_for=dtype_for)
+                    m["prefiltro"] = df is not None
+                if df is None:
+                    df = read_csv_local(p, dtype_for=dtype_for)
+                    m["linhas_entrada"] = len(df)
+                partes = [(categoria, fonte, tema, df)]
+    except Exception as e:
+        res["status"], res["erro"] = "erro", str(e)
+        res["planos"] = _planos_novos()
+        return res
+    res["sniff"] = sniff_cache_entry(p)
+    if res["sniff"]:
+        m["sep"], m["encoding"] = res["sniff"][1].sep, res["sniff"][1].encoding
+
+    for c, f, t, df in partes:
+        parte = res["partes"][(c, f, t)] = _preparar_parte(df, c, f, t, recorte, fases)
+        m["linhas_mantidas"] += len(parte["df"]) if parte["df"] is not None else 0
+    res["planos"] = _planos_novos()
+    return res
+
+def _anexar_metadados(df: pd.DataFrame, categoria: str, fonte: str, tema: str, recorte: str) -> None:
+    """
+    Metadados mínimos (úteis para rastreabilidade), como categóricas: o texto só é
+    materializado na exportação. `arquivo_origem` vira `arquivo_id` no processo
+    principal (ver `_TABELA_ARQUIVOS_COLS`).
+    """
+    n = len(df)
+    df["indicador_id"] = constant_categorical(build_indicador_id(categoria, fonte, tema), n)
+    df["categoria"] = constant_categorical(categoria, n)
+    df["fonte"] = constant_categorical(fonte, n)
+    df["tema"] = constant_categorical(tema, n)
+    df["recorte_origem"] = constant_categorical(recorte, n)
+
+def _preparar_parte(df: pd.DataFrame, categoria: str, fonte: str, tema: str, recorte: str, fases: Fases) -> Dict:
+    """Normaliza colunas, filtra municípios TSBio e anexa os metadados de um tema."""
+    res = {"status": "ok", "erro": "", "df": None}
+    with fases("normalizacao"):
+        # Normaliza colunas (plano do cabeçalho, ver `_plano_ingestao`)
+        plano = _plano_ingestao(list(df.columns))
+        df = df.rename(columns=plano["renomear"])
+
+        mun_col = plano["mun"]
+        if not mun_col:
+            res["status"] = "sem_mun"
+            return res
+
+        if mun_col != "cod_municipio":
+            df = df.rename(columns={mun_col: "cod_municipio"})
+
+        # Normaliza código + atribui território numa passada só
+        lookup = _CTX["lookup"]
+        cod, pos = match_tsbio(df["cod_municipio"], lookup)
+
+    with fases("filtro"):
+        # Filtra TSBio
+        keep = pos >= 0
+        if not keep.any():
+            res["status"] = "vazio"
+            return res
+        df = df.loc[keep].reset_index(drop=True)
+        pos = pos[keep]
+        df["cod_municipio"] = cod[keep]
+
+        _anexar_metadados(df, categoria, fonte, tema, recorte)
+        df["territorio_id"] = lookup.territorio_id[pos]
+        df["territorio_nome"] = pd.Categorical.from_codes(lookup.nome_code[pos], categories=lookup.nomes)
+
+        # Células da matriz de cobertura (município [x ano]) que este bruto preenche
+        ano = df["ano"] if _CTX.get("cobertura_por_ano") and "ano" in df.columns else None
+        res["cobertura"] = coverage_keys(pos, ano)
+
+    res["df"] = df
+    return res
 
-    expected_muns = set()
-    mun_to_tsbio = {}
-    for t in cfg.TSBIO:
-        tid = int(t["territorio_id"])
-        tname = str(t["territorio_nome"])
-        for m in t["CD_MUN"]:
-            mm = zfill_mun(m)
-            expected_muns.add(mm)
-            mun_to_tsbio[mm] = (tid, tname)
+def _parte(res_arq: Dict, item: Tuple[Path, str, str, str, str]) -> Dict:
+    """Resultado de UM item (bruto x tema) a partir do resultado do arquivo."""
+    p, categoria, fonte, tema, _ = item
+    if res_arq["status"] != "ok":
+        return {"arquivo": str(p), "status": res_arq["status"], "erro": res_arq["erro"], "df": None}
+    parte = res_arq["partes"].pop((categoria, fonte, tema), None)
+    if parte is None:  # tema listado pelo adaptador que a leitura não gerou
+        return {"arquivo": str(p), "status": "vazio", "erro": "", "df": None}
+    return {"arquivo": str(p), **parte}
 
-    csv_files = sorted(cfg.ROOT_RAW.rglob("*.csv"))
-    print(f"CSV brutos encontrados: {len(csv_files)} em {cfg.ROOT_RAW}")
+def _n_workers(n_files: int) -> int:
+    n = int(getattr(cfg, "INGEST_WORKERS", 1) or 0)
+    if n <= 0:
+        n = os.cpu_count() or 1
+    return max(1, min(n, n_files))
 
-    skipped_by_filter = 0
+def _iter_ingestao(itens: List[Tuple[Path, str, str, str, str]], ctx: Dict) -> Iterator[Dict]:
+    """
+    Executa `_ingerir_arquivo` em série ou num pool de processos (cfg.INGEST_WORKERS).
+    Os resultados saem SEMPRE na ordem de `itens`, então buckets e relatórios ficam
+    idênticos ao modo serial. No pool, no máximo cfg.INGEST_JANELA brutos (padrão: 2 por
+    worker) ficam em voo, enviados e ainda não consumidos: resultados prontos não se
+    acumulam no processo principal fora do alcance do teto de memória dos buckets.
+    """
+    n = _n_workers(len(itens))
+    if n == 1:
+        _init_ingestao(ctx)
+        # o próximo bruto já vai sendo lido do disco enquanto o atual é interpretado
+        pre = LeituraAntecipada([it[0] for it in itens], getattr(cfg, "PREFETCH_MB", 0), getattr(cfg, "PREFETCH_THREADS", 2))
+        for _, it in tqdm(zip(pre, itens), total=len(itens), desc="Lendo brutos"):
+            yield _ingerir_arquivo(it)
+        return
 
-    # Buckets por (categoria, fonte, tema)
-    buckets: Dict[Tuple[str, str, str], List[pd.DataFrame]] = defaultdict(list)
+    janela = int(getattr(cfg, "INGEST_JANELA", 0) or 0) or 2 * n
+    janela = max(n, janela)  # menos que 1 por worker deixaria workers parados
+    print(f"⚙️ Ingestão paralela: {n} workers (até {janela} brutos em voo)")
+    with ProcessPoolExecutor(max_workers=n, initializer=_init_ingestao, initargs=(ctx,)) as ex:
+        fila: Deque[Future] = deque()
+        proximos = iter(itens)
+        for it in islice(proximos, janela):
+            fila.append(ex.submit(_ingerir_arquivo, it))
+        try:
+            for _ in tqdm(range(len(itens)), desc="Lendo brutos"):
+                res = fila.popleft().result()
+                for it in islice(proximos, 1):
+                    fila.append(ex.submit(_ingerir_arquivo, it))
+                yield res
+        finally:
+            for f in fila:  # consumidor parou antes do fim (erro/close)
+                f.cancel()
+
+# ---- Buckets com teto de memória (despejo em disco) ----
+Parte = Union[pd.DataFrame, Path]
+
+class Buckets:
+    """
+    Partes (uma por bruto) de cada (categoria, fonte, tema), na ordem de leitura.
+    Quando o total em memória passa de `limite_bytes`, todas as partes em memória
+    vão para arquivos temporários em `pasta` (parquet; pickle se o parquet recusar
+    algum tipo misto). `pop()` devolve o tema inteiro, já relido e concatenado.
+    O teto vale só para o que já está aqui: os brutos em voo da ingestão ficam limitados
+    pela janela de `_iter_ingestao` (cfg.INGEST_JANELA), não por `limite_bytes`.
+    """
+
+    def __init__(self, pasta: Path, limite_bytes: int):
+        self.pasta = pasta
+        self.limite = limite_bytes
+        self.partes: Dict[Tuple[str, str, str], List[Parte]] = defaultdict(list)
+        self.em_memoria = 0
+        self.n_despejos = 0
+        self._seq = 0
 
-    errors = []
-    missing_mun_col = []
+    def add(self, chave: Tuple[str, str, str], df: pd.DataFrame) -> None:
+        self.partes[chave].append(df)
+        if self.limite <= 0:
+            return
+        self.em_memoria += int(df.memory_usage(index=True, deep=True).sum())
+        if self.em_memoria > self.limite:
+            self._despejar()
 
-    for p in tqdm(csv_files, desc="Lendo brutos"):
-        # categoria = 1º nível de pasta abaixo de ROOT_RAW
+    def _despejar(self) -> None:
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        for lista in self.partes.values():
+            for i, parte in enumerate(lista):
+                if isinstance(parte, pd.DataFrame):
+                    lista[i] = self._gravar(parte)
+        self.em_memoria = 0
+        self.n_despejos += 1
+
+    def _gravar(self, df: pd.DataFrame) -> Path:
+        self._seq += 1
+        out = self.pasta / f"{self._seq:07d}.parquet"
         try:
-            rel = p.relative_to(cfg.ROOT_RAW)
-            categoria = rel.parts[0] if len(rel.parts) >= 2 else "(raiz)"
+            df.to_parquet(out, index=False)
+            return out
         except Exception:
-            categoria = "(raiz)"
+            out.unlink(missing_ok=True)
+            out = out.with_suffix(".pkl")
+            df.to_pickle(out)
+            return out
 
-        fonte, tema, recorte = parse_parts_from_filename(p.name)
-        indicador_id = build_indicador_id(categoria, fonte, tema)
+    @staticmethod
+    def _ler(parte: Parte) -> pd.DataFrame:
+        if isinstance(parte, pd.DataFrame):
+            return parte
+        df = pd.read_parquet(parte) if parte.suffix == ".parquet" else pd.read_pickle(parte)
+        parte.unlink(missing_ok=True)
+        return df
 
-        # --- filtros (opcional) ---
-        if not _passa_filtros(categoria, tema):
-            skipped_by_filter += 1
-            continue
+    def chaves(self) -> List[Tuple[str, str, str]]:
+        return list(self.partes)
+
+    def pop(self, chave: Tuple[str, str, str]) -> pd.DataFrame:
+        dfs = [self._ler(p) for p in self.partes.pop(chave)]
+        return concat_frames(dfs)
 
+    def limpar(self) -> None:
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+# ---- Sidecar parquet por tema ----
+def _gravar_parquet_tema(df: pd.DataFrame, path: Path) -> None:
+    """
+    Grava o sidecar tipado. Colunas `object` com tipos misturados (ex.: 12 num bruto e
+    "1.234,5" noutro) viram texto, como sairiam relidas do CSV; nulos continuam nulos.
+    """
+    try:
+        df.to_parquet(path, index=False)
+        return
+    except (TypeError, ValueError) as e:  # ArrowTypeError/ArrowInvalid herdam destes
+        erro = e
+    df = df.copy()
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_object_dtype(s.dtype):
+            df[c] = s.where(s.isna(), s.astype(str))
+    try:
+        df.to_parquet(path, index=False)
+    except Exception:
+        raise erro
+
+# ---- XLSX em segundo plano ----
+def _gravar_xlsx(df: pd.DataFrame, path: Path) -> Tuple[str, float]:
+    """Grava um XLSX; devolve (mensagem de erro (vazia se ok), segundos)."""
+    t0 = time.perf_counter()
+    try:
+        write_xlsx_stream(df, path)
+        return "", time.perf_counter() - t0
+    except Exception as e:
+        return f"excel_write_error: {e}", time.perf_counter() - t0
+
+class EscritorXlsx:
+    """
+    Pool de processos para os XLSX por tema (cfg.XLSX_WORKERS). No máximo 2 tabelas
+    por worker ficam na fila (a memória não cresce com o nº de temas). `finalizar()`
+    espera tudo e devolve os erros na ordem de envio.
+    """
+
+    def __init__(self, n_temas: int):
+        n = int(getattr(cfg, "XLSX_WORKERS", 1) or 0)
+        if n <= 0:
+            n = os.cpu_count() or 1
+        self.n = max(1, min(n, n_temas))
+        self.ex = ProcessPoolExecutor(max_workers=self.n) if self.n > 1 else None
+        self.envios: List[Tuple[Path, Future | Tuple[str, float]]] = []
+        if self.ex is not None:
+            print(f"⚙️ XLSX em segundo plano: {self.n} workers")
+
+    def submit(self, df: pd.DataFrame, path: Path) -> None:
+        if self.ex is None:
+            self.envios.append((path, _gravar_xlsx(df, path)))
+            return
+        pendentes = {f for _, f in self.envios if isinstance(f, Future) and not f.done()}
+        while len(pendentes) >= 2 * self.n:
+            _, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+        self.envios.append((path, self.ex.submit(_gravar_xlsx, df, path)))
+
+    def finalizar(self) -> List[Tuple[str, str]]:
+        erros = []
+        for path, f in tqdm(self.envios, desc="Gravando XLSX", disable=self.ex is None):
+            try:
+                erro, seg = f.result() if isinstance(f, Future) else f
+            except Exception as e:  # worker morreu (ex.: falta de memória)
+                erro, seg = f"excel_write_error: {e}", None
+            metrics.registrar("tema", arquivo=str(path), status="erro" if erro else "ok",
+                              fases={"escrita_xlsx": seg} if seg is not None else None)
+            if erro:
+                erros.append((str(path), erro))
+        if self.ex is not None:
+            self.ex.shutdown()
+        return erros
+
+# ---- Manifesto dos brutos (execução incremental) ----
+# Sobe quando a lógica de processamento muda de forma que invalida saídas antigas.
+MANIFESTO_VERSAO = 9
+
+MANIFESTO_COLS = ["arquivo", "categoria", "fonte", "tema", "tamanho", "mtime_ns", "sha1", "status", "erro", "assinatura"]
+
+def _assinatura_config() -> str:
+    """Hash de tudo (fora os brutos) que muda o conteúdo das saídas por tema."""
+    h = hashlib.sha1()
+    h.update(str(MANIFESTO_VERSAO).encode())
+    h.update(json.dumps(cfg.TSBIO, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(file_sha1(cfg.DICT_PATH).encode())
+    h.update(repr((DROP_OUTPUT_COLS, cfg.OUT_SEP, cfg.OUT_ENCODING,
+                   cfg.EXPORT_PROCESSADO_CSV, cfg.EXPORT_PROCESSADO_XLSX,
+                   getattr(cfg, "EXPORT_PROCESSADO_PARQUET", False),
+                   getattr(cfg, "DEDUP_BRUTOS", False),
+                   getattr(cfg, "ADAPTADORES", []), getattr(cfg, "CENSO_AGRO_COLUNAS", []),
+                   getattr(cfg, "LEITURA_TIPADA", False))).encode())
+    return h.hexdigest()[:16]
+
+def _chave_manifesto(r: Dict) -> Tuple[str, str, str, str]:
+    # um bruto de adaptador tem uma linha por tema que gera
+    return r["arquivo"], r["categoria"], r["fonte"], r["tema"]
+
+def _carregar_manifesto(assinatura: str) -> Dict[Tuple[str, str, str, str], Dict]:
+    """Lê o manifesto anterior. Vazio se não existir ou se a configuração mudou."""
+    if not cfg.MANIFESTO_BRUTOS.exists():
+        return {}
+    try:
+        man = pd.read_csv(cfg.MANIFESTO_BRUTOS, encoding=cfg.OUT_ENCODING, dtype=str, keep_default_na=False)
+    except Exception as e:
+        print("⚠️ Manifesto ilegível, reprocessando tudo:", e)
+        return {}
+    if man.empty or set(man["assinatura"]) != {assinatura}:
+        print("ℹ️ Configuração/dicionário mudou desde a última execução -> reprocessando tudo.")
+        return {}
+    return {_chave_manifesto(r): r for r in man.to_dict("records")}
+
+def _carregar_relatorio_anterior() -> pd.DataFrame | None:
+    if not cfg.RELATORIO_VALIDACAO.exists():
+        return None
+    try:
+        return pd.read_csv(cfg.RELATORIO_VALIDACAO, encoding=cfg.OUT_ENCODING, dtype=str, keep_default_na=False)
+    except Exception:
+        return None
+
+# ---- Cobertura (tema x município [x ano]) ----
+def _herdar_cobertura(cob: CoverageMatrix, chaves: List[Tuple[str, str, str]], rep_ant_rows: Dict) -> None:
+    """
+    Temas não reconstruídos (incremental): células cobertas vêm do `_cobertura.parquet`
+    anterior; sem ele, do `faltando_cod_municipio` do relatório anterior (sem ano).
+    """
+    if not chaves:
+        return
+    ant = None
+    if cfg.COBERTURA.exists():
         try:
-            df = read_csv_local(p)
+            ant = pd.read_parquet(cfg.COBERTURA)
+            ant = ant[ant["coberto"]]
+            ant = {k: g for k, g in ant.groupby(["categoria", "fonte", "tema"], observed=True)}
         except Exception as e:
-            errors.append((str(p), str(e)))
-            continue
+            print("⚠️ Cobertura anterior ilegível, usando o relatório:", e)
+            ant = None
+    esperados = [f"{c:07d}" for c in cob.lookup.codigos]
+    for chave in chaves:
+        if ant is not None and chave in ant:
+            g = ant[chave]
+            cob.marcar_codigos(chave, g["cod_municipio"].astype(str), g["ano"] if "ano" in g.columns else None)
+        else:
+            faltando = set(filter(None, str(rep_ant_rows[chave].get("faltando_cod_municipio") or "").split(",")))
+            cob.marcar_codigos(chave, [m for m in esperados if m not in faltando])
 
-        # Normaliza colunas
-        col_map = {c: normalize_column_name(c, syn_map) for c in df.columns}
-        df = df.rename(columns=col_map)
+def _salvar_cobertura(cob: CoverageMatrix) -> None:
+    """`_cobertura.parquet` (células, formato longo) + `_cobertura_territorios.csv` (% por território)."""
+    try:
+        cob.to_frame().to_parquet(cfg.COBERTURA, index=False)
+    except Exception as e:
+        print("⚠️ Não consegui salvar a cobertura em parquet:", e)
+    cob.por_territorio().to_csv(cfg.COBERTURA_TERRITORIOS, index=False, encoding=cfg.OUT_ENCODING)
 
-        mun_col = find_mun_col(list(df.columns))
-        if not mun_col:
-            missing_mun_col.append(str(p))
+# ---- Brutos duplicados (mesmo sha1) ----
+def _planejar_duplicatas(itens: List[Tuple], infos: List[Dict], sel: List[int],
+                         multi: set = frozenset()) -> Tuple[Dict[int, int], Dict[int, int], Dict[int, int]]:
+    """
+    Agrupa os brutos por conteúdo (sha1) e devolve, como {índice: índice do original}:
+    - duplicados: cópias no MESMO tema -> não são lidas e suas linhas não entram (seriam repetidas);
+    - copias:     cópias em OUTRO tema (1ª ocorrência do conteúdo) -> só para relatório/linhagem;
+    - reuso:      entre os selecionados (`sel`), cópias que reaproveitam a leitura de outro
+                  selecionado em vez de reler o arquivo.
+    Itens de brutos com vários temas (`multi`, adaptadores) só entram como duplicados no
+    mesmo tema: o mesmo conteúdo gera linhas diferentes em cada tema.
+    """
+    duplicados, copias, reuso = {}, {}, {}
+    primeiro_tema: Dict[Tuple, int] = {}
+    primeiro: Dict[str, int] = {}
+    for i, ((_, c, f, t, _), info) in enumerate(zip(itens, infos)):
+        h = info["sha1"]
+        if not h:
+            continue
+        j = primeiro_tema.setdefault((c, f, t, h), i)
+        if j != i:
+            duplicados[i] = j
             continue
+        if i in multi:
+            continue
+        j = primeiro.setdefault(h, i)
+        if j != i:
+            copias[i] = j
 
-        if mun_col != "cod_municipio":
-            df = df.rename(columns={mun_col: "cod_municipio"})
+    primeiro_sel: Dict[str, int] = {}
+    for i in sel:
+        h = infos[i]["sha1"]
+        if not h or i in duplicados or i in multi:
+            continue
+        j = primeiro_sel.setdefault(h, i)
+        if j != i:
+            reuso[i] = j
+    return duplicados, copias, reuso
 
-        df["cod_municipio"] = df["cod_municipio"].apply(zfill_mun)
-        df = df[df["cod_municipio"].astype(str).str.len() > 0].copy()
+def _reaproveitar(res_src: Dict, item: Tuple[Path, str, str, str, str]) -> Dict:
+    """Resultado de um bruto copiado de outro tema: mesmas linhas, metadados deste bruto."""
+    p, categoria, fonte, tema, recorte = item
+    res = {"arquivo": str(p), "status": res_src["status"], "erro": res_src["erro"], "df": None,
+           "cobertura": res_src.get("cobertura")}
+    df = res_src.get("df")
+    if df is not None:
+        df = df.copy()
+        _anexar_metadados(df, categoria, fonte, tema, recorte)
+        res["df"] = df
+    return res
 
-        # Filtra apenas municípios TSBio
-        df = df[df["cod_municipio"].isin(expected_muns)].copy()
-        if df.empty:
-            continue
+# Linhagem: cada linha dos buckets carrega só `arquivo_id` (int32); o texto fica nesta tabela
+_TABELA_ARQUIVOS_COLS = ["arquivo_id", "arquivo", "arquivo_origem", "categoria", "fonte", "tema", "recorte_origem", "duplicado_de"]
 
-        # Metadados mínimos (úteis para rastreabilidade)
-        df["indicador_id"] = indicador_id
-        df["categoria"] = categoria
-        df["fonte"] = fonte
-        df["tema"] = tema
-        df["recorte_origem"] = recorte
-        df["arquivo_origem"] = p.name
-        df["territorio_id"] = df["cod_municipio"].map(lambda x: mun_to_tsbio.get(x, (None, None))[0])
-        df["territorio_nome"] = df["cod_municipio"].map(lambda x: mun_to_tsbio.get(x, (None, None))[1])
-        df = df[df["territorio_id"].notna()].copy()
+SAIDAS_TEMA = ("arquivo_csv", "arquivo_excel", "arquivo_parquet")
 
-        buckets[(categoria, fonte, tema)].append(df)
+def _saidas_existem(r: Dict) -> bool:
+    return all(not r.get(c) or Path(r[c]).exists() for c in SAIDAS_TEMA)
 
-    report_rows = []
+Item = Tuple[Path, str, str, str, str]  # (bruto, categoria, fonte, tema, recorte)
+
+def _listar_itens(brutos: List[inventario.Bruto]) -> Tuple[List[Item], Dict[str, Tuple[str, set]], int]:
+    """
+    Um item por (bruto, tema). Brutos reconhecidos por um adaptador (pipeline_adapters)
+    podem gerar vários temas: os itens do mesmo bruto ficam juntos e são lidos uma vez só.
+    Retorna (itens, adaptados: bruto -> (adaptador, temas pedidos), nº ignorados pelos filtros).
+    """
+    itens: List[Item] = []
+    adaptados: Dict[str, Tuple[str, set]] = {}
+    ativos = adaptadores.ativos()
+    ignorados = 0
+    for b in brutos:
+        p, categoria = b.path, b.categoria
+
+        partes = [(b.fonte, b.tema, b.recorte)]
+        cab = adaptadores.Cabecalho(b.dialeto, b.linhas) if b.dialeto else None
+        achado = adaptadores.encontrar_adaptador(p, ativos, cab) if ativos else None
+        if achado:
+            adaptador, cab = achado
+            partes = adaptador.temas(p, cab)
+            adaptados[str(p)] = (adaptador.nome, set())
+
+        for fonte, tema, recorte in partes:
+            # --- filtros (opcional) ---
+            if not _passa_filtros(categoria, tema):
+                ignorados += 1
+                continue
+            if achado:
+                adaptados[str(p)][1].add((categoria, fonte, tema))
+            itens.append((p, categoria, fonte, tema, recorte))
+    return itens, adaptados, ignorados
+
+def _agrupar_por_bruto(itens: List[Item]) -> Tuple[List[int], set]:
+    """(índice do 1º item do mesmo bruto, para cada item; itens de brutos com vários temas)."""
+    grupo: List[int] = []
+    for i, (p, *_) in enumerate(itens):
+        grupo.append(grupo[-1] if i and itens[i - 1][0] == p else i)
+    n_grupo = Counter(grupo)
+    return grupo, {i for i, g in enumerate(grupo) if n_grupo[g] > 1}
+
+def _detectar_mudancas(itens: List[Item], grupo: List[int], stat_bruto: Dict[Path, Tuple[int, int]],
+                       man_ant: Dict, rep_ant_rows: Dict | None, incremental: bool, dedup: bool,
+                       assinatura: str) -> Tuple[List[Dict], set]:
+    """
+    Linha do manifesto de cada item (com o sha1 do conteúdo) e temas a reconstruir.
+    Sem relatório anterior (`rep_ant_rows` None), todos os temas são reconstruídos.
+    """
+    # hash do conteúdo: manifesto (incremental) e duplicatas. Sem incremental, só
+    # arquivos com tamanho repetido podem ser cópias -> só esses são lidos para o hash.
+    stats = [stat_bruto[p] for p, *_ in itens]
+    tamanhos = Counter(tam for i, (tam, _) in enumerate(stats) if grupo[i] == i)
+
+    infos: List[Dict] = []
+    for i, ((p, categoria, fonte, tema, _), (tam, mtime_ns)) in enumerate(zip(itens, stats)):
+        rel = p.relative_to(cfg.ROOT_RAW).as_posix()
+        ant = man_ant.get((rel, categoria, fonte, tema))
+        if grupo[i] != i:
+            sha1 = infos[grupo[i]]["sha1"]  # outro tema do mesmo bruto
+        elif ant and ant["tamanho"] == str(tam) and ant["mtime_ns"] == str(mtime_ns) and ant["sha1"]:
+            sha1 = ant["sha1"]  # tamanho+mtime iguais: não relê o arquivo
+        elif incremental or (dedup and tamanhos[tam] > 1):
+            sha1 = file_sha1(p)
+        else:
+            sha1 = ""
+        infos.append({
+            "arquivo": rel, "categoria": categoria, "fonte": fonte, "tema": tema,
+            "tamanho": str(tam), "mtime_ns": str(mtime_ns), "sha1": sha1,
+            "status": "", "erro": "", "assinatura": assinatura,
+        })
+
+    if rep_ant_rows is None:
+        return infos, {(c, f, t) for _, c, f, t, _ in itens}
+
+    dirty = set()
+    for info in infos:
+        ant = man_ant.get(_chave_manifesto(info))
+        if ant is None or ant["sha1"] != info["sha1"]:
+            dirty.add((info["categoria"], info["fonte"], info["tema"]))
+    # bruto sumiu (ou deixou de gerar o tema) -> o tema muda
+    atuais = {_chave_manifesto(info) for info in infos}
+    for chave, ant in man_ant.items():
+        if chave not in atuais and _passa_filtros(ant["categoria"], ant["tema"]):
+            dirty.add((ant["categoria"], ant["fonte"], ant["tema"]))
+    for chave, r in rep_ant_rows.items():
+        if not _saidas_existem(r) and _passa_filtros(chave[0], chave[2]):
+            dirty.add(chave)
+    print(f"♻️ Incremental: {len(dirty)} tema(s) a reconstruir.")
+    return infos, dirty
+
+def _ingerir_itens(itens: List[Item], infos: List[Dict], multi: set, ler: List[int], sel: List[int],
+                   duplicados: Dict[int, int], reuso: Dict[int, int], ctx: Dict, man_ant: Dict,
+                   buckets: Buckets, cobertura: CoverageMatrix) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Lê os itens `ler` (série ou pool) e junta cada tema nos `buckets`/`cobertura`, na ordem
+    de `itens`. Itens fora de `sel` herdam o status do manifesto anterior. Preenche
+    status/erro de `infos` e devolve (erros, brutos sem coluna de município).
+    """
+    errors: List[Tuple[str, str]] = []
+    missing_mun_col: List[str] = []
+
+    # consome os resultados à medida que chegam (na ordem de `itens`), sem guardar todos
+    resultados = _iter_ingestao([itens[i] for i in ler], ctx)
+    ler_set, sel_set = set(ler), set(sel)
+    # fonte -> (resultado, nº de cópias em outros temas ainda por atender)
+    pendentes_reuso = Counter(reuso.values())
+    lidos_reuso: Dict[int, Dict] = {}
 
-    for (categoria, fonte, tema), dfs in buckets.items():
-        big = pd.concat(dfs, ignore_index=True)
-
-        present = set(big["cod_municipio"].dropna().unique())
-        missing = sorted(list(expected_muns - present))
-
-        status = "ok" if len(big) else "vazio"
-        if missing:
-            # Não trava; só registra no relatório
-            status = "parcial"
-
-        # Pastas de saída
-        cat_dir_csv = cfg.OUT_PROCESSADO_CSV / safe_filename(categoria)
-        cat_dir_xlsx = cfg.OUT_PROCESSADO_XLSX / safe_filename(categoria)
-        cat_dir_csv.mkdir(parents=True, exist_ok=True)
-        cat_dir_xlsx.mkdir(parents=True, exist_ok=True)
-
-        base = safe_filename(f"{tema} - {fonte}")
-        out_csv_path = cat_dir_csv / f"{base}.csv"
-        out_xlsx_path = cat_dir_xlsx / f"{base}.xlsx"
-
-        # Ordena colunas (saída por tema)
-        out_df = big.copy()
-        first_cols = [
-            "indicador_id","categoria","fonte","tema",
-            "territorio_id","territorio_nome",
-            "cod_municipio",
-            "ano","mes",
-            "arquivo_origem","recorte_origem"
-        ]
-        cols = [c for c in first_cols if c in out_df.columns] + [c for c in out_df.columns if c not in first_cols]
-        out_df = out_df[cols]
-
-        # Remove metadados redundantes na saída (mantém em memória para relatório)
-        if DROP_OUTPUT_COLS:
-            out_df = out_df.drop(columns=[c for c in DROP_OUTPUT_COLS if c in out_df.columns], errors="ignore")
-
-        if cfg.EXPORT_PROCESSADO_CSV:
+    res_arq: Dict = {}  # leitura do bruto atual (compartilhada pelos itens do mesmo `grupo`)
+    for i, ((p, categoria, fonte, tema, _), info) in enumerate(zip(itens, infos)):
+        res = None
+        if i in ler_set:
+            res_arq = next(resultados)
+            res = _parte(res_arq, itens[i])
+            if res_arq.get("sniff"):
+                SNIFF_CACHE[res_arq["sniff"][0]] = res_arq["sniff"][1]
+            PLANOS.update(res_arq.get("planos") or {})
+            if res_arq.get("metricas"):
+                metrics.registrar("arquivo", arquivo=info["arquivo"], categoria=categoria, fonte=fonte, tema=tema,
+                                  status=res_arq["status"] if i in multi else res["status"], **res_arq["metricas"])
+            if pendentes_reuso[i]:
+                lidos_reuso[i] = {**res}
+        elif i in sel_set and i in duplicados:
+            # cópia no mesmo tema: linhas já entraram pelo original
+            res = {"arquivo": str(p), "status": "duplicado", "erro": f"duplicado de {infos[duplicados[i]]['arquivo']}"}
+            metrics.registrar("arquivo", arquivo=info["arquivo"], categoria=categoria, fonte=fonte, tema=tema,
+                              status="duplicado", bytes=int(info["tamanho"]))
+        elif i in sel_set and i not in reuso:
+            # outro tema do mesmo bruto (adaptador): já lido no 1º item selecionado dele
+            res = _parte(res_arq, itens[i])
+        elif i in sel_set:
+            # cópia em outro tema: reaproveita a leitura do original com os metadados deste bruto
+            src = reuso[i]
+            res = _reaproveitar(lidos_reuso[src], itens[i])
+            pendentes_reuso[src] -= 1
+            if not pendentes_reuso[src]:
+                del lidos_reuso[src]
+            metrics.registrar("arquivo", arquivo=info["arquivo"], categoria=categoria, fonte=fonte, tema=tema,
+                              status=res["status"], reaproveitado_de=infos[src]["arquivo"], bytes=int(info["tamanho"]))
+
+        if res is None:
+            # bucket intacto: herda o status da execução anterior
+            ant = man_ant[_chave_manifesto(info)]
+            info["status"], info["erro"] = ant["status"], ant["erro"]
+            res = {"arquivo": str(p), "status": ant["status"], "erro": ant["erro"]}
+        else:
+            info["status"], info["erro"] = res["status"], res["erro"]
+
+        # erro/sem município de um bruto com vários temas entra uma vez só nos relatórios
+        if res["status"] == "erro" and (not errors or errors[-1] != (res["arquivo"], res["erro"])):
+            errors.append((res["arquivo"], res["erro"]))
+        elif res["status"] == "sem_mun" and (not missing_mun_col or missing_mun_col[-1] != res["arquivo"]):
+            missing_mun_col.append(res["arquivo"])
+        elif res["status"] == "ok" and res.get("df") is not None:
+            df = res.pop("df")
+            df["arquivo_id"] = np.int32(i)
+            buckets.add((categoria, fonte, tema), df)
+            cobertura.marcar((categoria, fonte, tema), *res["cobertura"])
+    resultados.close()  # encerra o pool/barra de leitura antes da exportação
+    return errors, missing_mun_col
+
+def _exportar_tema(big: pd.DataFrame, chave: Tuple[str, str, str], cobertura: CoverageMatrix,
+                   nomes_arquivos: np.ndarray, xlsx: EscritorXlsx | None, errors: List[Tuple[str, str]],
+                   fases: Fases) -> Dict:
+    """Grava CSV/parquet (e envia o XLSX) de um tema; devolve a linha do relatório de validação."""
+    categoria, fonte, tema = chave
+    missing = cobertura.faltando(chave)
+
+    status = "ok" if len(big) else "vazio"
+    if missing:
+        # Não trava; só registra no relatório
+        status = "parcial"
+
+    # Pastas de saída
+    cat_dir_csv = cfg.OUT_PROCESSADO_CSV / safe_filename(categoria)
+    cat_dir_xlsx = cfg.OUT_PROCESSADO_XLSX / safe_filename(categoria)
+    cat_dir_csv.mkdir(parents=True, exist_ok=True)
+    cat_dir_xlsx.mkdir(parents=True, exist_ok=True)
+
+    base = safe_filename(f"{tema} - {fonte}")
+    out_csv_path = cat_dir_csv / f"{base}.csv"
+    out_xlsx_path = cat_dir_xlsx / f"{base}.xlsx"
+    out_parquet_path = parquet_sidecar_path(out_csv_path)
+
+    # arquivo_id -> nome do bruto (texto só agora, na exportação)
+    big["arquivo_origem"] = nomes_arquivos[big.pop("arquivo_id").to_numpy()]
+
+    # Ordena colunas (saída por tema)
+    out_df = big
+    first_cols = [
+        "indicador_id","categoria","fonte","tema",
+        "territorio_id","territorio_nome",
+        "cod_municipio",
+        "ano","mes",
+        "arquivo_origem","recorte_origem"
+    ]
+    cols = [c for c in first_cols if c in out_df.columns] + [c for c in out_df.columns if c not in first_cols]
+    out_df = out_df[cols]
+
+    # Remove metadados redundantes na saída (mantém em memória para relatório)
+    if DROP_OUTPUT_COLS:
+        out_df = out_df.drop(columns=[c for c in DROP_OUTPUT_COLS if c in out_df.columns], errors="ignore")
+
+    if cfg.EXPORT_PROCESSADO_CSV:
+        with fases("escrita_csv"):
             out_df.to_csv(out_csv_path, index=False, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING)
-        if cfg.EXPORT_PROCESSADO_XLSX:
+    if getattr(cfg, "EXPORT_PROCESSADO_PARQUET", False):
+        # sidecar tipado p/ etapas 02–04; gravado depois do CSV (mtime >= CSV)
+        with fases("escrita_parquet"):
             try:
-                out_df.to_excel(out_xlsx_path, index=False)
+                out_parquet_path.parent.mkdir(parents=True, exist_ok=True)
+                _gravar_parquet_tema(out_df, out_parquet_path)
             except Exception as e:
-                # Excel é opcional, mas TdR pede; loga erro
-                errors.append((str(out_xlsx_path), f"excel_write_error: {e}"))
-
-        report_rows.append({
-            "categoria": categoria,
-            "fonte": fonte,
-            "tema": tema,
-            "indicador_id": big["indicador_id"].iloc[0] if "indicador_id" in big.columns and len(big) else "",
-            "status": status,
-            "arquivo_csv": str(out_csv_path) if cfg.EXPORT_PROCESSADO_CSV else "",
-            "arquivo_excel": str(out_xlsx_path) if cfg.EXPORT_PROCESSADO_XLSX else "",
-            "linhas": len(out_df),
-            "n_colunas": len(out_df.columns),
-            "faltando_cod_municipio": ",".join(missing) if missing else "",
-        })
+                out_parquet_path.unlink(missing_ok=True)
+                out_parquet_path = None
+                errors.append((str(out_csv_path), f"parquet_write_error: {e}"))
+    else:
+        out_parquet_path = None
+    if xlsx is not None:
+        # Excel é opcional, mas TdR pede; erros voltam em `finalizar()`
+        with fases("envio_xlsx"):
+            xlsx.submit(out_df, out_xlsx_path)
+    metrics.registrar("tema", arquivo=str(out_csv_path), categoria=categoria, fonte=fonte, tema=tema,
+                      status=status, linhas_mantidas=len(out_df), fases=fases.tempos)
+
+    return {
+        "categoria": categoria,
+        "fonte": fonte,
+        "tema": tema,
+        "indicador_id": big["indicador_id"].iloc[0] if "indicador_id" in big.columns and len(big) else "",
+        "status": status,
+        "arquivo_csv": str(out_csv_path) if cfg.EXPORT_PROCESSADO_CSV else "",
+        "arquivo_excel": str(out_xlsx_path) if cfg.EXPORT_PROCESSADO_XLSX else "",
+        "arquivo_parquet": str(out_parquet_path) if out_parquet_path else "",
+        "linhas": len(out_df),
+        "n_colunas": len(out_df.columns),
+        "faltando_cod_municipio": ",".join(missing) if missing else "",
+        "cobertura_pct": cobertura.pct(chave),
+    }
+
+def _exportar_temas(buckets: Buckets, cobertura: CoverageMatrix, nomes_arquivos: np.ndarray,
+                    errors: List[Tuple[str, str]]) -> Tuple[List[Dict], List[Tuple[str, str, str]]]:
+    """Exporta um tema por vez (só ele fica em memória); XLSX vão para o pool de fundo."""
+    report_rows = []
+    exportados = buckets.chaves()
+    xlsx = EscritorXlsx(len(exportados)) if cfg.EXPORT_PROCESSADO_XLSX and exportados else None
+    for chave in exportados:
+        fases = Fases()
+        with fases("montagem"):
+            big = buckets.pop(chave)
+        report_rows.append(_exportar_tema(big, chave, cobertura, nomes_arquivos, xlsx, errors, fases))
+    if xlsx is not None:
+        errors.extend(xlsx.finalizar())
+    return report_rows, exportados
+
+def _manter_temas_intactos(rep_ant_rows: Dict, dirty: set, exportados: List[Tuple[str, str, str]],
+                           cobertura: CoverageMatrix, report_rows: List[Dict]) -> None:
+    """Incremental: mantém no relatório/cobertura os temas intactos e apaga saídas de temas que sumiram."""
+    herdados = [chave for chave in rep_ant_rows if chave not in dirty]
+    _herdar_cobertura(cobertura, herdados, rep_ant_rows)
+    for chave, r in rep_ant_rows.items():
+        if chave not in dirty:
+            report_rows.append(r)
+        elif chave not in exportados:
+            for c in SAIDAS_TEMA:
+                if r.get(c) and Path(r[c]).exists():
+                    Path(r[c]).unlink()
+            print(f"🧹 Tema removido (sem brutos válidos): {' / '.join(chave)}")
 
+def _gravar_relatorios(report_rows: List[Dict], cobertura: CoverageMatrix, itens: List[Item], infos: List[Dict],
+                       man_ant: Dict, brutos: List[inventario.Bruto], duplicados: Dict[int, int],
+                       copias: Dict[int, int], missing_mun_col: List[str], errors: List[Tuple[str, str]],
+                       versao_planos: str) -> pd.DataFrame:
+    """Relatório de validação, cobertura, manifesto, tabela de arquivos, caches e relatórios de problemas."""
     rep_df = pd.DataFrame(report_rows).sort_values(["categoria", "fonte", "tema"])
     rep_df.to_csv(cfg.RELATORIO_VALIDACAO, index=False, encoding=cfg.OUT_ENCODING)
 
+    _salvar_cobertura(cobertura)
+
+    # manifesto: arquivos vistos agora + os que ficaram de fora pelos filtros
+    vistos = {_chave_manifesto(info) for info in infos}
+    existentes = {b.arquivo for b in brutos}
+    man_rows = infos + [
+        r for k, r in man_ant.items()
+        if k not in vistos and k[0] in existentes and not _passa_filtros(r["categoria"], r["tema"])
+    ]
+    pd.DataFrame(man_rows, columns=MANIFESTO_COLS).sort_values(["arquivo", "fonte", "tema"]).to_csv(
+        cfg.MANIFESTO_BRUTOS, index=False, encoding=cfg.OUT_ENCODING
+    )
+
+    pd.DataFrame(
+        [(i, p.relative_to(cfg.ROOT_RAW).as_posix(), p.name, c, f, t, r, duplicados.get(i, copias.get(i, "")))
+         for i, (p, c, f, t, r) in enumerate(itens)],
+        columns=_TABELA_ARQUIVOS_COLS,
+    ).to_csv(cfg.TABELA_ARQUIVOS, index=False, encoding=cfg.OUT_ENCODING)
+
+    save_sniff_cache(cfg.CACHE_SNIFF)
+    _salvar_planos(cfg.CACHE_PLANOS, versao_planos)
+
     if missing_mun_col:
         pd.DataFrame({"arquivo": missing_mun_col}).to_csv(cfg.RELATORIO_SEM_MUN, index=False, encoding=cfg.OUT_ENCODING)
 
+    dup_rows = [
+        {"arquivo": infos[i]["arquivo"], "duplicado_de": infos[j]["arquivo"], "sha1": infos[i]["sha1"],
+         "tamanho": infos[i]["tamanho"], "mesmo_tema": "sim" if i in duplicados else "nao",
+         "acao": "linhas descartadas" if i in duplicados else "leitura reaproveitada"}
+        for i, j in sorted({**duplicados, **copias}.items())
+    ]
+    if dup_rows:
+        pd.DataFrame(dup_rows).to_csv(cfg.RELATORIO_DUPLICADOS, index=False, encoding=cfg.OUT_ENCODING)
+    elif cfg.RELATORIO_DUPLICADOS.exists():
+        cfg.RELATORIO_DUPLICADOS.unlink()
+
     if errors:
         pd.DataFrame(errors, columns=["arquivo", "erro"]).to_csv(cfg.RELATORIO_ERROS, index=False, encoding=cfg.OUT_ENCODING)
+    return rep_df
+
+@metrics.etapa("01_processar")
+def processar() -> pd.DataFrame:
+    cfg.ensure_dirs()
+
+    assert cfg.ROOT_RAW.exists(), f"ROOT_RAW não encontrado: {cfg.ROOT_RAW}"
+    assert cfg.DICT_PATH.exists(), f"DICT_PATH não encontrado: {cfg.DICT_PATH}"
+
+    syn_map = load_dictionary(cfg.DICT_PATH)
+    load_sniff_cache(cfg.CACHE_SNIFF)
+    tipada = bool(getattr(cfg, "LEITURA_TIPADA", False))
+    versao_planos = _versao_planos(cfg.DICT_PATH, tipada)
+    _carregar_planos(cfg.CACHE_PLANOS, versao_planos)
+
+    lookup = build_tsbio_lookup(cfg.TSBIO)
+    expected_muns = lookup.expected_muns
+
+    # inventário persistido (pipeline_inventario): só brutos novos/alterados são revisitados
+    brutos = inventario.atualizar(cfg.ROOT_RAW)
+    print(f"CSV brutos encontrados: {len(brutos)} em {cfg.ROOT_RAW}")
+    stat_bruto = {b.path: (b.tamanho, b.mtime_ns) for b in brutos}  # (tamanho, mtime_ns) do inventário
+
+    # Buckets por (categoria, fonte, tema); acima do teto, despeja em disco
+    spill_dir = Path(getattr(cfg, "SPILL_DIR", cfg.OUT_PROCESSADO / "_spill"))
+    buckets = Buckets(spill_dir, int(float(getattr(cfg, "SPILL_LIMITE_MB", 0) or 0) * 1024 * 1024))
+    buckets.limpar()  # sobras de execução interrompida
+    # Matriz de cobertura tema x município [x ano], preenchida durante a ingestão
+    cobertura = CoverageMatrix(lookup, por_ano=bool(getattr(cfg, "COBERTURA_POR_ANO", False)))
+
+    itens, adaptados, skipped_by_filter = _listar_itens(brutos)
+    grupo, multi = _agrupar_por_bruto(itens)
+
+    # arquivo_id = posição do bruto em `itens` (tabela id -> bruto: cfg.TABELA_ARQUIVOS)
+    nomes_arquivos = np.array([p.name for p, *_ in itens], dtype=object)
+
+    # --- manifesto: descobre quais buckets mudaram desde a última execução ---
+    incremental = bool(getattr(cfg, "INCREMENTAL", False))
+    dedup = bool(getattr(cfg, "DEDUP_BRUTOS", False))
+    assinatura = _assinatura_config()
+    man_ant = _carregar_manifesto(assinatura) if incremental else {}
+    rep_ant = _carregar_relatorio_anterior() if man_ant else None
+    rep_ant_rows = {
+        (r["categoria"], r["fonte"], r["tema"]): r for r in rep_ant.to_dict("records")
+    } if rep_ant is not None else None
+    infos, dirty = _detectar_mudancas(itens, grupo, stat_bruto, man_ant, rep_ant_rows, incremental, dedup, assinatura)
+
+    ctx = {
+        "syn_map": syn_map, "lookup": lookup,
+        "prefiltro_mun": bool(getattr(cfg, "PREFILTRO_MUN", False)),
+        # 7 dígitos + forma sem DV (6 dígitos, ex.: CAGED), que `normalize_mun_series` completa
+        "prefiltro_chaves": expected_muns | {m[:6] for m in expected_muns},
+        "cobertura_por_ano": cobertura.por_ano,
+        "sniff_cache": dict(SNIFF_CACHE),
+        "adaptados": adaptados,
+        # tipos declarados no dicionário, passados direto ao read_csv
+        "dtype_plan": load_dtype_plan(cfg.DICT_PATH) if tipada else {},
+        "papeis": load_column_kinds(cfg.DICT_PATH),
+        "versao_planos": versao_planos,
+        "planos": dict(PLANOS),
+    }
+
+    sel = [i for i, (_, c, f, t, _) in enumerate(itens) if (c, f, t) in dirty]
+    duplicados, copias, reuso = _planejar_duplicatas(itens, infos, sel, multi) if dedup else ({}, {}, {})
+    # um bruto é lido uma vez, no 1º item selecionado dele; os demais temas vêm dessa leitura
+    ler, lidos_grupo = [], set()
+    for i in sel:
+        if i not in duplicados and i not in reuso and grupo[i] not in lidos_grupo:
+            ler.append(i)
+            lidos_grupo.add(grupo[i])
+    if duplicados or copias:
+        print(f"♊ Brutos com conteúdo repetido: {len(duplicados)} no mesmo tema (descartados), "
+              f"{len(copias)} em outro tema (leitura reaproveitada)")
+
+    errors, missing_mun_col = _ingerir_itens(itens, infos, multi, ler, sel, duplicados, reuso, ctx, man_ant,
+                                             buckets, cobertura)
+    if buckets.n_despejos:
+        print(f"💾 Teto de memória atingido {buckets.n_despejos}x: temas despejados em {spill_dir}")
+
+    report_rows, exportados = _exportar_temas(buckets, cobertura, nomes_arquivos, errors)
+    if rep_ant_rows is not None:
+        _manter_temas_intactos(rep_ant_rows, dirty, exportados, cobertura, report_rows)
+    buckets.limpar()
+
+    rep_df = _gravar_relatorios(report_rows, cobertura, itens, infos, man_ant, brutos, duplicados, copias,
+                                missing_mun_col, errors, versao_planos)
 
     print(f"ℹ️ Arquivos ignorados pelos filtros: {skipped_by_filter}")
     print("✅ Processamento concluído.")
     print(" - Relatório:", cfg.RELATORIO_VALIDACAO)
+    print(" - Manifesto:", cfg.MANIFESTO_BRUTOS)
+    print(" - Tabela de arquivos (arquivo_id):", cfg.TABELA_ARQUIVOS)
     print(" - Sem coluna município:", cfg.RELATORIO_SEM_MUN)
     print(" - Erros:", cfg.RELATORIO_ERROS)
+    print(" - Duplicados:", cfg.RELATORIO_DUPLICADOS)
+    print(" - Cobertura:", cfg.COBERTURA, "|", cfg.COBERTURA_TERRITORIOS)
     return rep_df
 
 if __name__ == "__main__":
@@ -17,7 +17,8 @@ import pandas as pd
 from tqdm import tqdm
 
 import pipeline_config as cfg
-from pipeline_utils import read_csv_local
+import pipeline_metrics as metrics
+from pipeline_utils import parquet_sidecar, read_csv_local, read_processed, read_processed_columns
 
 UNIT_SUFFIX_TO_UNIT = {
     "perc": "%",
@@ -50,7 +51,7 @@ def inferir_unidade(variaveis: List[str]) -> str:
 
 def inferir_periodo(csv_path: Path) -> str:
     try:
-        df = pd.read_csv(csv_path, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, usecols=["ano"])
+        df = read_processed(csv_path, columns=["ano"])
         anos = pd.to_numeric(df["ano"], errors="coerce").dropna()
         if anos.empty:
             return ""
@@ -58,6 +59,7 @@ def inferir_periodo(csv_path: Path) -> str:
     except Exception:
         return ""
 
+@metrics.etapa("02_catalogo")
 def gerar_catalogo() -> pd.DataFrame:
     cfg.ensure_dirs()
     assert cfg.RELATORIO_VALIDACAO.exists(), f"Relatório não encontrado: {cfg.RELATORIO_VALIDACAO}"
@@ -67,11 +69,11 @@ def gerar_catalogo() -> pd.DataFrame:
 
     for _, r in tqdm(rep.iterrows(), total=len(rep), desc="Catalogando"):
         csv_path = Path(r["arquivo_csv"]) if isinstance(r.get("arquivo_csv"), str) and r.get("arquivo_csv") else None
-        if not csv_path or not csv_path.exists():
+        if not csv_path or not (csv_path.exists() or parquet_sidecar(csv_path)):
             continue
 
         try:
-            cols = list(pd.read_csv(csv_path, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, nrows=0).columns)
+            cols = read_processed_columns(csv_path)
         except Exception:
             continue
 
@@ -23,6 +23,8 @@ import pandas as pd
 from tqdm import tqdm
 
 import pipeline_config as cfg
+import pipeline_metrics as metrics
+from pipeline_utils import parquet_sidecar, read_processed, read_processed_columns
 
 UNIT_SUFFIX_TO_UNIT = {
     "perc": "%",
@@ -55,7 +57,7 @@ def inferir_unidade(variaveis: List[str]) -> str:
 
 def inferir_periodo(csv_path: Path) -> str:
     try:
-        df = pd.read_csv(csv_path, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, usecols=["ano"])
+        df = read_processed(csv_path, columns=["ano"])
         anos = pd.to_numeric(df["ano"], errors="coerce").dropna()
         if anos.empty:
             return ""
@@ -121,6 +123,7 @@ def sync_catalogo_curado(cat: pd.DataFrame) -> pd.DataFrame:
     print(f" - Indicadores que estavam no curado e não estão mais no catálogo: {removed} (removidos do arquivo)")
     return out
 
+@metrics.etapa("02_catalogo_sync")
 def gerar_catalogo() -> pd.DataFrame:
     cfg.ensure_dirs()
     assert cfg.RELATORIO_VALIDACAO.exists(), f"Relatório não encontrado: {cfg.RELATORIO_VALIDACAO}"
@@ -130,11 +133,11 @@ def gerar_catalogo() -> pd.DataFrame:
 
     for _, r in tqdm(rep.iterrows(), total=len(rep), desc="Catalogando"):
         csv_path = Path(r["arquivo_csv"]) if isinstance(r.get("arquivo_csv"), str) and r.get("arquivo_csv") else None
-        if not csv_path or not csv_path.exists():
+        if not csv_path or not (csv_path.exists() or parquet_sidecar(csv_path)):
             continue
 
         try:
-            cols = list(pd.read_csv(csv_path, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, nrows=0).columns)
+            cols = read_processed_columns(csv_path)
         except Exception:
             continue
 
@@ -20,6 +20,8 @@ from typing import Tuple
 import pandas as pd
 
 import pipeline_config as cfg
+import pipeline_metrics as metrics
+from pipeline_utils import parquet_sidecar, read_processed_columns
 
 
 def gerar_descricao(tema: str, categoria: str, fonte: str, colunas: list) -> str:
@@ -332,9 +334,9 @@ def gerar_documentacao(rep_df: pd.DataFrame, out_md: Path, out_xlsx: Path) -> Tu
         csv_path = Path(r["arquivo_csv"]) if pd.notna(r.get("arquivo_csv")) and r.get("arquivo_csv") else None
 
         cols = []
-        if csv_path and csv_path.exists():
+        if csv_path and (csv_path.exists() or parquet_sidecar(csv_path)):
             try:
-                cols = list(pd.read_csv(csv_path, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, nrows=0).columns)
+                cols = read_processed_columns(csv_path)
             except Exception:
                 cols = []
 
@@ -433,6 +435,7 @@ def gerar_documentacao(rep_df: pd.DataFrame, out_md: Path, out_xlsx: Path) -> Tu
     return doc_df, cols_df
 
 
+@metrics.etapa("03_documentacao")
 def main():
     cfg.ensure_dirs()
     assert cfg.RELATORIO_VALIDACAO.exists(), f"Relatório não encontrado: {cfg.RELATORIO_VALIDACAO}"
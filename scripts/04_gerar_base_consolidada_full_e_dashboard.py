@@ -16,13 +16,28 @@ from __future__ import annotations
 
 import gzip
 import os
+import shutil
 from pathlib import Path
-from typing import List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+try:  # parquet da base (OUTPUT_FORMAT_* = "parquet")
+    import pyarrow as pa
+    import pyarrow.parquet as pa_pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pa_pq = None
+
 import pipeline_config as cfg
+import pipeline_metrics as metrics
+from pipeline_metrics import Fases
+from pipeline_utils import (
+    LeituraAntecipada, constant_categorical, list_processed, load_dtype_plan, normalize_mun_series,
+    parquet_sidecar, parse_numero_br, processed_index, read_processed,
+)
 
 UNIT_SUFFIX_TO_UNIT = {
     "perc": "%",
@@ -40,7 +55,16 @@ def infer_unidade_from_variavel(variavel: str) -> str:
     suf = v.split("_")[-1]
     return UNIT_SUFFIX_TO_UNIT.get(suf, "")
 
-def identificar_colunas_valor(df: pd.DataFrame) -> List[str]:
+def _is_texto(s: pd.Series) -> bool:
+    """Coluna de texto: `object` (backend pandas) ou `string` (backend pyarrow)."""
+    return pd.api.types.is_object_dtype(s.dtype) or isinstance(s.dtype, pd.StringDtype)
+
+def identificar_colunas_valor(df: pd.DataFrame, numeros: Optional[Dict[str, np.ndarray]] = None) -> List[str]:
+    """
+    Colunas de valor: numéricas ou texto com >50% das linhas numéricas (`parse_numero_br`).
+    Se `numeros` for dado, guarda nele os valores já convertidos de cada coluna de valor
+    (reaproveitados por `transformar_para_long` em vez de converter de novo).
+    """
     excluir = {
         "indicador_id","categoria","fonte","tema","recorte_origem","arquivo_origem",
         "territorio_id","territorio_nome","cod_municipio","ano","mes",
@@ -49,23 +73,16 @@ def identificar_colunas_valor(df: pd.DataFrame) -> List[str]:
     for col in df.columns:
         if col in excluir:
             continue
-        if pd.api.types.is_numeric_dtype(df[col]):
-            cols_valor.append(col)
+        s = df[col]
+        if not (pd.api.types.is_numeric_dtype(s) or _is_texto(s)):
             continue
-        if df[col].dtype == "object":
-            s = df[col].astype(str)
-            numeric = pd.to_numeric(
-                s.str.replace(".", "", regex=False)
-                 .str.replace(",", ".", regex=False)
-                 .str.replace("%", "", regex=False)
-                 .str.replace(" ", "", regex=False),
-                errors="coerce",
-            )
-            if numeric.notna().mean() > 0.5:
-                cols_valor.append(col)
+        num = parse_numero_br(s)
+        if pd.api.types.is_numeric_dtype(s) or (len(num) and np.count_nonzero(~np.isnan(num)) / len(num) > 0.5):
+            cols_valor.append(col)
+            if numeros is not None:
+                numeros[col] = num
     return cols_valor
 
-
 def _identificar_dimensoes_extras(df: pd.DataFrame, id_cols: List[str], value_cols: List[str]) -> List[str]:
     """Retorna colunas adicionais (dimensões) para manter na base 'RICA'.
 
@@ -87,7 +104,29 @@ def _identificar_dimensoes_extras(df: pd.DataFrame, id_cols: List[str], value_co
         extras.append(c)
     return extras
 
-def transformar_para_long(df: pd.DataFrame, rich: bool = False) -> pd.DataFrame:
+def _repetir(s: pd.Series, linhas: np.ndarray):
+    """
+    `s` nas posições `linhas`. Texto sai categórico: só os códigos (inteiros) são
+    repetidos, as strings de cada valor distinto não são copiadas por linha.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(s.cat.codes.to_numpy()[linhas], dtype=s.dtype)
+    if _is_texto(s):
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        return pd.Categorical.from_codes(codes[linhas], categories=uniques)
+    return s.array.take(linhas)
+
+def transformar_para_long(df: pd.DataFrame, rich: bool = False, manter_texto: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Tema (largo) -> base longa. `rich` mantém as dimensões extras; `manter_texto` força
+    manter (True) ou tirar (False) as colunas de texto repetido — padrão: regra de
+    DROP_REPEATED_TEXT/RICH_KEEP_TEXT_COLUMNS.
+
+    Sem `pd.melt`: o bloco numérico (valores já convertidos na detecção, empilhados coluna
+    a coluna como no melt) decide as linhas mantidas (ONLY_NUMERIC_ROWS) ANTES de montar
+    qualquer coluna; ids saem por índice (`_repetir`), `variavel`/`unidade` como
+    categóricas de k valores e `valor_raw` só é materializado nas linhas mantidas.
+    """
     id_cols = [c for c in [
         "territorio_id","territorio_nome","cod_municipio",
         "ano","mes",
@@ -100,13 +139,10 @@ def transformar_para_long(df: pd.DataFrame, rich: bool = False) -> pd.DataFrame:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
     if "cod_municipio" in df.columns:
-        df["cod_municipio"] = (
-            df["cod_municipio"].astype(str)
-            .str.replace(r"\D+", "", regex=True)
-            .str.zfill(7)
-        )
+        df["cod_municipio"] = normalize_mun_series(df["cod_municipio"])
 
-    value_cols = identificar_colunas_valor(df)
+    numeros: Dict[str, np.ndarray] = {}
+    value_cols = identificar_colunas_valor(df, numeros)
     if not value_cols:
         return pd.DataFrame()
 
@@ -116,36 +152,43 @@ def transformar_para_long(df: pd.DataFrame, rich: bool = False) -> pd.DataFrame:
         # evita duplicar
         id_cols = id_cols + [c for c in dim_cols if c not in id_cols]
 
-    melted = pd.melt(df, id_vars=id_cols, value_vars=value_cols, var_name="variavel", value_name="valor_raw")
-
-    s = melted["valor_raw"].astype(str)
-    melted["valor_num"] = pd.to_numeric(
-        s.str.replace(".", "", regex=False)
-         .str.replace(",", ".", regex=False)
-         .str.replace("%", "", regex=False)
-         .str.replace(" ", "", regex=False),
-        errors="coerce",
-    )
-
-    melted["unidade"] = melted["variavel"].map(infer_unidade_from_variavel)
-
-    if cfg.ONLY_NUMERIC_ROWS and "valor_num" in melted.columns:
-        melted = melted[melted["valor_num"].notna()].copy()
-
-    if cfg.DROP_REPEATED_TEXT and (not rich or not getattr(cfg, 'RICH_KEEP_TEXT_COLUMNS', True)):
-        drop_cols = [
-            "valor_raw",
-            "tema","categoria","fonte","recorte_origem","arquivo_origem",
-            "territorio_nome",
-        ]
-        melted = melted.drop(columns=drop_cols, errors="ignore")
+    if manter_texto is None:
+        manter_texto = not cfg.DROP_REPEATED_TEXT or (rich and getattr(cfg, 'RICH_KEEP_TEXT_COLUMNS', True))
+    if not manter_texto:
+        drop_cols = {"tema","categoria","fonte","recorte_origem","arquivo_origem","territorio_nome"}
+        id_cols = [c for c in id_cols if c not in drop_cols]
+
+    # posição p no bloco empilhado (n linhas x k colunas) = linha p % n da coluna p // n
+    n, k = len(df), len(value_cols)
+    valor_num = np.concatenate([numeros[c] for c in value_cols])
+    if cfg.ONLY_NUMERIC_ROWS:
+        pos = np.flatnonzero(~np.isnan(valor_num))
+        valor_num = valor_num[pos]
+        linhas, col = pos % n, pos // n
+    else:
+        linhas, col = np.tile(np.arange(n), k), np.repeat(np.arange(k), n)
+
+    out = {c: _repetir(df[c], linhas) for c in id_cols}
+    out["variavel"] = pd.Categorical.from_codes(col, categories=value_cols)
+    if manter_texto:
+        # linhas de cada coluna de valor são contíguas (col é crescente)
+        limites = np.searchsorted(col, np.arange(k + 1))
+        valor_raw = np.empty(len(linhas), dtype=object)
+        for j, c in enumerate(value_cols):
+            i0, i1 = limites[j], limites[j + 1]
+            if i1 > i0:
+                valor_raw[i0:i1] = df[c].array.take(linhas[i0:i1]).to_numpy(dtype=object)
+        out["valor_raw"] = valor_raw
+    out["valor_num"] = valor_num
+    unidades, cod_unidade = np.unique([infer_unidade_from_variavel(c) for c in value_cols], return_inverse=True)
+    out["unidade"] = pd.Categorical.from_codes(cod_unidade[col], categories=unidades)
 
     order = [
         "territorio_id","cod_municipio","ano","mes",
         "indicador_id","variavel","valor_num","unidade",
     ]
-    cols = [c for c in order if c in melted.columns] + [c for c in melted.columns if c not in order]
-    return melted[cols]
+    cols = [c for c in order if c in out] + [c for c in out if c not in order]
+    return pd.DataFrame({c: out[c] for c in cols}, copy=False)
 
 def _truthy(x) -> bool:
     if x is None:
@@ -195,13 +238,156 @@ def selecionar_ids_dashboard() -> List[str]:
     return []
 
 
-def _save_parquet(df: pd.DataFrame, out_path: Path) -> bool:
-    try:
-        df.to_parquet(out_path, index=False)
-        return True
-    except Exception as e:
-        print("⚠️ Falha ao salvar parquet:", e)
-        return False
+# ---------- Escrita da base (schema fixo) ----------
+# Colunas da base longa na ordem de `transformar_para_long`, com o tipo de cada uma.
+# Colunas que faltam num tema saem nulas (indicador_id/categoria/fonte/tema vêm do índice
+# da etapa 01, ver `gerar_bases`); as dimensões extras da base RICA entram depois das
+# colunas de texto, antes de `valor_raw`.
+_TIPOS_BASE = {
+    "territorio_id": "Int64", "cod_municipio": "string", "ano": "Int64", "mes": "Int64",
+    "indicador_id": "string", "variavel": "string", "valor_num": "float64", "unidade": "string",
+}
+_COLUNAS_TEXTO = ["territorio_nome", "tema", "categoria", "fonte", "recorte_origem", "arquivo_origem"]
+
+def _tipos_base(rich: bool) -> Dict[str, str]:
+    """Colunas fixas da base (sem dimensões extras), conforme DROP_REPEATED_TEXT/RICH_KEEP_TEXT_COLUMNS."""
+    tipos = dict(_TIPOS_BASE)
+    if not cfg.DROP_REPEATED_TEXT or (rich and getattr(cfg, "RICH_KEEP_TEXT_COLUMNS", True)):
+        tipos.update({c: "string" for c in _COLUNAS_TEXTO})
+        tipos["valor_raw"] = "string"
+    return tipos
+
+def _conformar(df: pd.DataFrame, tipos: Dict[str, str]) -> pd.DataFrame:
+    """`df` com exatamente as colunas de `tipos`, na ordem e com o tipo de cada uma."""
+    out = {}
+    for c, t in tipos.items():
+        s = df[c] if c in df.columns else pd.Series(pd.NA, index=df.index, dtype="object")
+        if t == "string":
+            out[c] = s.astype("string").replace("", pd.NA)  # como no CSV: vazio = nulo
+        else:
+            out[c] = pd.to_numeric(s, errors="coerce").astype(t)
+    return pd.DataFrame(out, index=df.index)
+
+def _schema_arrow(tipos: Dict[str, str]):
+    arrow = {"string": pa.string(), "float64": pa.float64(), "Int8": pa.int8(), "Int16": pa.int16(),
+             "Int32": pa.int32(), "Int64": pa.int64()}
+    return pa.schema([(c, arrow[t]) for c, t in tipos.items()])
+
+class EscritorBase:
+    """
+    Grava a base longa tema a tema, sempre com as mesmas colunas (ver `_tipos_base`):
+    - parquet: row groups de ~cfg.BASE_LINHAS_POR_GRUPO linhas (ou um por tema maior que
+      isso) num `ParquetWriter`, sem CSV intermediário; memória ~ maior tema + 1 grupo;
+    - csv: append com cabeçalho fixo (colunas que faltam no tema ficam vazias).
+    Com `extras=True` (base RICA com dimensões extras) as colunas só são conhecidas no fim:
+    cada tema vai para uma parte temporária (parquet; CSV sem pyarrow) e `fechar()` relê as
+    partes em lotes de ~BASE_LINHAS_POR_GRUPO linhas e grava tudo no schema final.
+    """
+
+    def __init__(self, destino: Path, fmt: str, tipos: Dict[str, str], extras: bool = False):
+        self.destino = destino
+        self.fmt = fmt
+        self.tipos = tipos
+        self.extras = extras
+        self.tipos_extras: Dict[str, str] = {}  # dimensão extra -> tipo (dicionário ou texto)
+        self.linhas_por_grupo = max(1, int(getattr(cfg, "BASE_LINHAS_POR_GRUPO", 250_000) or 1))
+        self.total = 0
+        self._pendentes: List[pd.DataFrame] = []
+        self._n_pendentes = 0
+        self._writer = None
+        self._cabecalho = False
+        self._partes: List[Path] = []
+        self._pasta_partes = destino.parent / f"_{destino.name}_partes"
+        self._plano = load_dtype_plan(cfg.DICT_PATH) if extras else {}
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        if destino.exists():
+            destino.unlink()
+        if extras:
+            shutil.rmtree(self._pasta_partes, ignore_errors=True)
+            self._pasta_partes.mkdir(parents=True)
+
+    def escrever(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        self.total += len(df)
+        if self.extras:
+            # texto que esta base não leva (a passada pode ter mantido para outra saída)
+            df = df.drop(columns=[c for c in _COLUNAS_TEXTO + ["valor_raw"] if c not in self.tipos], errors="ignore")
+            for c in df.columns:
+                if c not in self.tipos and c not in self.tipos_extras:
+                    self.tipos_extras[c] = self._plano.get(c, "string")
+            self._partes.append(self._gravar_parte(df))
+            return
+        self._adicionar(_conformar(df, self.tipos), self.tipos)
+
+    def _gravar_parte(self, df: pd.DataFrame) -> Path:
+        nome = self._pasta_partes / f"{len(self._partes):06d}"
+        if pa_pq is None:
+            parte = nome.with_suffix(".csv")
+            df.to_csv(parte, index=False)
+            return parte
+        parte = nome.with_suffix(".parquet")
+        try:
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # coluna de objetos com tipos misturados (ex.: dimensão extra): vai como texto
+            mistas = [c for c in df.columns if df[c].dtype == object or isinstance(df[c].dtype, pd.CategoricalDtype)]
+            tabela = pa.Table.from_pandas(df.astype({c: "string" for c in mistas}), preserve_index=False)
+        pa_pq.write_table(tabela, parte)
+        return parte
+
+    def _ler_parte(self, parte: Path) -> Iterator[pd.DataFrame]:
+        """Parte temporária em lotes de `linhas_por_grupo` linhas (memória ~ um lote)."""
+        if parte.suffix == ".csv":
+            yield from pd.read_csv(parte, dtype=str, chunksize=self.linhas_por_grupo)
+            return
+        for lote in pa_pq.ParquetFile(parte).iter_batches(batch_size=self.linhas_por_grupo):
+            yield lote.to_pandas()
+
+    def _adicionar(self, df: pd.DataFrame, tipos: Dict[str, str]) -> None:
+        self._pendentes.append(df)
+        self._n_pendentes += len(df)
+        if self._n_pendentes >= self.linhas_por_grupo:
+            self._descarregar(tipos)
+
+    def _descarregar(self, tipos: Dict[str, str]) -> None:
+        if not self._pendentes:
+            return
+        df = self._pendentes[0] if len(self._pendentes) == 1 else pd.concat(self._pendentes, ignore_index=True)
+        self._pendentes, self._n_pendentes = [], 0
+        if self.fmt == "parquet":
+            if self._writer is None:
+                self._writer = pa_pq.ParquetWriter(self.destino, _schema_arrow(tipos))
+            tabela = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(tabela, row_group_size=max(self.linhas_por_grupo, len(df)))
+        else:
+            df.to_csv(self.destino, index=False, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING,
+                      mode="a", header=not self._cabecalho)
+            self._cabecalho = True
+
+    def fechar(self) -> int:
+        """Grava o que falta (e, com extras, junta as partes no schema final). Retorna nº de linhas."""
+        tipos = self.tipos
+        if self.extras:
+            # dimensões extras depois das colunas de texto, `valor_raw` por último
+            tipos = {c: t for c, t in self.tipos.items() if c != "valor_raw"}
+            tipos.update(self.tipos_extras)
+            if "valor_raw" in self.tipos:
+                tipos["valor_raw"] = self.tipos["valor_raw"]
+            for parte in self._partes:
+                for lote in self._ler_parte(parte):
+                    self._adicionar(_conformar(lote, tipos), tipos)
+                parte.unlink()
+            shutil.rmtree(self._pasta_partes, ignore_errors=True)
+        self._descarregar(tipos)
+        if self.fmt == "parquet":
+            if self._writer is None:  # base vazia: arquivo só com o schema
+                self._writer = pa_pq.ParquetWriter(self.destino, _schema_arrow(tipos))
+            self._writer.close()
+        elif not self._cabecalho:
+            _conformar(pd.DataFrame(), tipos).to_csv(self.destino, index=False, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING)
+        return self.total
 
 def _compress_csv_to_gz(csv_path: Path, gz_path: Path) -> None:
     with open(csv_path, "rb") as f_in, gzip.open(gz_path, "wb") as f_out:
@@ -211,40 +397,6 @@ def _compress_csv_to_gz(csv_path: Path, gz_path: Path) -> None:
                 break
             f_out.write(chunk)
 
-def _stream_write_csv(files: List[Path], out_csv: Path, filter_ids: Optional[Set[str]] = None, rich: bool = False) -> int:
-    """
-    Escreve CSV incremental (sem carregar tudo na memória).
-    Retorna total de linhas gravadas (aprox).
-    """
-    out_csv.parent.mkdir(parents=True, exist_ok=True)
-    if out_csv.exists():
-        out_csv.unlink()
-
-    wrote_header = False
-    total_rows = 0
-
-    for p in tqdm(files, desc=f"Consolidando -> {out_csv.name}"):
-        try:
-            df = pd.read_csv(p, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, low_memory=False)
-        except Exception:
-            continue
-
-        if filter_ids is not None and "indicador_id" in df.columns:
-            iid = str(df["indicador_id"].dropna().iloc[0]) if df["indicador_id"].notna().any() else ""
-            if iid and iid not in filter_ids:
-                continue
-
-        df_long = transformar_para_long(df, rich=rich)
-        if df_long.empty:
-            continue
-
-        df_long.to_csv(out_csv, index=False, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, mode="a", header=not wrote_header)
-        wrote_header = True
-        total_rows += len(df_long)
-
-    return total_rows
-
-
 def _get_fmt_for_kind(kind: str, rich: bool = False) -> str:
     """
     Permite formatos diferentes:
@@ -261,95 +413,151 @@ def _get_fmt_for_kind(kind: str, rich: bool = False) -> str:
         return str(getattr(cfg, "OUTPUT_FORMAT_DASH") or "").lower().strip()
     return str(getattr(cfg, "OUTPUT_FORMAT", "csv_gz")).lower().strip()
 
-def gerar_base(kind: str, filter_ids: Optional[Set[str]] = None, rich: bool = False) -> None:
-    files = sorted(cfg.OUT_PROCESSADO_CSV.rglob("*.csv"))
-    print(f"Processados CSV encontrados: {len(files)} em {cfg.OUT_PROCESSADO_CSV}")
-
-    fmt = _get_fmt_for_kind(kind, rich=rich)
-
-    if kind.upper() == "FULL":
-        out_parquet = cfg.OUT_BASE_FULL_PARQUET
-        out_gz = cfg.OUT_BASE_FULL_CSV_GZ
-        out_csv = cfg.OUT_BASE_FULL_CSV
-    else:
-        if rich:
-            out_parquet = cfg.OUT_BASE_DASH_RICH_PARQUET
-            out_gz = cfg.OUT_BASE_DASH_RICH_CSV_GZ
-            out_csv = cfg.OUT_BASE_DASH_RICH_CSV
+class Saida:
+    """Uma base de saída da consolidação: escritor + filtro de indicadores + pós-processamento."""
+
+    def __init__(self, kind: str, filter_ids: Optional[Set[str]] = None, rich: bool = False):
+        self.kind = kind
+        self.rotulo = f"{kind} RICA" if rich else kind
+        self.filter_ids = filter_ids
+        self.rich = rich
+        self.fmt = _get_fmt_for_kind(kind, rich=rich)
+
+        if kind.upper() == "FULL":
+            self.out_parquet = cfg.OUT_BASE_FULL_PARQUET
+            self.out_gz = cfg.OUT_BASE_FULL_CSV_GZ
+            self.out_csv = cfg.OUT_BASE_FULL_CSV
+        elif rich:
+            self.out_parquet = cfg.OUT_BASE_DASH_RICH_PARQUET
+            self.out_gz = cfg.OUT_BASE_DASH_RICH_CSV_GZ
+            self.out_csv = cfg.OUT_BASE_DASH_RICH_CSV
         else:
-            out_parquet = cfg.OUT_BASE_DASH_PARQUET
-            out_gz = cfg.OUT_BASE_DASH_CSV_GZ
-            out_csv = cfg.OUT_BASE_DASH_CSV
-
-    # 1) Se parquet estiver disponível, tenta escrever parquet (em memória por arquivo? sem, aqui fazemos fallback)
-    # Para robustez, escrevemos primeiro CSV incremental e depois convertemos.
-    tmp_csv = out_csv
-
-    total = _stream_write_csv(files, tmp_csv, filter_ids=filter_ids, rich=rich)
-    print(f"✅ {kind}: CSV incremental escrito (linhas ~ {total}): {tmp_csv}")
-
-    if fmt == "csv":
-        return
+            self.out_parquet = cfg.OUT_BASE_DASH_PARQUET
+            self.out_gz = cfg.OUT_BASE_DASH_CSV_GZ
+            self.out_csv = cfg.OUT_BASE_DASH_CSV
+
+        if self.fmt == "parquet" and pa_pq is None:
+            print(f"⚠️ {kind}: pyarrow indisponível -> gravando CSV.GZ no lugar do parquet")
+            self.fmt = "csv_gz"
+
+        # parquet: direto, tema a tema (sem CSV intermediário); csv/csv_gz: CSV com cabeçalho fixo
+        extras = rich and getattr(cfg, "RICH_INCLUDE_EXTRA_DIMS", True)
+        self.escritor = EscritorBase(
+            self.out_parquet if self.fmt == "parquet" else self.out_csv,
+            "parquet" if self.fmt == "parquet" else "csv",
+            _tipos_base(rich), extras=extras,
+        )
 
-    if fmt == "csv_gz":
-        if out_gz.exists():
-            out_gz.unlink()
-        _compress_csv_to_gz(tmp_csv, out_gz)
-        print(f"✅ {kind}: CSV.GZ gerado: {out_gz}")
+    def aceita(self, iid: str) -> bool:
+        """Sem filtro aceita tudo; com filtro, só indicadores conhecidos e listados (sem id = fora)."""
+        return self.filter_ids is None or (bool(iid) and iid in self.filter_ids)
+
+    def finalizar(self) -> None:
+        kind = self.kind
+        total = self.escritor.fechar()
+        if self.fmt == "parquet":
+            print(f"✅ {kind}: PARQUET gerado (linhas: {total}): {self.out_parquet}")
+            return
+        print(f"✅ {kind}: CSV escrito (linhas: {total}): {self.out_csv}")
+        if self.fmt == "csv":
+            return
+
+        if self.out_gz.exists():
+            self.out_gz.unlink()
+        _compress_csv_to_gz(self.out_csv, self.out_gz)
+        print(f"✅ {kind}: CSV.GZ gerado: {self.out_gz}")
         if hasattr(cfg, "KEEP_INTERMEDIATE_CSV") and not cfg.KEEP_INTERMEDIATE_CSV:
             try:
-                tmp_csv.unlink()
-                print(f"🧹 {kind}: removido CSV intermediário: {tmp_csv.name}")
+                self.out_csv.unlink()
+                print(f"🧹 {kind}: removido CSV intermediário: {self.out_csv.name}")
             except Exception:
                 pass
+
+def gerar_bases(saidas: List[Saida]) -> None:
+    """
+    Consolida todas as `saidas` numa passada só: cada processado é lido, tem as colunas de
+    valor detectadas e é derretido UMA vez (com dimensões extras/texto se alguma saída
+    pede), e o resultado vai para cada saída que aceita o indicador; o escritor de cada
+    uma projeta as próprias colunas (ver `_tipos_base`).
+    """
+    if not saidas:
         return
+    files = list_processed()
+    print(f"Processados encontrados: {len(files)} em {cfg.OUT_PROCESSADO_CSV} (+ sidecars parquet)")
+    rich = any(s.escritor.extras for s in saidas)
+    manter_texto = any("valor_raw" in s.escritor.tipos for s in saidas)
+    base = " + ".join(s.escritor.destino.name for s in saidas)
+
+    # indicador de cada arquivo pelo índice da etapa 01: temas fora de todos os filtros
+    # (ex.: só DASHBOARD ativo) nem chegam a ser abertos; sem índice não há como saber o
+    # indicador sem abrir o arquivo, então ele fica fora das bases filtradas
+    indice = processed_index()
+    iids = {rel: meta["indicador_id"] for rel, meta in indice.items()}
+    rels = {p: p.relative_to(cfg.OUT_PROCESSADO_CSV).as_posix() for p in files}
+    sem_indice = sum(rels[p] not in iids for p in files)
+    if sem_indice and any(s.filter_ids is not None for s in saidas):
+        print(f"⚠️ {sem_indice} processado(s) fora do índice ({cfg.RELATORIO_VALIDACAO.name}): "
+              "ficam fora do DASHBOARD (rode a etapa 01 para refazer o relatório)")
+    selecionados = []
+    for p in files:
+        if any(s.aceita(iids.get(rels[p], "")) for s in saidas):
+            selecionados.append(p)
+        else:
+            status = "fora_do_filtro" if rels[p] in iids else "sem_indice"
+            metrics.registrar("arquivo", arquivo=rels[p], base=base, status=status)
+    if len(selecionados) < len(files):
+        print(f"🎯 {len(selecionados)}/{len(files)} processados entram em alguma base (demais fora do filtro)")
+
+    # lê à frente (threads) os próximos arquivos enquanto o atual é transformado/escrito
+    fontes = [parquet_sidecar(p) or p for p in selecionados]
+    pre = LeituraAntecipada(fontes, getattr(cfg, "PREFETCH_MB", 0), getattr(cfg, "PREFETCH_THREADS", 2))
+    for src, p in tqdm(zip(pre, selecionados), total=len(selecionados), desc=f"Consolidando -> {' + '.join(s.rotulo for s in saidas)}"):
+        fases = Fases()
+        m = {"arquivo": rels[p], "base": base,
+             "formato": src.suffix.lstrip("."), "bytes": src.stat().st_size if src.exists() else None,
+             "linhas_entrada": None, "linhas_mantidas": 0, "status": "ok", "fases": fases.tempos}
+        try:
+            with fases("leitura"):
+                df = read_processed(p, low_memory=False)
+        except Exception:
+            metrics.registrar("arquivo", **{**m, "status": "erro"})
+            continue
+        m["linhas_entrada"] = len(df)
+
+        iid = iids.get(rels[p], "")
+        if not iid and "indicador_id" in df.columns and df["indicador_id"].notna().any():
+            iid = str(df["indicador_id"].dropna().iloc[0])  # fora do índice (lido pela FULL): coluna do arquivo
+        destinos = [s for s in saidas if s.aceita(iid)]
+        if not destinos:
+            metrics.registrar("arquivo", **{**m, "status": "fora_do_filtro" if iid else "sem_indice"})
+            continue
 
-    # parquet
-    df_parq = pd.read_csv(
-        tmp_csv,
-        sep=cfg.OUT_SEP,
-        encoding=cfg.OUT_ENCODING,
-        low_memory=False,
-        dtype={"cod_municipio":"string","indicador_id":"string","variavel":"string","unidade":"string"},
-    )
-    # normaliza objetos para string (evita falhas por tipo misto no parquet)
-    for c in df_parq.columns:
-        if df_parq[c].dtype == object:
-            df_parq[c] = df_parq[c].astype("string")
-
-    for c in ("ano","mes","territorio_id"):
-        if c in df_parq.columns:
-            df_parq[c] = pd.to_numeric(df_parq[c], errors="coerce").astype("Int64")
-    if "cod_municipio" in df_parq.columns:
-        df_parq["cod_municipio"] = (
-            df_parq["cod_municipio"].astype(str)
-            .str.replace(r"\D+", "", regex=True)
-            .str.zfill(7)
-        )
-    ok = _save_parquet(df_parq, out_parquet)
-    if ok:
-        print(f"✅ {kind}: PARQUET gerado: {out_parquet}")
-        if hasattr(cfg, "KEEP_INTERMEDIATE_CSV") and not cfg.KEEP_INTERMEDIATE_CSV:
-            try:
-                tmp_csv.unlink()
-                print(f"🧹 {kind}: removido CSV intermediário: {tmp_csv.name}")
-            except Exception:
-                pass
-        # opcional: manter o CSV ou remover
-        # tmp_csv.unlink(missing_ok=True)  # python 3.8+? (em 3.10 sim)
-    else:
-        # fallback gzip
-        if out_gz.exists():
-            out_gz.unlink()
-        _compress_csv_to_gz(tmp_csv, out_gz)
-        print(f"✅ {kind}: fallback CSV.GZ gerado: {out_gz}")
-        if hasattr(cfg, "KEEP_INTERMEDIATE_CSV") and not cfg.KEEP_INTERMEDIATE_CSV:
-            try:
-                tmp_csv.unlink()
-                print(f"🧹 {kind}: removido CSV intermediário: {tmp_csv.name}")
-            except Exception:
-                pass
+        with fases("transformacao"):
+            df_long = transformar_para_long(df, rich=rich, manter_texto=manter_texto)
+        if df_long.empty:
+            metrics.registrar("arquivo", **{**m, "status": "vazio"})
+            continue
+        # saídas por tema não levam indicador_id/categoria/fonte/tema (DROP_OUTPUT_COLS):
+        # vêm do índice (texto só se alguma base leva as colunas de texto)
+        meta = {**indice.get(rels[p], {}), "indicador_id": iid}
+        for c in ("indicador_id",) + (("categoria", "fonte", "tema") if manter_texto else ()):
+            if meta.get(c) and (c not in df_long.columns or df_long[c].isna().all()):
+                df_long[c] = constant_categorical(meta[c], len(df_long))
+
+        with fases("escrita"):
+            for s in destinos:
+                s.escritor.escrever(df_long)
+        metrics.registrar("arquivo", **{**m, "linhas_mantidas": len(df_long),
+                                        "bases": [s.escritor.destino.name for s in destinos]})
+
+    for s in saidas:
+        s.finalizar()
 
+def gerar_base(kind: str, filter_ids: Optional[Set[str]] = None, rich: bool = False) -> None:
+    """Uma base só (passada própria); `main` junta as bases ativas em `gerar_bases`."""
+    gerar_bases([Saida(kind, filter_ids=filter_ids, rich=rich)])
+
+@metrics.etapa("04_base_consolidada")
 def main():
     cfg.ensure_dirs()
     assert cfg.OUT_PROCESSADO_CSV.exists(), f"Pasta processada CSV não existe: {cfg.OUT_PROCESSADO_CSV}"
@@ -357,8 +565,9 @@ def main():
     dashboard_ids = selecionar_ids_dashboard()
     dash_set = set(dashboard_ids)
 
+    saidas = []
     if cfg.GENERATE_FULL_BASE:
-        gerar_base("FULL", filter_ids=None, rich=False)
+        saidas.append(Saida("FULL", filter_ids=None, rich=False))
     else:
         print("ℹ️ GENERATE_FULL_BASE=False (pulando FULL)")
 
@@ -366,12 +575,19 @@ def main():
         if len(dash_set) == 0:
             print("ℹ️ DASHBOARD: nenhum indicador selecionado -> pulando geração.")
         else:
-            gerar_base("DASHBOARD", filter_ids=dash_set, rich=False)
+            saidas.append(Saida("DASHBOARD", filter_ids=dash_set, rich=False))
         # DASHBOARD RICO
         if getattr(cfg, 'GENERATE_DASHBOARD_RICH_BASE', False):
-            gerar_base("DASHBOARD", filter_ids=dash_set, rich=True)
+            saidas.append(Saida("DASHBOARD", filter_ids=dash_set, rich=True))
     else:
         print("ℹ️ GENERATE_DASHBOARD_BASE=False (pulando DASHBOARD)")
 
+    # uma leitura/transformação por processado para todas as bases (ou uma passada por base)
+    if getattr(cfg, "CONSOLIDACAO_UNICA", False):
+        gerar_bases(saidas)
+    else:
+        for s in saidas:
+            gerar_bases([s])
+
 if __name__ == "__main__":
     main()
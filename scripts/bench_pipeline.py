@@ -0,0 +1,259 @@
+"""
+bench_pipeline.py
+Micro-benchmarks das rotinas quentes do pipeline (rodar a partir de scripts/).
+
+Uso:
+    python bench_pipeline.py mun [--linhas 1000000]
+    python bench_pipeline.py csv [--pasta Indicadores] [--maiores 5]
+    python bench_pipeline.py mem [--arquivos 200] [--linhas 5000]
+    python bench_pipeline.py num [--linhas 1000000] [--colunas 8]
+    python bench_pipeline.py melt [--arquivo CSV] [--linhas 5570] [--colunas 300]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import pipeline_config as cfg
+from pipeline_utils import (
+    build_indicador_id, concat_frames, constant_categorical, list_processed, normalize_mun_series,
+    pa_csv, parse_numero_br, read_csv_fast, read_processed, read_processed_columns, sniff_csv, zfill_mun,
+)
+
+def _cronometra(fn, repeticoes: int = 3) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+def bench_mun(linhas: int) -> None:
+    """`zfill_mun` linha a linha (.apply) x `normalize_mun_series` numa coluna de 1M linhas."""
+    rng = np.random.default_rng(0)
+    tsbio = [m for t in cfg.TSBIO for m in t["CD_MUN"]]
+    nacionais = [str(1100015 + 7 * i) for i in range(5570)]
+    base = rng.choice(nacionais + tsbio, size=linhas)
+
+    colunas = {
+        "int": pd.Series(base.astype(np.int64)),
+        "float": pd.Series(base.astype(np.float64)),
+        "str": pd.Series(base.astype(object)),
+        "str_float": pd.Series(np.char.add(base.astype(str), ".0").astype(object)),
+    }
+    print(f"Linhas por coluna: {linhas:,}")
+    print(f"{'tipo':<10} {'apply(zfill_mun)':>18} {'normalize_mun_series':>22} {'ganho':>8}")
+    for nome, s in colunas.items():
+        t_old = _cronometra(lambda: s.apply(zfill_mun), repeticoes=1)
+        t_new = _cronometra(lambda: normalize_mun_series(s))
+        if nome != "str_float":  # zfill_mun não trata "1508159.0" como texto
+            assert (s.apply(zfill_mun) == normalize_mun_series(s)).all(), nome
+        print(f"{nome:<10} {t_old:>17.3f}s {t_new:>21.3f}s {t_old / t_new:>7.1f}x")
+
+def bench_csv(pasta: Path, maiores: int) -> None:
+    """Backend pandas x pyarrow (`read_csv_fast`) nos maiores CSVs de `pasta`."""
+    if pa_csv is None:
+        print("⚠️ pyarrow não instalado: só o backend pandas está disponível.")
+        return
+    arquivos = sorted(pasta.rglob("*.csv"), key=lambda p: p.stat().st_size, reverse=True)[:maiores]
+    if not arquivos:
+        print(f"Nenhum CSV em {pasta}")
+        return
+
+    print(f"{'arquivo':<50} {'MB':>8} {'pandas':>9} {'pyarrow':>9} {'ganho':>8}")
+    for p in arquivos:
+        d = sniff_csv(p)
+        ler = lambda eng: read_csv_fast(p, sep=d.sep, encoding=d.encoding, skiprows=d.skiprows, engine=eng)
+        try:
+            t_pd = _cronometra(lambda: ler("pandas"))
+            t_pa = _cronometra(lambda: ler("pyarrow"))
+        except Exception as e:
+            print(f"{p.name[:50]:<50} erro: {e}")
+            continue
+        mb = p.stat().st_size / 1e6
+        print(f"{p.name[:50]:<50} {mb:>8.1f} {t_pd:>8.3f}s {t_pa:>8.3f}s {t_pd / t_pa:>7.1f}x")
+
+def bench_mem(arquivos: int, linhas: int) -> None:
+    """Memória de um tema da etapa 01 (metadados em texto x categóricas + arquivo_id)."""
+    rng = np.random.default_rng(0)
+    categoria, fonte, tema = "Uso e Cobertura do Solo", "MapBiomas", "Cobertura e uso da terra por classe"
+    iid = build_indicador_id(categoria, fonte, tema)
+
+    def dados(i: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            "cod_municipio": rng.choice(["1500602", "1505809", "1600303", "1304203"], size=linhas).astype(object),
+            "ano": rng.integers(1985, 2024, size=linhas),
+            "area_ha": rng.random(linhas) * 1000,
+        })
+
+    def texto(i: int) -> pd.DataFrame:
+        df = dados(i)
+        meta = {"indicador_id": iid, "categoria": categoria, "fonte": fonte, "tema": tema,
+                "recorte_origem": f"Municípios {i:04d}", "arquivo_origem": f"{fonte} - {tema} - Municípios {i:04d}.csv"}
+        for c, v in meta.items():
+            df[c] = v
+        return df
+
+    def categorico(i: int) -> pd.DataFrame:
+        df = dados(i)
+        n = len(df)
+        for c, v in (("indicador_id", iid), ("categoria", categoria), ("fonte", fonte), ("tema", tema),
+                     ("recorte_origem", f"Municípios {i:04d}")):
+            df[c] = constant_categorical(v, n)
+        df["arquivo_id"] = np.int32(i)
+        return df
+
+    meta_cols = ["indicador_id", "categoria", "fonte", "tema", "recorte_origem", "arquivo_origem", "arquivo_id"]
+    print(f"Tema com {arquivos} arquivos x {linhas:,} linhas = {arquivos * linhas:,} linhas")
+    print(f"{'modo':<24} {'metadados MB':>13} {'total MB':>10} {'concat':>9}")
+    for nome, gerar, concat in (("texto (antes)", texto, lambda d: pd.concat(d, ignore_index=True)),
+                                ("categórico (depois)", categorico, concat_frames)):
+        dfs = [gerar(i) for i in range(arquivos)]
+        t0 = time.perf_counter()
+        big = concat(dfs)
+        t = time.perf_counter() - t0
+        uso = big.memory_usage(index=False, deep=True)
+        meta = uso[[c for c in meta_cols if c in uso.index]].sum() / 1e6
+        print(f"{nome:<24} {meta:>13.1f} {uso.sum() / 1e6:>10.1f} {t:>8.3f}s")
+
+def _cadeia_antiga(s: pd.Series) -> pd.Series:
+    """Conversão da etapa 04 antes de `parse_numero_br` (rodava na detecção e de novo no melt)."""
+    return pd.to_numeric(
+        s.astype(str).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+         .str.replace("%", "", regex=False).str.replace(" ", "", regex=False),
+        errors="coerce",
+    )
+
+def bench_num(linhas: int, colunas: int) -> None:
+    """Detecção + melt: cadeia de `str.replace` (2x por coluna) x `parse_numero_br` (1x)."""
+    rng = np.random.default_rng(0)
+    v = rng.random(linhas) * 1e6
+    tipos = {
+        "pt_milhar": pd.Series([f"{x:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".") for x in v], dtype=object),
+        "pt_decimal": pd.Series([f"{x:.2f}".replace(".", ",") for x in v], dtype=object),
+        "pct": pd.Series([f"{x % 100:.1f} %".replace(".", ",") for x in v], dtype=object),
+        "float": pd.Series(v),
+    }
+    print(f"Linhas por coluna: {linhas:,} | colunas por tema: {colunas}")
+    print(f"{'tipo':<11} {'cadeia x2':>10} {'parse_numero_br':>16} {'ganho':>8} {'divergem':>10}")
+    for nome, s in tipos.items():
+        t_old = _cronometra(lambda: [_cadeia_antiga(s) for _ in range(2)], repeticoes=1)
+        t_new = _cronometra(lambda: parse_numero_br(s))
+        old, new = _cadeia_antiga(s).to_numpy(dtype=float), parse_numero_br(s)
+        diverge = int((~np.isclose(old, new, equal_nan=True)).sum())
+        print(f"{nome:<11} {t_old:>9.3f}s {t_new:>15.3f}s {t_old / t_new:>7.1f}x {diverge:>10,}")
+    print("(divergem em float: a cadeia antiga tirava o ponto decimal de 1.5 -> 15)")
+
+    # tema largo: a cadeia antiga rodava nas colunas e de novo no valor_raw empilhado
+    df = pd.DataFrame({f"v{i}": tipos["pt_decimal"].sample(frac=1, random_state=i).to_numpy() for i in range(colunas)})
+    def antes():
+        for c in df.columns:
+            _cadeia_antiga(df[c])
+        _cadeia_antiga(pd.melt(df)["value"])
+    def depois():
+        np.concatenate([parse_numero_br(df[c]) for c in df.columns])
+    t_old, t_new = _cronometra(antes, repeticoes=1), _cronometra(depois, repeticoes=1)
+    print(f"{'tema largo':<11} {t_old:>9.3f}s {t_new:>15.3f}s {t_old / t_new:>7.1f}x")
+
+def _memoria(fn) -> Tuple[float, float]:
+    """(segundos, pico MB) de `fn()`; o pico conta as alocações do numpy/pandas (tracemalloc)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    t = time.perf_counter() - t0
+    pico = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return t, pico
+
+def _melt_antigo(etapa04, df: pd.DataFrame) -> pd.DataFrame:
+    """`transformar_para_long` antes do construtor por índices (pd.melt + filtro + cópias)."""
+    id_cols = [c for c in ("territorio_id", "territorio_nome", "cod_municipio", "ano", "mes", "indicador_id",
+                           "tema", "categoria", "fonte", "recorte_origem", "arquivo_origem") if c in df.columns]
+    value_cols = etapa04.identificar_colunas_valor(df)
+    melted = pd.melt(df, id_vars=id_cols, value_vars=value_cols, var_name="variavel", value_name="valor_raw")
+    melted["valor_num"] = _cadeia_antiga(melted["valor_raw"])
+    melted["unidade"] = melted["variavel"].map(etapa04.infer_unidade_from_variavel)
+    if cfg.ONLY_NUMERIC_ROWS:
+        melted = melted[melted["valor_num"].notna()].copy()
+    return melted
+
+def _tema_largo(linhas: int, colunas: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "territorio_id": rng.integers(1, 7, size=linhas),
+        "territorio_nome": rng.choice(["Altamira", "Marajó", "Xingu"], size=linhas).astype(object),
+        "cod_municipio": np.char.add("15", rng.integers(10000, 99999, size=linhas).astype(str)).astype(object),
+        "recorte_origem": "Municípios", "arquivo_origem": "AdaptaBrasil - Tema largo - Municípios.csv",
+    })
+    valores = {f"indice_{j:03d}": pd.Series(np.char.replace((rng.random(linhas) * 100).round(2).astype(str), ".", ","),
+                                            dtype=object).where(rng.random(linhas) > 0.1, "")
+               for j in range(colunas)}
+    return pd.concat([df, pd.DataFrame(valores)], axis=1)
+
+def bench_melt(arquivo: Optional[Path], linhas: int, colunas: int) -> None:
+    """`pd.melt` (antes) x construtor por índices da etapa 04, no tema mais largo (ou sintético)."""
+    etapa04 = importlib.import_module("04_gerar_base_consolidada_full_e_dashboard")
+    if arquivo is None:
+        larguras = {p: len(read_processed_columns(p)) for p in list_processed()}
+        arquivo = max(larguras, key=larguras.get) if larguras else None
+    if arquivo is not None:
+        df = read_processed(arquivo, low_memory=False)
+        print(f"Tema mais largo: {arquivo.name} ({len(df):,} linhas x {len(df.columns)} colunas)")
+    else:
+        df = _tema_largo(linhas, colunas)
+        print(f"Sem processados: tema sintético ({linhas:,} linhas x {colunas} colunas de valor)")
+
+    print(f"{'modo':<22} {'tempo':>8} {'pico MB':>9} {'linhas':>12}")
+    for nome, fn in (("pd.melt (antes)", lambda d: _melt_antigo(etapa04, d)),
+                     ("índices (depois)", lambda d: etapa04.transformar_para_long(d, manter_texto=True))):
+        d = df.copy()
+        res = []
+        t, pico = _memoria(lambda: res.append(fn(d)))
+        print(f"{nome:<22} {t:>7.3f}s {pico:>9.1f} {len(res[0]):>12,}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("mun", help="normalização de código de município")
+    p.add_argument("--linhas", type=int, default=1_000_000)
+
+    p = sub.add_parser("csv", help="leitura de CSV: backend pandas x pyarrow")
+    p.add_argument("--pasta", type=Path, default=cfg.ROOT_RAW)
+    p.add_argument("--maiores", type=int, default=5)
+
+    p = sub.add_parser("mem", help="memória dos metadados por linha na etapa 01")
+    p.add_argument("--arquivos", type=int, default=200)
+    p.add_argument("--linhas", type=int, default=5000)
+
+    p = sub.add_parser("num", help="conversão de números em texto: cadeia str.replace x parse_numero_br")
+    p.add_argument("--linhas", type=int, default=1_000_000)
+    p.add_argument("--colunas", type=int, default=8)
+
+    p = sub.add_parser("melt", help="base longa: pd.melt x construtor por índices (tempo e pico de memória)")
+    p.add_argument("--arquivo", type=Path, default=None, help="processado a usar (padrão: o de mais colunas)")
+    p.add_argument("--linhas", type=int, default=5570, help="tema sintético, se não houver processados")
+    p.add_argument("--colunas", type=int, default=300)
+
+    args = ap.parse_args()
+    if args.bench == "mun":
+        bench_mun(args.linhas)
+    elif args.bench == "csv":
+        bench_csv(args.pasta, args.maiores)
+    elif args.bench == "mem":
+        bench_mem(args.arquivos, args.linhas)
+    elif args.bench == "num":
+        bench_num(args.linhas, args.colunas)
+    elif args.bench == "melt":
+        bench_melt(args.arquivo, args.linhas, args.colunas)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+pipeline_adapters.py
+Adaptadores de formato bruto da etapa 01: brutos que não seguem o formato "uma tabela
+longa por tema" são reconhecidos pelo nome do arquivo ou pelo cabeçalho e lidos direto
+para os buckets, sem gerar arquivos intermediários.
+
+Cada adaptador informa:
+- `casa(path, cab)`:  se o bruto é dele (`cab` = dialeto + primeiras linhas do arquivo);
+- `temas(path, cab)`: os (fonte, tema, recorte) que o bruto gera — só com o cabeçalho,
+                      para o manifesto/incremental e os filtros saberem os temas antes de ler;
+- `ler(path, categoria, lookup, stats)`: gera tuplas (categoria, fonte, tema, DataFrame).
+  Roda nos workers da ingestão, então não depende de `cfg`; pode gerar temas a mais
+  (a etapa 01 fica só com os listados por `temas`).
+
+Ativos e ordem de tentativa: cfg.ADAPTADORES.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+import pipeline_config as cfg
+from pipeline_utils import (
+    CsvDialect, TsbioLookup, detect_caged_wide, parse_parts_from_filename,
+    read_caged_wide, read_csv_local, read_header_rows, slugify,
+)
+
+class Cabecalho(NamedTuple):
+    dialeto: CsvDialect
+    linhas: List[List[str]]
+
+Parte = Tuple[str, str, str, pd.DataFrame]  # (categoria, fonte, tema, df)
+
+class Adaptador(NamedTuple):
+    nome: str
+    casa: Callable[[Path, Cabecalho], bool]
+    temas: Callable[[Path, Cabecalho], List[Tuple[str, str, str]]]
+    ler: Callable[[Path, str, Optional[TsbioLookup], Dict], Iterator[Parte]]
+
+ADAPTADORES: Dict[str, Adaptador] = {}
+_LINHAS_CAB = 6
+
+def registrar(adaptador: Adaptador) -> Adaptador:
+    ADAPTADORES[adaptador.nome] = adaptador
+    return adaptador
+
+def ativos() -> List[Adaptador]:
+    return [ADAPTADORES[n] for n in getattr(cfg, "ADAPTADORES", []) or [] if n in ADAPTADORES]
+
+def encontrar_adaptador(path: Path, adaptadores: Optional[List[Adaptador]] = None,
+                        cab: Optional[Cabecalho] = None) -> Optional[Tuple[Adaptador, Cabecalho]]:
+    """
+    1º adaptador ativo que reconhece o bruto. Sem `cab` (ex.: o do inventário,
+    pipeline_inventario), lê só o prefixo do arquivo.
+    """
+    adaptadores = ativos() if adaptadores is None else adaptadores
+    if not adaptadores:
+        return None
+    cab = cab or Cabecalho(*read_header_rows(path, _LINHAS_CAB))
+    for a in adaptadores:
+        if a.casa(path, cab):
+            return a, cab
+    return None
+
+# ---------- CAGED largo (Mês/Ano x métricas) ----------
+def _caged_temas(path: Path, cab: Cabecalho) -> List[Tuple[str, str, str]]:
+    return [parse_parts_from_filename(path.name)]
+
+def _caged_ler(path: Path, categoria: str, lookup: Optional[TsbioLookup], stats: Dict) -> Iterator[Parte]:
+    fonte, tema, _ = parse_parts_from_filename(path.name)
+    df = read_caged_wide(path, lookup, stats=stats)
+    if df is not None:
+        yield categoria, fonte, tema, df
+
+registrar(Adaptador(
+    "caged_largo",
+    casa=lambda path, cab: detect_caged_wide(cab.linhas) is not None,
+    temas=_caged_temas,
+    ler=_caged_ler,
+))
+
+# ---------- Censo Agro (um indicador por coluna -> um tema por coluna) ----------
+CENSO_AGRO_COL_MUN = "Código do Município"
+_RE_CENSO_AGRO = re.compile(r"censo_?agro")
+
+def _limpar_coluna(c) -> str:
+    c = str(c).replace("\ufeff", "").strip()
+    return re.sub(r"\s+", " ", c)
+
+def _tema_da_coluna(col: str) -> str:
+    """Mesmo nome de tema do antigo arquivo por coluna ("IBGE Censo Agro 2017 - <tema> - ...")."""
+    t = re.sub(r"\s+", " ", col.strip())
+    t = t.replace("%", "pct").replace("/", "-").replace("\\", "-")
+    t = re.sub(r"[()]", "", t)
+    t = re.sub(r'[<>:"|?*]+', "_", t).strip()
+    return t[:160]
+
+def _censo_agro_fonte_recorte(path: Path) -> Tuple[str, str]:
+    """Nome no padrão "Fonte - Tema - Recorte.csv" manda; senão "IBGE Censo Agro <ano>"."""
+    if re.search(r"\s+-\s+", path.stem):
+        fonte, _, recorte = parse_parts_from_filename(path.name)
+        return fonte, recorte or "Municípios"
+    ano = re.search(r"(19|20)\d{2}", path.stem)
+    return f"IBGE Censo Agro {ano.group(0)}" if ano else "IBGE Censo Agro", "Municípios"
+
+def _censo_agro_colunas(colunas: List[str], alvo: Optional[List[str]] = None) -> Tuple[Optional[str], List[str]]:
+    """(coluna de município, colunas que viram tema): `alvo` ou todas as outras."""
+    mun = next((c for c in colunas if slugify(c) == slugify(CENSO_AGRO_COL_MUN)), None)
+    alvo = alvo or [c for c in colunas if c and c != mun]
+    return mun, [c for c in alvo if c in colunas]
+
+def _censo_agro_casa(path: Path, cab: Cabecalho) -> bool:
+    if not _RE_CENSO_AGRO.search(slugify(path.stem)) or not cab.linhas:
+        return False
+    mun, alvo = _censo_agro_colunas([_limpar_coluna(c) for c in cab.linhas[0]], getattr(cfg, "CENSO_AGRO_COLUNAS", None))
+    return mun is not None and bool(alvo)
+
+def _censo_agro_temas(path: Path, cab: Cabecalho) -> List[Tuple[str, str, str]]:
+    fonte, recorte = _censo_agro_fonte_recorte(path)
+    _, alvo = _censo_agro_colunas([_limpar_coluna(c) for c in cab.linhas[0]], getattr(cfg, "CENSO_AGRO_COLUNAS", None))
+    return [(fonte, _tema_da_coluna(c), recorte) for c in alvo]
+
+def _censo_agro_ler(path: Path, categoria: str, lookup: Optional[TsbioLookup], stats: Dict) -> Iterator[Parte]:
+    # a tabela é lida UMA vez; cada coluna sai como (município, coluna). Gera todas as
+    # colunas: quem chama fica só com os temas listados por `temas()` (cfg.CENSO_AGRO_COLUNAS)
+    df = read_csv_local(path)
+    df.columns = [_limpar_coluna(c) for c in df.columns]
+    stats["linhas_entrada"] = len(df)
+    fonte, _ = _censo_agro_fonte_recorte(path)
+    mun, alvo = _censo_agro_colunas(list(df.columns))
+    if mun is None:
+        return
+    for col in alvo:
+        yield categoria, fonte, _tema_da_coluna(col), df[[mun, col]]
+
+registrar(Adaptador(
+    "censo_agro",
+    casa=_censo_agro_casa,
+    temas=_censo_agro_temas,
+    ler=_censo_agro_ler,
+))
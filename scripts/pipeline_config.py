@@ -17,6 +17,7 @@ ROOT_RAW = DATA_DIR / "Indicadores"
 OUT_PROCESSADO = DATA_DIR / "Indicadores_processado_por_tema"
 OUT_PROCESSADO_CSV = OUT_PROCESSADO / "csv"
 OUT_PROCESSADO_XLSX = OUT_PROCESSADO / "xlsx"
+OUT_PROCESSADO_PARQUET = OUT_PROCESSADO / "parquet"
 OUT_DIR = OUT_PROCESSADO / "outputs"
 
 # Dicionário oficial (coloque este arquivo em fas_tsbio\notebook\)
@@ -29,11 +30,142 @@ OUT_ENCODING = "utf-8-sig"
 # Exportar por tema (TdR pediu CSV + XLSX)
 EXPORT_PROCESSADO_CSV = True
 EXPORT_PROCESSADO_XLSX = True
+# Sidecar parquet (tipado) por tema, ao lado do CSV: as etapas 02–04 leem dele quando existe
+EXPORT_PROCESSADO_PARQUET = True
+
+# Ingestão paralela da etapa 01 (nº de processos lendo brutos)
+# - 1: serial (modo antigo)
+# - 0: usa todos os núcleos da máquina
+INGEST_WORKERS = 0
+# Brutos em voo no pool (enviados e ainda não juntados aos buckets); cada um ocupa
+# memória no processo principal fora do SPILL_LIMITE_MB. 0 = 2 por worker.
+INGEST_JANELA = 0
+
+# Leitura antecipada (etapa 01 em série e etapa 04): threads carregam os bytes dos
+# próximos arquivos enquanto o atual é interpretado, com no máximo PREFETCH_MB em
+# memória. Ajuda em disco de rede/frio; com workers da etapa 01, cada um lê o seu.
+# - 0: desliga
+PREFETCH_MB = 256
+PREFETCH_THREADS = 2
+
+# Pré-filtro de municípios: lê cada bruto em streaming e descarta, ANTES do pandas,
+# as linhas cujo código de município não pode ser TSBio (tabelas nacionais encolhem ~100x).
+PREFILTRO_MUN = True
+
+# Adaptadores de formato bruto (pipeline_adapters.py), na ordem de tentativa. Leem direto
+# para os buckets da etapa 01, sem arquivos intermediários:
+# - "caged_largo": cabeçalho "Mês/Ano x (Estoque, Admissões, Desligamentos, Saldos)"
+#                  -> uma linha por município x mês;
+# - "censo_agro":  tabela do Censo Agro ("censo agro" no nome do arquivo) com um
+#                  indicador por coluna -> um tema por coluna.
+ADAPTADORES = ["caged_largo", "censo_agro"]
+# Colunas do Censo Agro que viram tema (vazio = todas, exceto o código do município)
+CENSO_AGRO_COLUNAS = [
+    "Estabelecimento Agropecuário",
+    "Área média (ha)",
+    "Média de pessoal ocupado por estabelecimento",
+    "Média da área de lavouras por adubadeira (ha)",
+    "Média da área de lavouras por colheitadeira (ha)",
+    "Média da área de lavouras por semeadeira (ha)",
+    "Média da área de lavouras por trator (ha)",
+    "Atividade-Lavoura Temporária (%)",
+    "Atividade-Lavoura Permanente (%)",
+    "Atividade-Pecuária (%)",
+    "Atividade-Horticultura&Floricultura (%)",
+    "Atividade-Sementes&Mudas (%)",
+    "Atividade-Produção Florestal (%)",
+    "Atividade-Pesca (%)",
+    "Atividade-Aquicultura (%)",
+    "Uso das terras-Lavoura (%)",
+    "Uso das terras-Pastagem (%)",
+    "Aves-Corte (%)",
+    "Aves-Ovos (%)",
+    "Bovinos-Corte (%)",
+    "Bovinos-Leite (%)",
+    "Rendimento-Arroz (kg/ha)",
+    "Rendimento-Cana (kg/ha)",
+    "Rendimento-Mandioca (kg/ha)",
+    "Rendimento-Milho (kg/ha)",
+    "Rendimento-Soja (kg/ha)",
+    "Rendimento-Trigo (kg/ha)",
+    "Rendimento-Cacau (kg/ha)",
+    "Rendimento-Café (kg/ha)",
+    "Rendimento-Laranja (kg/ha)",
+    "Rendimento-Uva (kg/ha)",
+    "Carga de Bovinos (n/ha)",
+    "Cisterna (%)",
+    "Utilização de Agrotóxicos (%)",
+    "Despesa com Agrotóxicos (%)",
+    "Uso de irrigação (%)",
+    "Assistência Técnica (%)",
+    "Agricultura familiar (%)",
+    "Produtor com escolaridade até Ensino Fundamental (%)",
+]
+
+# Leitura tipada: a coluna `dtype` do dicionário vira um plano de tipos passado ao read_csv
+# (cod_municipio como texto, ano/mes como inteiros pequenos, float onde declarado).
+# Valor que não cabe no tipo (ex.: "2020.0" num inteiro) -> o arquivo é relido sem o plano.
+# Opcional (padrão False: todas as colunas lidas como texto, como antes).
+LEITURA_TIPADA = False
+
+# Escrita dos XLSX por tema (etapa 01) em processos de fundo, no modo write-only
+# do openpyxl, em paralelo com o CSV e os próximos temas.
+# - 1: serial (grava no próprio laço)
+# - 0: usa todos os núcleos da máquina
+XLSX_WORKERS = 0
+
+# Backend de leitura de CSV (etapas 01–04):
+# - "pandas": leitor padrão do pandas (padrão)
+# - "pyarrow": opcional; leitor multithread do Arrow, strings Arrow (cai no pandas se falhar).
+#   Exige o pacote pyarrow; sem ele, segue no pandas.
+CSV_ENGINE = "pandas"
 
 # Relatórios do processamento (ficam na raiz de Indicadores_processado_por_tema)
 RELATORIO_VALIDACAO = OUT_PROCESSADO / "_relatorio_validacao.csv"
 RELATORIO_SEM_MUN = OUT_PROCESSADO / "_sem_coluna_cod_municipio.csv"
 RELATORIO_ERROS = OUT_PROCESSADO / "_erros_leitura.csv"
+# Cobertura tema x município TSBio (x ano, se COBERTURA_POR_ANO), em formato longo,
+# e % de municípios cobertos por território (tema x território)
+COBERTURA_POR_ANO = True
+COBERTURA = OUT_PROCESSADO / "_cobertura.parquet"
+COBERTURA_TERRITORIOS = OUT_PROCESSADO / "_cobertura_territorios.csv"
+# Brutos com conteúdo idêntico (tamanho -> sha1): cada conteúdo é lido uma vez só.
+# Cópias no mesmo tema são descartadas (linhas repetidas); em outro tema, reaproveitam a leitura.
+# Opcional (padrão False: cada bruto é lido e entra no tema, mesmo repetido).
+DEDUP_BRUTOS = False
+RELATORIO_DUPLICADOS = OUT_PROCESSADO / "_duplicados.csv"
+# arquivo_id (usado nos buckets da etapa 01) -> bruto de origem
+TABELA_ARQUIVOS = OUT_PROCESSADO / "_arquivos_origem.csv"
+
+# Execução incremental da etapa 01: reprocessa só os temas (categoria, fonte, tema)
+# cujos brutos mudaram (tamanho/mtime -> hash do conteúdo) e apaga saídas de temas
+# que sumiram. O manifesto fica ao lado do relatório de validação.
+# Opcional (padrão False: todos os temas são reconstruídos a cada execução).
+INCREMENTAL = False
+MANIFESTO_BRUTOS = OUT_PROCESSADO / "_manifesto_brutos.csv"
+# Cache do "sniff" (encoding/separador/linha sep=) por arquivo (caminho+tamanho+mtime)
+CACHE_SNIFF = OUT_PROCESSADO / "_cache_sniff.json"
+# Planos de ingestão por cabeçalho de bruto (renomeação, coluna de município, dtypes,
+# papel das colunas), por hash do cabeçalho + versão do dicionário
+CACHE_PLANOS = OUT_PROCESSADO / "_cache_planos.json"
+# Inventário dos brutos (SQLite, pipeline_inventario.py): caminho, categoria/fonte/tema,
+# tamanho, mtime e cabeçalho; atualizado só nos arquivos novos ou alterados
+INVENTARIO_BRUTOS = OUT_PROCESSADO / "_inventario_brutos.sqlite"
+
+# Teto de memória (MB) para as tabelas acumuladas por tema na etapa 01.
+# Ao passar do teto, os temas em memória são despejados em arquivos temporários
+# (parquet) em SPILL_DIR e relidos um tema por vez na exportação.
+# O teto é APROXIMADO: conta só o que já entrou nos buckets (memory_usage). O pico real
+# soma o bruto sendo lido, os resultados em voo da ingestão paralela (INGEST_JANELA)
+# e o maior tema na exportação; deixe folga para isso.
+# - 0: sem teto (tudo em memória, modo antigo)
+SPILL_LIMITE_MB = 2048
+SPILL_DIR = OUT_PROCESSADO / "_spill"
+
+# Métricas de desempenho (por arquivo e por etapa, etapas 01–04) em JSON Lines.
+# Resumo: python pipeline_metrics.py resumo
+METRICS = True
+METRICS_PATH = OUT_DIR / "_metrics.jsonl"
 
 # Catálogo / documentação
 OUT_CATALOGO_CSV = OUT_DIR / "catalogo_indicadores_tsbio.csv"
@@ -81,10 +213,16 @@ DASHBOARD_FLAG_COLUMN = "dashboard"  # sim/nao, 1/0, true/false
 DASHBOARD_USE_FALLBACK = True
 # Quantos indicadores pegar no fallback (se habilitado)
 DASHBOARD_FALLBACK_MAX = 80
-# Manter o CSV intermediário (não comprimido) gerado na consolidação?
-# - False: mantém apenas parquet/csv.gz (menos confuso e economiza espaço)
+# Manter o CSV intermediário (não comprimido) das bases em csv_gz?
+# (bases em parquet são gravadas direto, sem CSV intermediário)
+# - False: mantém apenas o .csv.gz (menos confuso e economiza espaço)
 # - True: mantém também o .csv
 KEEP_INTERMEDIATE_CSV = False
+# Gera FULL, DASHBOARD e DASHBOARD RICA numa passada só (cada processado é lido e
+# derretido uma vez). Opcional (padrão False: uma passada por base, modo antigo).
+CONSOLIDACAO_UNICA = False
+# Linhas por row group nas bases em parquet (temas pequenos se juntam até esse total)
+BASE_LINHAS_POR_GRUPO = 250_000
 
 # ===== TSBio (6 territórios) =====
 TSBIO = [
@@ -99,4 +237,5 @@ TSBIO = [
 def ensure_dirs() -> None:
     OUT_PROCESSADO_CSV.mkdir(parents=True, exist_ok=True)
     OUT_PROCESSADO_XLSX.mkdir(parents=True, exist_ok=True)
+    OUT_PROCESSADO_PARQUET.mkdir(parents=True, exist_ok=True)
     OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,213 @@
+"""
+pipeline_inventario.py
+Inventário dos brutos (cfg.ROOT_RAW) em SQLite (cfg.INVENTARIO_BRUTOS): um registro por
+CSV com caminho, categoria, fonte, tema, recorte, tamanho, mtime e impressão digital do
+cabeçalho (+ dialeto e primeiras linhas, usados na detecção de adaptadores).
+
+A atualização é incremental: a árvore é varrida com `os.scandir` (só metadados) e apenas
+arquivos novos ou com tamanho/mtime diferentes têm o nome reinterpretado e o cabeçalho
+relido; os que sumiram saem do índice.
+
+Listar temas sem reabrir os brutos:
+    python pipeline_inventario.py listar-temas [--categoria X] [--tema Y] [--top 50] [--sem-atualizar]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+import pipeline_config as cfg
+from pipeline_utils import CsvDialect, parse_parts_from_filename, read_header_rows, slugify
+
+# Muda quando a interpretação do nome/cabeçalho muda (o índice é refeito do zero)
+_INVENTARIO_VERSAO = 1
+_LINHAS_CAB = 6  # = pipeline_adapters._LINHAS_CAB
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS brutos (
+    arquivo   TEXT PRIMARY KEY,   -- caminho relativo à raiz (posix)
+    categoria TEXT NOT NULL,
+    fonte     TEXT NOT NULL,
+    tema      TEXT NOT NULL,
+    recorte   TEXT NOT NULL,
+    tamanho   INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    cabecalho TEXT NOT NULL,      -- sha1 das células da 1ª linha ("" se ilegível)
+    dialeto   TEXT,               -- JSON [encoding, sep, skiprows]
+    linhas    TEXT                -- JSON das primeiras linhas, já separadas em células
+);
+CREATE INDEX IF NOT EXISTS ix_brutos_tema ON brutos (categoria, fonte, tema);
+CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+"""
+
+class Bruto(NamedTuple):
+    path: Path
+    arquivo: str
+    categoria: str
+    fonte: str
+    tema: str
+    recorte: str
+    tamanho: int
+    mtime_ns: int
+    cabecalho: str
+    dialeto: Optional[CsvDialect]
+    linhas: List[List[str]]
+
+def caminho() -> Path:
+    return Path(getattr(cfg, "INVENTARIO_BRUTOS", cfg.OUT_PROCESSADO / "_inventario_brutos.sqlite"))
+
+def categoria_do_caminho(rel: Path) -> str:
+    """Categoria = 1º nível de pasta abaixo da raiz ("(raiz)" para arquivos soltos)."""
+    return rel.parts[0] if len(rel.parts) >= 2 else "(raiz)"
+
+def impressao_cabecalho(celulas: List[str]) -> str:
+    return hashlib.sha1("\x1f".join(celulas).encode("utf-8")).hexdigest()
+
+def _varrer(raiz: Path) -> Iterator[Tuple[str, os.stat_result]]:
+    """(caminho, stat) de cada *.csv abaixo de `raiz`, sem abrir os arquivos."""
+    pilha = [str(raiz)]
+    while pilha:
+        try:
+            with os.scandir(pilha.pop()) as it:
+                for e in it:
+                    if e.is_dir():
+                        pilha.append(e.path)
+                    elif e.name.endswith(".csv") and e.is_file():
+                        yield e.path, e.stat()
+        except OSError:
+            continue
+
+def _novo(raiz: Path, p: Path, st: os.stat_result) -> Tuple:
+    rel = p.relative_to(raiz)
+    fonte, tema, recorte = parse_parts_from_filename(p.name)
+    try:
+        dialeto, linhas = read_header_rows(p, _LINHAS_CAB)
+        cab = impressao_cabecalho(linhas[0]) if linhas else ""
+        dialeto_js, linhas_js = json.dumps(list(dialeto)), json.dumps(linhas, ensure_ascii=False)
+    except (OSError, UnicodeDecodeError):
+        cab, dialeto_js, linhas_js = "", None, None
+    return (rel.as_posix(), categoria_do_caminho(rel), fonte, tema, recorte,
+            st.st_size, st.st_mtime_ns, cab, dialeto_js, linhas_js)
+
+def _bruto(raiz: Path, r: Tuple) -> Bruto:
+    arquivo, categoria, fonte, tema, recorte, tamanho, mtime_ns, cab, dialeto, linhas = r
+    return Bruto(
+        raiz / arquivo, arquivo, categoria, fonte, tema, recorte, tamanho, mtime_ns, cab,
+        CsvDialect(*json.loads(dialeto)) if dialeto else None,
+        json.loads(linhas) if linhas else [],
+    )
+
+def _conectar(db: Path, raiz: Path) -> sqlite3.Connection:
+    db.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db)
+    con.executescript(_SCHEMA)
+    meta = dict(con.execute("SELECT chave, valor FROM meta"))
+    atual = {"versao": str(_INVENTARIO_VERSAO), "raiz": str(raiz.resolve())}
+    if meta != atual:
+        con.execute("DELETE FROM brutos")
+        con.execute("DELETE FROM meta")
+        con.executemany("INSERT INTO meta VALUES (?, ?)", atual.items())
+        con.commit()
+    return con
+
+def atualizar(raiz: Optional[Path] = None, db: Optional[Path] = None) -> List[Bruto]:
+    """Atualiza o índice com a árvore atual e devolve os brutos (na ordem de `sorted(rglob)`)."""
+    raiz = Path(raiz or cfg.ROOT_RAW)
+    with closing(_conectar(Path(db or caminho()), raiz)) as con:
+        antigos: Dict[str, Tuple[int, int]] = {
+            a: (t, m) for a, t, m in con.execute("SELECT arquivo, tamanho, mtime_ns FROM brutos")
+        }
+        vistos, novos = set(), []
+        for s, st in _varrer(raiz):
+            p = Path(s)
+            arquivo = p.relative_to(raiz).as_posix()
+            vistos.add(arquivo)
+            if antigos.get(arquivo) != (st.st_size, st.st_mtime_ns):
+                novos.append(_novo(raiz, p, st))
+        sumiram = [(a,) for a in antigos.keys() - vistos]
+        if novos or sumiram:
+            con.executemany("INSERT OR REPLACE INTO brutos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", novos)
+            con.executemany("DELETE FROM brutos WHERE arquivo = ?", sumiram)
+            con.commit()
+        print(f"🗂️ Inventário: {len(vistos)} brutos ({len(novos)} novos/alterados, {len(sumiram)} removidos)")
+        return _listar(con, raiz)
+
+def listar(raiz: Optional[Path] = None, db: Optional[Path] = None) -> List[Bruto]:
+    """Brutos como estão no índice (sem varrer a árvore)."""
+    raiz, db = Path(raiz or cfg.ROOT_RAW), Path(db or caminho())
+    if not db.exists():
+        return []
+    with closing(_conectar(db, raiz)) as con:
+        return _listar(con, raiz)
+
+def _listar(con: sqlite3.Connection, raiz: Path) -> List[Bruto]:
+    brutos = [_bruto(raiz, r) for r in con.execute("SELECT * FROM brutos")]
+    return sorted(brutos, key=lambda b: b.path)
+
+def temas(brutos: List[Bruto]) -> pd.DataFrame:
+    """
+    Uma linha por (categoria, fonte, tema): nº de arquivos, MB e recortes. Brutos de
+    adaptadores (pipeline_adapters) entram com os temas que geram na etapa 01, pelo
+    cabeçalho guardado no índice.
+    """
+    import pipeline_adapters as adaptadores
+
+    cols = ["categoria", "fonte", "tema", "arquivos", "mb", "recortes"]
+    ativos = adaptadores.ativos()
+    linhas = []
+    for b in brutos:
+        partes = [(b.fonte, b.tema, b.recorte)]
+        if ativos and b.dialeto:
+            achado = adaptadores.encontrar_adaptador(b.path, ativos, adaptadores.Cabecalho(b.dialeto, b.linhas))
+            if achado:
+                partes = achado[0].temas(b.path, achado[1])
+        linhas += [(b.arquivo, b.categoria, f, t, r, b.tamanho) for f, t, r in partes]
+    if not linhas:
+        return pd.DataFrame(columns=cols)
+    df = pd.DataFrame(linhas, columns=["arquivo", "categoria", "fonte", "tema", "recorte", "tamanho"])
+    out = (
+        df.groupby(["categoria", "fonte", "tema"], as_index=False)
+        .agg(arquivos=("arquivo", "size"), mb=("tamanho", "sum"),
+             recortes=("recorte", lambda s: " | ".join(sorted({r for r in s if r}))))
+    )
+    out["mb"] = (out["mb"] / 1e6).round(2)
+    return out.sort_values(["arquivos", "categoria", "fonte", "tema"], ascending=[False, True, True, True])[cols]
+
+def listar_temas(categoria: str = "", tema: str = "", top: int = 50, atualizar_antes: bool = True) -> None:
+    brutos = atualizar() if atualizar_antes else listar()
+    df = temas(brutos)
+    if categoria:
+        df = df[df["categoria"].map(slugify).str.contains(slugify(categoria), regex=False)]
+    if tema:
+        df = df[df["tema"].map(slugify).str.contains(slugify(tema), regex=False)]
+    if df.empty:
+        print(f"Nenhum tema no inventário ({caminho()})")
+        return
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_colwidth", 60)
+    print(f"\n📚 Temas: {len(df)} | arquivos: {int(df['arquivos'].sum())} (top {top})")
+    print(df.head(top).to_string(index=False))
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("listar-temas", help="temas dos brutos (categoria, fonte, tema) com nº de arquivos")
+    p.add_argument("--categoria", default="", help="filtra categorias que contêm o texto")
+    p.add_argument("--tema", default="", help="filtra temas que contêm o texto")
+    p.add_argument("--top", type=int, default=50)
+    p.add_argument("--sem-atualizar", action="store_true", help="usa o índice como está, sem varrer a árvore")
+    args = ap.parse_args()
+    if args.cmd == "listar-temas":
+        listar_temas(args.categoria, args.tema, args.top, not args.sem_atualizar)
+
+if __name__ == "__main__":
+    main()
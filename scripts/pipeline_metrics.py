@@ -0,0 +1,192 @@
+"""
+pipeline_metrics.py
+Métricas de desempenho das etapas 01–04, gravadas em JSON Lines (cfg.METRICS_PATH,
+padrão OUT_DIR/_metrics.jsonl). Cada linha é um registro:
+
+- tipo="arquivo": um arquivo lido (bruto na etapa 01, processado na 04): bytes, linhas
+  de entrada/mantidas, sep/encoding detectados e segundos por fase (`fases`);
+- tipo="tema":    exportação de um tema na etapa 01 (escrita CSV/XLSX);
+- tipo="etapa":   a etapa inteira: tempo de parede, CPU (processo + filhos) e pico de RSS.
+
+Resumo (arquivos mais lentos e fases mais quentes da última execução de cada etapa):
+    python pipeline_metrics.py resumo [--top 15] [--todas]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+import pipeline_config as cfg
+
+try:  # Unix
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# Identifica a execução (processo principal): "20260116T101500-1234"
+EXECUCAO = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+_BUFFER: List[Dict] = []
+_ETAPA: Optional[str] = None
+
+def ativo() -> bool:
+    return bool(getattr(cfg, "METRICS", False))
+
+def caminho() -> Path:
+    return Path(getattr(cfg, "METRICS_PATH", cfg.OUT_DIR / "_metrics.jsonl"))
+
+# ---------- Cronômetro por fase ----------
+class Fases:
+    """Acumula segundos por fase: `with fases("leitura"): ...` -> fases.tempos["leitura"]."""
+
+    def __init__(self):
+        self.tempos: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, nome: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[nome] = self.tempos.get(nome, 0.0) + time.perf_counter() - t0
+
+# ---------- Registros ----------
+def registrar(tipo: str, **campos) -> None:
+    """Enfileira um registro da etapa atual (gravado ao fim da etapa ou a cada 1000)."""
+    if not ativo():
+        return
+    if isinstance(campos.get("fases"), dict):
+        campos["fases"] = {k: round(v, 6) for k, v in campos["fases"].items()}
+    _BUFFER.append({"execucao": EXECUCAO, "etapa": _ETAPA, "tipo": tipo, **campos})
+    if len(_BUFFER) >= 1000:
+        flush()
+
+def flush() -> None:
+    if not _BUFFER:
+        return
+    p = caminho()
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with open(p, "a", encoding="utf-8") as f:
+        for r in _BUFFER:
+            f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+    _BUFFER.clear()
+
+def _cpu_s() -> float:
+    t = os.times()  # filhos (pools) só contam no Unix, depois que terminam
+    return t.user + t.system + t.children_user + t.children_system
+
+def _pico_rss_mb() -> Dict[str, Optional[float]]:
+    """Pico de memória residente (MB) do processo e dos filhos já encerrados."""
+    if resource is not None:
+        escala = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024  # macOS: bytes; Linux: KB
+        return {
+            "pico_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / escala, 1),
+            "pico_rss_filhos_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / escala, 1),
+        }
+    try:  # Windows: psutil, se instalado
+        import psutil
+        return {"pico_rss_mb": round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1), "pico_rss_filhos_mb": None}
+    except Exception:
+        return {"pico_rss_mb": None, "pico_rss_filhos_mb": None}
+
+@contextmanager
+def etapa(nome: str) -> Iterator[None]:
+    """
+    Mede uma etapa inteira (também serve de decorador: `@etapa("01_processar")`).
+    Os registros por arquivo feitos dentro dela levam `etapa=nome`.
+    """
+    global _ETAPA
+    anterior, _ETAPA = _ETAPA, nome
+    t0, c0 = time.perf_counter(), _cpu_s()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "erro"
+        raise
+    finally:
+        registrar(
+            "etapa",
+            status=status,
+            parede_s=round(time.perf_counter() - t0, 3),
+            cpu_s=round(_cpu_s() - c0, 3),
+            **_pico_rss_mb(),
+        )
+        flush()
+        _ETAPA = anterior
+
+# ---------- Resumo ----------
+def carregar(todas: bool = False) -> pd.DataFrame:
+    """Registros do JSONL; por padrão só a última execução de cada etapa."""
+    p = caminho()
+    if not p.exists():
+        return pd.DataFrame()
+    with open(p, encoding="utf-8") as f:
+        df = pd.DataFrame([json.loads(l) for l in f if l.strip()])
+    if df.empty or todas:
+        return df
+    ultima = df.groupby("etapa")["execucao"].transform("max")
+    return df[df["execucao"] == ultima].reset_index(drop=True)
+
+def resumo(top: int = 15, todas: bool = False) -> None:
+    df = carregar(todas)
+    if df.empty:
+        print(f"Sem métricas em {caminho()}")
+        return
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_colwidth", 60)
+
+    etapas = df[df["tipo"] == "etapa"]
+    if not etapas.empty:
+        print("\n⏱️ Etapas")
+        cols = [c for c in ("etapa", "execucao", "status", "parede_s", "cpu_s", "pico_rss_mb", "pico_rss_filhos_mb") if c in etapas]
+        print(etapas[cols].sort_values(["etapa", "execucao"]).to_string(index=False))
+
+    com_fases = df[df["tipo"].isin(["arquivo", "tema"]) & df.get("fases", pd.Series(dtype=object)).notna()]
+    if com_fases.empty:
+        return
+    fases = pd.json_normalize(com_fases["fases"].tolist())
+    fases.index = com_fases.index
+
+    arquivos = com_fases[com_fases["tipo"] == "arquivo"].copy()
+    if not arquivos.empty:
+        f = fases.loc[arquivos.index].fillna(0.0)
+        arquivos["total_s"] = f.sum(axis=1).round(3)
+        arquivos["fase_dominante"] = f.idxmax(axis=1)
+        if "bytes" in arquivos:
+            arquivos["mb"] = (pd.to_numeric(arquivos["bytes"], errors="coerce") / 1e6).round(2)
+        print(f"\n🐢 Arquivos mais lentos (top {top})")
+        cols = [c for c in ("etapa", "arquivo", "base", "mb", "linhas_entrada", "linhas_mantidas", "total_s", "fase_dominante") if c in arquivos]
+        print(arquivos.sort_values("total_s", ascending=False)[cols].head(top).to_string(index=False))
+
+    quentes = (
+        fases.assign(etapa=com_fases["etapa"])
+        .melt(id_vars="etapa", var_name="fase", value_name="segundos")
+        .dropna(subset=["segundos"])
+        .groupby(["etapa", "fase"], as_index=False)["segundos"].sum()
+        .sort_values("segundos", ascending=False)
+    )
+    quentes["segundos"] = quentes["segundos"].round(3)
+    print("\n🔥 Fases mais quentes (soma sobre arquivos/temas)")
+    print(quentes.head(top).to_string(index=False))
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("resumo", help="arquivos mais lentos e fases mais quentes")
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--todas", action="store_true", help="considera todas as execuções, não só a última")
+    args = ap.parse_args()
+    if args.cmd == "resumo":
+        resumo(args.top, args.todas)
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,32 @@ Funções utilitárias compartilhadas pelo pipeline.
 
 from __future__ import annotations
 
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
 import re
 import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import IO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+import pipeline_config as cfg
+
+try:  # backend Arrow é opcional (CSV_ENGINE="pyarrow")
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover
+    pa = None
+    pc = None
+    pa_csv = None
 
 SEPS_CANDIDATES = [";", ",", "\t"]
 CSV_SEP_DEFAULT = ";"
@@ -58,6 +78,384 @@ def zfill_mun(x) -> str:
     
     return x_clean.zfill(7) if x_clean else ""
 
+# Municípios cujo dígito verificador IBGE não segue a regra (código de 6 -> 7 dígitos)
+_IBGE_DV_EXCECOES = {
+    "220191": "2201919", "220225": "2202251", "220198": "2201988",
+    "261153": "2611533", "311783": "3117836", "315213": "3152131",
+    "430587": "4305871", "520393": "5203939", "520396": "5203962",
+}
+
+def ibge_mun7(code6: str) -> str:
+    """Completa um código IBGE de 6 dígitos (ex.: CAGED) com o dígito verificador."""
+    if code6 in _IBGE_DV_EXCECOES:
+        return _IBGE_DV_EXCECOES[code6]
+    total = 0
+    for i, ch in enumerate(code6):
+        v = int(ch) * (2 if i % 2 else 1)
+        total += v // 10 + v % 10
+    return code6 + str((10 - total % 10) % 10)
+
+def _normalize_mun_uniques(uniques) -> np.ndarray:
+    """Normaliza valores distintos de uma coluna de município -> array de strings ("" = inválido)."""
+    u = pd.Series(uniques, dtype=object)
+
+    # texto: tira espaços, sufixo decimal ".0" e qualquer pontuação
+    txt = u.astype(str).str.strip().str.replace(r"\.0+$", "", regex=True).str.replace(r"\D+", "", regex=True)
+
+    # números (int/float, inclusive dentro de coluna object): trunca para int, como `zfill_mun`
+    eh_num = u.map(lambda x: isinstance(x, (int, float, np.integer, np.floating)) and not isinstance(x, bool))
+    if eh_num.any():
+        num = pd.to_numeric(u.where(eh_num), errors="coerce").astype(float)
+        ok = eh_num & np.isfinite(num)
+        txt[ok] = num[ok].astype("int64").astype(str)
+
+    lens = txt.str.len()
+    out = txt.mask(lens == 6, txt[lens == 6].map(ibge_mun7)) if (lens == 6).any() else txt
+    out = out.mask(lens.between(1, 5) | (lens == 7), out.str.zfill(7))
+    return out.to_numpy(dtype=object)
+
+def normalize_mun_series(s: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de `zfill_mun` para uma coluna inteira (retorna strings; "" = inválido).
+
+    Em vez de rodar regex linha a linha, fatora a coluna (`pd.factorize`) e normaliza
+    só os valores DISTINTOS (no máximo ~5.570 municípios), devolvendo o resultado por
+    índice. Cobre:
+      - int / float (1508159.0 -> "1508159");
+      - strings com pontuação ("15.08159-0", "1508159.0", " 1508159 ");
+      - códigos de 6 dígitos sem DV (CAGED: "150060" -> "1500602").
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    if len(uniques) == 0:
+        return pd.Series([""] * len(s), index=s.index, dtype=object)
+    res = _normalize_mun_uniques(uniques)[codes]
+    res[codes < 0] = ""
+    return pd.Series(res, index=s.index, dtype=object)
+
+# ---------- Números em texto (pt-BR, tolerante a en-US) ----------
+# Regras (sobre o texto sem espaços/NBSP/"%"): o separador decimal é o ÚLTIMO entre "." e
+# ","; só vírgulas -> decimal, salvo milhar en-US (1,234,567); só pontos -> milhar pt-BR
+# (1.234, 12.345.678) ou decimal (1.5). Mesmas regras nos dois motores abaixo.
+_NUM_MILHAR_PT = r"^[+-]?[1-9]\d{0,2}(?:\.\d{3})+$"
+_NUM_MILHAR_EN = r"^[+-]?[1-9]\d{0,2}(?:,\d{3}){2,}$"
+_NUM_DEC_VIRGULA = r",[^.]*$"
+_NUM_VALIDO = r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$"
+
+def _parse_numero_arrow(txt: np.ndarray) -> np.ndarray:
+    """Kernels do Arrow (C++/RE2): ~8 passadas vetorizadas, sem laço Python."""
+    a = pc.replace_substring_regex(pa.array(txt, type=pa.string()), r"[\s\x{00A0}%]+", "")
+    dec_virgula = pc.and_(pc.match_substring_regex(a, _NUM_DEC_VIRGULA),
+                          pc.invert(pc.match_substring_regex(a, _NUM_MILHAR_EN)))
+    sem_ponto = pc.replace_substring(a, ".", "")
+    t = pc.if_else(dec_virgula, pc.replace_substring(sem_ponto, ",", "."),
+                   pc.if_else(pc.match_substring_regex(a, _NUM_MILHAR_PT), sem_ponto, pc.replace_substring(a, ",", "")))
+    t = pc.if_else(pc.match_substring_regex(t, _NUM_VALIDO), t, pa.scalar(None, pa.string()))
+    return pc.cast(t, pa.float64()).to_numpy(zero_copy_only=False)
+
+def _parse_numero_pandas(txt: np.ndarray) -> np.ndarray:
+    t = pd.Series(txt, dtype=object).str.replace(r"[\s%]+", "", regex=True)
+    dec_virgula = t.str.contains(_NUM_DEC_VIRGULA, regex=True) & ~t.str.contains(_NUM_MILHAR_EN, regex=True)
+    milhar_pt = t.str.contains(_NUM_MILHAR_PT, regex=True)
+    t = t.mask(dec_virgula, t.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    t = t.mask(~dec_virgula & milhar_pt, t.str.replace(".", "", regex=False))
+    t = t.mask(~dec_virgula & ~milhar_pt, t.str.replace(",", "", regex=False))
+    t = t.where(t.str.contains(_NUM_VALIDO, regex=True))
+    return pd.to_numeric(t, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+def _parse_numero_uniques(uniques) -> np.ndarray:
+    """Converte valores distintos (texto ou número) -> float64 (NaN = não numérico)."""
+    u = np.asarray(uniques, dtype=object)
+    if pd.api.types.infer_dtype(u, skipna=True) == "string":
+        eh_num = np.zeros(len(u), dtype=bool)
+    else:  # números dentro de coluna object: usa o valor, sem passar por texto
+        eh_num = np.fromiter((isinstance(x, (int, float, np.integer, np.floating)) and not isinstance(x, bool) for x in u),
+                             dtype=bool, count=len(u))
+    out = np.full(len(u), np.nan)
+    if eh_num.any():
+        out[eh_num] = u[eh_num].astype(float)
+    if not eh_num.all():
+        txt = u[~eh_num].astype(str).astype(object)
+        out[~eh_num] = _parse_numero_arrow(txt) if pc is not None else _parse_numero_pandas(txt)
+    return out
+
+def parse_numero_br(s: pd.Series) -> np.ndarray:
+    """
+    Coluna -> float64 (NaN = vazio/não numérico), uma passada só.
+
+    Colunas numéricas saem direto (sem ida e volta por texto: 1.5 continua 1.5). Texto é
+    fatorado (`pd.factorize`) e só os valores DISTINTOS são convertidos (com pyarrow, pelos
+    kernels do Arrow; sem ele, por `.str` do pandas):
+      - espaços (inclusive NBSP) e "%" são ignorados ("12,5 %" -> 12.5);
+      - "1.234,56" / "1.234" -> pt-BR; "1,234.56" / "1,234,567" -> en-US;
+      - "1,5" -> 1.5 e "1.5" -> 1.5 (um separador sem cara de milhar = decimal).
+    """
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        return s.to_numpy(dtype=float, na_value=np.nan)
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    if len(uniques) == 0:
+        return np.full(len(s), np.nan)
+    res = _parse_numero_uniques(uniques)[codes]
+    res[codes < 0] = np.nan
+    return res
+
+# ---------- Territórios TSBio (lookup por código inteiro) ----------
+class TsbioLookup(NamedTuple):
+    """`cfg.TSBIO` compilado: posição i <-> município `codigos[i]`."""
+    codigos: pd.Index            # int64, códigos IBGE de 7 dígitos
+    territorio_id: np.ndarray    # int64, alinhado a `codigos`
+    nome_code: np.ndarray        # códigos de `nomes` (para Categorical.from_codes)
+    nomes: List[str]             # nomes dos territórios (categorias)
+
+    @property
+    def expected_muns(self) -> set:
+        return {f"{c:07d}" for c in self.codigos}
+
+def build_tsbio_lookup(tsbio: List[Dict]) -> TsbioLookup:
+    """Compila a lista TSBio uma vez (se um município aparecer 2x, vale o último, como no dict antigo)."""
+    por_mun: Dict[int, Tuple[int, str]] = {}
+    for t in tsbio:
+        for m in t["CD_MUN"]:
+            por_mun[int(zfill_mun(m))] = (int(t["territorio_id"]), str(t["territorio_nome"]))
+    nomes = list(dict.fromkeys(str(t["territorio_nome"]) for t in tsbio))
+    cods = sorted(por_mun)
+    return TsbioLookup(
+        codigos=pd.Index(np.array(cods, dtype=np.int64)),
+        territorio_id=np.array([por_mun[c][0] for c in cods], dtype=np.int64),
+        nome_code=np.array([nomes.index(por_mun[c][1]) for c in cods], dtype=np.int16),
+        nomes=nomes,
+    )
+
+def match_tsbio(s: pd.Series, lookup: TsbioLookup) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normaliza a coluna de município E localiza cada linha no lookup numa só passada
+    sobre os valores distintos. Retorna (codigo_7_digitos, posicao); posicao = -1
+    quando o município não é TSBio (ou é inválido).
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    if len(uniques) == 0:
+        return np.full(len(s), "", dtype=object), np.full(len(s), -1, dtype=np.intp)
+    norm = _normalize_mun_uniques(uniques)
+    chave = pd.to_numeric(pd.Series(norm), errors="coerce").fillna(-1).astype(np.int64)
+    pos_u = lookup.codigos.get_indexer(chave)
+    pos = pos_u[codes]
+    pos[codes < 0] = -1
+    cod = norm[codes]
+    cod[codes < 0] = ""
+    return cod, pos
+
+# ---------- Cobertura (tema x município [x ano]) ----------
+def coverage_keys(pos: np.ndarray, ano: Optional[pd.Series] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Células cobertas por um bruto (já filtrado TSBio): posições distintas no lookup e,
+    se houver coluna `ano`, pares (posição, ano) distintos como array (k, 2).
+    """
+    muns = np.unique(pos)
+    if ano is None:
+        return muns, None
+    a = pd.to_numeric(ano, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    ok = np.isfinite(a)
+    pares = np.unique(np.column_stack([pos[ok], a[ok].astype(np.int64)]), axis=0) if ok.any() else np.empty((0, 2), np.int64)
+    return muns, pares
+
+class CoverageMatrix:
+    """
+    Matriz booleana tema x município TSBio (posições do `TsbioLookup`) e, opcional,
+    tema x município x ano (guardada como pares distintos por tema; o eixo de anos de
+    cada tema é o conjunto de anos que aparece nele).
+    """
+
+    def __init__(self, lookup: TsbioLookup, por_ano: bool = False):
+        self.lookup = lookup
+        self.por_ano = por_ano
+        self.chaves: List[Tuple] = []
+        self._linha: Dict[Tuple, int] = {}
+        self._muns: List[np.ndarray] = []
+        self._pares: List[List[np.ndarray]] = []
+
+    def _idx(self, chave: Tuple) -> int:
+        i = self._linha.get(chave)
+        if i is None:
+            i = self._linha[chave] = len(self.chaves)
+            self.chaves.append(chave)
+            self._muns.append(np.zeros(len(self.lookup.codigos), dtype=bool))
+            self._pares.append([])
+        return i
+
+    def marcar(self, chave: Tuple, muns: np.ndarray, pares: Optional[np.ndarray] = None) -> None:
+        i = self._idx(chave)
+        self._muns[i][muns] = True
+        if self.por_ano and pares is not None and len(pares):
+            self._pares[i].append(pares)
+
+    def marcar_codigos(self, chave: Tuple, cods: Iterable[str], anos: Optional[Iterable] = None) -> None:
+        """Mesma coisa a partir de códigos de 7 dígitos (ex.: cobertura herdada da execução anterior)."""
+        cods = pd.to_numeric(pd.Series(list(cods), dtype=object), errors="coerce").fillna(-1).astype(np.int64)
+        pos = self.lookup.codigos.get_indexer(cods)
+        ok = pos >= 0
+        pares = None
+        if anos is not None:
+            a = pd.to_numeric(pd.Series(list(anos), dtype=object), errors="coerce").to_numpy(dtype=float)
+            ok2 = ok & np.isfinite(a)
+            pares = np.column_stack([pos[ok2], a[ok2].astype(np.int64)])
+        self.marcar(chave, np.unique(pos[ok]), pares)
+
+    def matriz(self) -> np.ndarray:
+        """Tema x município (bool)."""
+        if not self._muns:
+            return np.zeros((0, len(self.lookup.codigos)), dtype=bool)
+        return np.vstack(self._muns)
+
+    def faltando(self, chave: Tuple) -> List[str]:
+        m = self._muns[self._linha[chave]] if chave in self._linha else np.zeros(len(self.lookup.codigos), bool)
+        return [f"{c:07d}" for c in self.lookup.codigos[~m]]
+
+    def pct(self, chave: Tuple) -> float:
+        m = self._muns[self._linha[chave]] if chave in self._linha else np.zeros(1, bool)
+        return round(100.0 * m.mean(), 2)
+
+    def por_territorio(self) -> pd.DataFrame:
+        """% de municípios cobertos por tema (linhas) e território (colunas), via matriz x pertença."""
+        lk = self.lookup
+        pertenca = np.zeros((len(lk.codigos), len(lk.nomes)), dtype=np.int64)
+        pertenca[np.arange(len(lk.codigos)), lk.nome_code] = 1
+        cobertos = self.matriz().astype(np.int64) @ pertenca
+        pct = 100.0 * cobertos / np.maximum(pertenca.sum(axis=0), 1)
+        out = pd.DataFrame(self.chaves, columns=["categoria", "fonte", "tema"])
+        out["indicador_id"] = [build_indicador_id(*c) for c in self.chaves]
+        out["cobertura_pct"] = np.round(100.0 * self.matriz().mean(axis=1), 2) if len(out) else []
+        out[lk.nomes] = np.round(pct, 2)
+        return out.sort_values(["categoria", "fonte", "tema"]).reset_index(drop=True)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Formato longo (1 linha por célula, com `coberto`), colunas de texto categóricas.
+        Com `por_ano`: tema x município x ano (anos do próprio tema); senão tema x município.
+        """
+        lk = self.lookup
+        n = len(lk.codigos)
+        idx_tema, idx_mun, anos, cob = [], [], [], []
+        for i in sorted(range(len(self.chaves)), key=self.chaves.__getitem__):
+            if self.por_ano and self._pares[i]:
+                pares = np.unique(np.vstack(self._pares[i]), axis=0)
+                eixo = np.unique(pares[:, 1])
+                grade = np.zeros((n, len(eixo)), dtype=bool)
+                grade[pares[:, 0], np.searchsorted(eixo, pares[:, 1])] = True
+                idx_tema.append(np.full(grade.size, i))
+                idx_mun.append(np.repeat(np.arange(n), len(eixo)))
+                anos.append(np.tile(eixo, n).astype(float))
+                cob.append(grade.ravel())
+            else:
+                idx_tema.append(np.full(n, i))
+                idx_mun.append(np.arange(n))
+                anos.append(np.full(n, np.nan))
+                cob.append(self._muns[i])
+        if not idx_tema:
+            return pd.DataFrame()
+        t = np.concatenate(idx_tema)
+        m = np.concatenate(idx_mun)
+
+        def _cat(valores: List[str]) -> pd.Categorical:
+            codes, cats = pd.factorize(pd.Index(valores))
+            return pd.Categorical.from_codes(codes[t], categories=cats)
+
+        out = {col: _cat([c[j] for c in self.chaves]) for j, col in enumerate(("categoria", "fonte", "tema"))}
+        out["indicador_id"] = _cat([build_indicador_id(*c) for c in self.chaves])
+        out["territorio_id"] = lk.territorio_id[m]
+        out["territorio_nome"] = pd.Categorical.from_codes(lk.nome_code[m], categories=lk.nomes)
+        out["cod_municipio"] = pd.Categorical.from_codes(m, categories=[f"{c:07d}" for c in lk.codigos])
+        if self.por_ano:
+            out["ano"] = pd.array(np.concatenate(anos), dtype="Float64").astype("Int64")
+        out["coberto"] = np.concatenate(cob)
+        return pd.DataFrame(out)
+
+# ---------- Leitura antecipada (prefetch) ----------
+# caminho -> bytes já lidos por `LeituraAntecipada` (os leitores abrem via `abrir_binario`)
+_PRE_LIDOS: Dict[str, bytes] = {}
+
+def abrir_binario(path: Path) -> IO[bytes]:
+    """`open(path, "rb")`, ou o buffer em memória se o arquivo foi lido à frente."""
+    buf = _PRE_LIDOS.get(str(path))
+    return io.BytesIO(buf) if buf is not None else open(path, "rb")
+
+def _ler_bytes(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+class LeituraAntecipada:
+    """
+    Percorre `paths` na ordem enquanto threads leem os bytes dos próximos arquivos, com no
+    máximo `orcamento_mb` em memória (o arquivo atual conta). No passo de cada arquivo,
+    `abrir_binario` (e os leitores que o usam) leem do buffer em vez do disco; arquivos
+    maiores que o orçamento, ou com erro na leitura à frente, são lidos normalmente.
+
+        for p in LeituraAntecipada(arquivos, orcamento_mb=256):
+            df = read_csv_local(p)
+
+    `orcamento_mb <= 0` desliga (itera os caminhos sem ler nada à frente).
+    """
+
+    def __init__(self, paths: Iterable[Path], orcamento_mb: float, threads: int = 2):
+        self.paths = list(paths)
+        self.orcamento = int(float(orcamento_mb or 0) * 1024 * 1024)
+        self.threads = max(1, int(threads or 1))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[Path]:
+        if self.orcamento <= 0 or not self.paths:
+            yield from self.paths
+            return
+        tamanhos = []
+        for p in self.paths:
+            try:
+                tamanhos.append(os.stat(p).st_size)
+            except OSError:
+                tamanhos.append(-1)
+
+        futuros: Dict[int, Future] = {}
+        prox = em_memoria = 0
+        ex = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="prefetch")
+        try:
+            for i, p in enumerate(self.paths):
+                # agenda os próximos enquanto couberem no orçamento
+                prox = max(prox, i)
+                while prox < len(self.paths):
+                    t = tamanhos[prox]
+                    if 0 <= t <= self.orcamento:
+                        if em_memoria + t > self.orcamento:
+                            break
+                        futuros[prox] = ex.submit(_ler_bytes, self.paths[prox])
+                        em_memoria += t
+                    prox += 1
+
+                fut = futuros.pop(i, None)
+                try:
+                    buf = fut.result() if fut is not None else None
+                except OSError:
+                    buf = None
+                if buf is not None:
+                    _PRE_LIDOS[str(p)] = buf
+                try:
+                    yield p
+                finally:
+                    _PRE_LIDOS.pop(str(p), None)
+                    if fut is not None:
+                        em_memoria -= tamanhos[i]
+        finally:
+            ex.shutdown(wait=True, cancel_futures=True)
+
+def file_sha1(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Hash SHA-1 do conteúdo (lido em blocos, sem carregar o arquivo inteiro)."""
+    h = hashlib.sha1()
+    with abrir_binario(path) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
 def parse_parts_from_filename(filename: str) -> Tuple[str, str, str]:
     """
     Divide em até 3 partes pelo padrão ' - ' (com espaços).
@@ -71,35 +469,672 @@ def parse_parts_from_filename(filename: str) -> Tuple[str, str, str]:
     recorte = parts[2] if len(parts) >= 3 else ""
     return fonte, tema, recorte
 
-def detect_csv_sep(path: Path, encoding: str) -> str:
-    """Detecta o separador a partir do cabeçalho."""
+# ---------- Backend de leitura CSV (pandas | pyarrow) ----------
+def csv_engine() -> str:
+    """Backend configurado em `cfg.CSV_ENGINE` ("pyarrow" só vale se o pyarrow estiver instalado)."""
+    eng = str(getattr(cfg, "CSV_ENGINE", "pandas") or "pandas").lower().strip()
+    return "pyarrow" if eng == "pyarrow" and pa_csv is not None else "pandas"
+
+# dtype pedido ao leitor -> tipo Arrow; inteiros pequenos voltam como inteiros anuláveis do pandas
+_ARROW_DTYPES = {
+    "string": "string", "str": "string",
+    "Int8": "int8", "Int16": "int16", "Int32": "int32", "float64": "float64",
+}
+_ARROW_PANDAS_INT = {"int8": pd.Int8Dtype(), "int16": pd.Int16Dtype(), "int32": pd.Int32Dtype()}
+
+def _read_csv_arrow(src, sep: str, encoding: str, skiprows: int, usecols, dtype) -> pd.DataFrame:
+    """Leitor multithread do Arrow; strings viram `string[pyarrow]`. Levanta erro quando não dá para igualar o pandas."""
+    column_types = {}
+    for c, t in (dtype or {}).items():
+        if str(t) not in _ARROW_DTYPES:
+            raise ValueError(f"dtype não suportado no backend Arrow: {c}={t}")
+        column_types[c] = pa.type_for_alias(_ARROW_DTYPES[str(t)])
+
+    enc = "utf8" if encoding.lower().replace("-", "").replace("_", "") in ("utf8", "utf8sig") else encoding
+    tbl = pa_csv.read_csv(
+        src,
+        read_options=pa_csv.ReadOptions(encoding=enc, skip_rows=skiprows, use_threads=True),
+        parse_options=pa_csv.ParseOptions(delimiter=sep),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(usecols) if usecols else None,
+            column_types=column_types,
+            strings_can_be_null=True,
+        ),
+    )
+    if enc == "utf8" and any(pa.types.is_binary(f.type) for f in tbl.schema):
+        # o Arrow não falha com bytes inválidos: devolve coluna binária
+        raise UnicodeDecodeError("utf-8", b"", 0, 1, "bytes inválidos para utf-8 (Arrow)")
+    if any(pa.types.is_temporal(f.type) for f in tbl.schema):
+        raise ValueError("colunas de data: o pandas padrão mantém o texto original")
+    if len(set(tbl.column_names)) != len(tbl.column_names):
+        raise ValueError("colunas duplicadas: o pandas padrão renomeia (.1, .2...)")
+
+    strings = pd.StringDtype("pyarrow")
+    # int8/16/32 só aparecem por `dtype` (a inferência do Arrow usa int64)
+    mapa = {pa.string(): strings, pa.large_string(): strings,
+            **{pa.type_for_alias(k): v for k, v in _ARROW_PANDAS_INT.items()}}
+    return tbl.to_pandas(types_mapper=mapa.get)
+
+def read_csv_fast(src, sep: str, encoding: str = "utf-8", skiprows: int = 0,
+                  usecols=None, dtype=None, engine: Optional[str] = None, **pandas_kw) -> pd.DataFrame:
+    """
+    Lê CSV pelo backend configurado. Com "pyarrow" usa o leitor multithread do Arrow e
+    volta ao `pd.read_csv` padrão se ele falhar (tipo misto, data, coluna duplicada...).
+    `src` pode ser caminho ou arquivo binário aberto. `pandas_kw` só vale no caminho pandas.
+    """
+    if (engine or csv_engine()) == "pyarrow":
+        pos = src.tell() if hasattr(src, "tell") else None
+        try:
+            return _read_csv_arrow(src, sep, encoding, skiprows, usecols, dtype)
+        except UnicodeDecodeError:
+            raise
+        except Exception:
+            if pos is not None:
+                src.seek(pos)
+    return pd.read_csv(src, sep=sep, encoding=encoding, skiprows=skiprows, usecols=usecols, dtype=dtype, **pandas_kw)
+
+# ---------- Leitura de CSV bruto (sniff único + cache) ----------
+SNIFF_BYTES = 64 * 1024
+_BOM = b"\xef\xbb\xbf"
+
+class CsvDialect(NamedTuple):
+    encoding: str   # "utf-8-sig" | "latin1"
+    sep: str
+    skiprows: int   # 1 quando a 1ª linha é a dica do Excel "sep=;"
+
+# "caminho|tamanho|mtime_ns" -> CsvDialect (persistido com load/save_sniff_cache)
+SNIFF_CACHE: Dict[str, CsvDialect] = {}
+
+def _sniff_key(path: Path) -> str:
+    st = os.stat(path)
+    return f"{Path(path).resolve()}|{st.st_size}|{st.st_mtime_ns}"
+
+def sniff_prefix(prefix: bytes) -> CsvDialect:
+    """
+    Detecta encoding, separador e linha `sep=` a partir dos primeiros bytes do arquivo.
+    - encoding: utf-8 se o prefixo decodifica (tolerando caractere cortado no fim), senão latin1;
+    - `sep=X` na 1ª linha: usa X e pula a linha; senão conta candidatos no cabeçalho.
+    """
+    body = prefix[3:] if prefix.startswith(_BOM) else prefix
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+        enc = "utf-8-sig"
+    except UnicodeDecodeError:
+        enc = "latin1"
+
+    lines = body.decode("utf-8" if enc == "utf-8-sig" else enc, errors="replace").splitlines()
+    header = lines[0] if lines else ""
+    skiprows = 0
+    sep = ""
+    if header.lower().startswith("sep="):
+        skiprows = 1
+        sep = header[4:5]
+        header = lines[1] if len(lines) > 1 else ""
+
+    if not sep:
+        counts = {s: header.count(s) for s in SEPS_CANDIDATES}
+        best = max(counts, key=counts.get)
+        sep = best if counts[best] > 0 else CSV_SEP_DEFAULT
+    return CsvDialect(enc, sep, skiprows)
+
+def sniff_csv(path: Path) -> CsvDialect:
+    """Dialeto do arquivo, pelo cache (mesmo tamanho/mtime) ou lendo só `SNIFF_BYTES`."""
+    key = _sniff_key(path)
+    d = SNIFF_CACHE.get(key)
+    if d is None:
+        with abrir_binario(path) as f:
+            d = sniff_prefix(f.read(SNIFF_BYTES))
+        SNIFF_CACHE[key] = d
+    return d
+
+def sniff_cache_entry(path: Path) -> Optional[Tuple[str, CsvDialect]]:
+    """Entrada do cache para `path` (para devolver ao processo principal a partir de workers)."""
+    key = _sniff_key(path)
+    return (key, SNIFF_CACHE[key]) if key in SNIFF_CACHE else None
+
+def load_sniff_cache(path: Path) -> None:
+    if not path.exists():
+        return
     try:
-        with open(path, "r", encoding=encoding, errors="replace") as f:
-            header = f.readline()
-            if header.lower().startswith("sep="):
-                header = f.readline()
+        data = json.loads(path.read_text(encoding="utf-8"))
     except Exception:
-        return CSV_SEP_DEFAULT
+        return
+    SNIFF_CACHE.update({k: CsvDialect(*v) for k, v in data.items()})
 
-    if not header:
-        return CSV_SEP_DEFAULT
+def save_sniff_cache(path: Path) -> None:
+    """Grava o cache descartando entradas de arquivos que sumiram ou mudaram."""
+    vivos = {}
+    for k, d in SNIFF_CACHE.items():
+        arq = k.rsplit("|", 2)[0]
+        try:
+            if _sniff_key(Path(arq)) == k:
+                vivos[k] = list(d)
+        except OSError:
+            continue
+    path.write_text(json.dumps(vivos, ensure_ascii=False), encoding="utf-8")
 
-    counts = {s: header.count(s) for s in SEPS_CANDIDATES}
-    best = max(counts, key=counts.get)
-    return best if counts[best] > 0 else CSV_SEP_DEFAULT
+def _linhas_prefixo(prefix: bytes, d: CsvDialect, n: int) -> List[List[str]]:
+    body = prefix[3:] if prefix.startswith(_BOM) else prefix
+    txt = body.decode("utf-8" if d.encoding == "utf-8-sig" else d.encoding, errors="replace")
+    return list(csv.reader(txt.splitlines()[d.skiprows:d.skiprows + n], delimiter=d.sep))
 
-def read_csv_local(path: Path) -> pd.DataFrame:
-    """Leitura robusta (utf-8-sig / latin1) + auto separador."""
-    last_err = None
-    for enc in ("utf-8-sig", "latin1"):
+def read_typed(ler: Callable[[Optional[Dict[str, str]]], pd.DataFrame], dtype: Optional[Dict[str, str]]) -> pd.DataFrame:
+    """Lê com o plano de tipos; se algum valor não couber (ex.: "2020.0" num inteiro), relê sem ele."""
+    if dtype:
+        try:
+            return ler(dtype)
+        except UnicodeDecodeError:
+            raise
+        except (ValueError, TypeError, OverflowError):
+            pass
+    return ler(None)
+
+def read_csv_local(path: Path, dtype_for: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> pd.DataFrame:
+    """
+    Leitura robusta (utf-8-sig / latin1) + auto separador + linha `sep=`.
+    Abre o arquivo UMA vez: o sniff usa só o prefixo e o mesmo handle vai para o pandas.
+    `dtype_for(colunas_cabecalho)` devolve os dtypes por coluna (ver `dtype_plan_for`).
+    """
+    key = _sniff_key(path)
+    with abrir_binario(path) as f:
+        d = SNIFF_CACHE.get(key)
+        dtype = None
+        if d is None or dtype_for is not None:
+            prefix = f.read(SNIFF_BYTES)
+            d = d or sniff_prefix(prefix)
+            if dtype_for is not None:
+                cab = _linhas_prefixo(prefix, d, 1)
+                dtype = dtype_for(cab[0]) if cab else None
+            f.seek(0)
+
+        def ler(dt):
+            f.seek(0)
+            return read_csv_fast(f, sep=d.sep, encoding=d.encoding, skiprows=d.skiprows, dtype=dt)
+
+        try:
+            df = read_typed(ler, dtype)
+        except UnicodeDecodeError:
+            # prefixo em utf-8, mas o resto do arquivo não: relê como latin1 (raro)
+            d = d._replace(encoding="latin1")
+            df = read_typed(ler, dtype)
+    SNIFF_CACHE[key] = d
+    return df
+
+def read_header_rows(path: Path, n: int = 5) -> Tuple[CsvDialect, List[List[str]]]:
+    """Dialeto + primeiras `n` linhas já separadas em células (só o prefixo do arquivo)."""
+    with abrir_binario(path) as f:
+        prefix = f.read(SNIFF_BYTES)
+    key = _sniff_key(path)
+    d = SNIFF_CACHE.get(key) or sniff_prefix(prefix)
+    SNIFF_CACHE[key] = d
+    return d, _linhas_prefixo(prefix, d, n)
+
+# ---------- Pré-filtro de municípios (antes do pandas) ----------
+_RE_NAO_DIGITO = re.compile(rb"\D+")
+
+def _mun_key_candidates(field: bytes) -> Iterable[bytes]:
+    """
+    Chaves de 7 dígitos que `zfill_mun` PODE produzir para este campo bruto.
+    Gera um superconjunto (na dúvida mantém a linha): o filtro exato continua
+    sendo feito depois, no DataFrame.
+    """
+    f = field.strip().strip(b'"').strip()
+    if not f:
+        return ()
+    if f.isdigit():
+        return (f.zfill(7),)
+    cands = {_RE_NAO_DIGITO.sub(b"", f), _RE_NAO_DIGITO.sub(b"", f.split(b".")[0])}
+    if b"e" in f.lower():
         try:
-            sep = detect_csv_sep(path, enc)
-            return pd.read_csv(path, sep=sep, encoding=enc)
-        except Exception as e:
-            last_err = e
+            cands.add(str(int(float(f))).encode())
+        except (ValueError, OverflowError):
+            pass
+    return tuple(c.zfill(7) for c in cands if c)
+
+_RE_MUN_SIMPLES = re.compile(rb'^\s*"?\s*\d+(?:\.0*)?\s*"?\s*$')
+_PREFILTRO_CHUNK = 16 * 1024 * 1024
+_PREFILTRO_AMOSTRA = 2000
+
+def _filtrar_bloco_vetorizado(bloco: bytes, sep: bytes, idx: int, keys: set) -> List[bytes]:
+    """
+    Filtra um bloco (linhas completas, sem aspas) olhando só os bytes do campo `idx`
+    de cada linha, com numpy: acha quebras de linha (e separadores, se idx > 0),
+    descarta pelos 2 primeiros dígitos e só então monta o código inteiro e testa
+    contra `keys`. Aceita espaço/aspas antes do código e `.0`, `"`, espaço ou `\r` depois.
+    """
+    arr = np.frombuffer(bloco, dtype=np.uint8)
+    n = len(arr)
+    nl = np.flatnonzero(arr == 10)
+    ls = np.concatenate(([0], nl + 1))
+    le = np.concatenate((nl, [n]))
+    cheia = ls < le
+    ls, le = ls[cheia], le[cheia]
+
+    if idx == 0:
+        fs = ls
+    else:
+        seps = np.flatnonzero(arr == sep[0])
+        j = np.searchsorted(seps, ls) + idx - 1
+        ok = j < len(seps)
+        ls, le, j = ls[ok], le[ok], j[ok]
+        fs = seps[j] + 1
+        ok = fs <= le
+        ls, le, fs = ls[ok], le[ok], fs[ok]
+
+    padded = np.concatenate((arr, np.zeros(9, dtype=np.uint8)))
+    for _ in range(2):  # pula espaço/aspas iniciais
+        c = padded[fs]
+        fs = fs + ((c == 32) | (c == 34))
+
+    # descarte barato: 2 primeiros dígitos (UF) têm que bater com algum código
+    prefixos = np.array(sorted({int(k[:2]) for k in keys}), dtype=np.int64)
+    uf = (padded[fs].astype(np.int64) - 48) * 10 + (padded[fs + 1].astype(np.int64) - 48)
+    cand = np.isin(uf, prefixos)
+    ls, le, fs = ls[cand], le[cand], fs[cand]
+    if not len(ls):
+        return []
+
+    win = padded[fs[:, None] + np.arange(8)]
+    dig = (win >= 48) & (win <= 57)
+    n_dig = np.where(dig.all(axis=1), 8, dig.argmin(axis=1))
+    fim = padded[fs + np.minimum(n_dig, 8)]
+    termina = np.isin(fim, (0, 10, 13, 32, 34, 46, sep[0]))
+    vals = win[:, :7].astype(np.int64) - 48
+
+    keep = np.zeros(len(ls), dtype=bool)
+    for nd in (6, 7):
+        ks = [int(k) for k in keys if len(k) == nd]
+        if not ks:
             continue
+        code = (vals[:, :nd] * (10 ** np.arange(nd - 1, -1, -1, dtype=np.int64))).sum(axis=1)
+        keep |= (n_dig == nd) & np.isin(code, ks)
+    keep &= termina
+
+    return [bloco[a:b + 1] for a, b in zip(ls[keep], le[keep])]
+
+def _filtrar_linhas_lento(lines: Iterable[bytes], keys: set, sep_b: bytes, sep: str, idx: int, out: List[bytes]) -> int:
+    """Caminho linha a linha (aspas, quebras de linha dentro de aspas, códigos com pontuação). Devolve nº de registros lidos."""
+    pending = b""
+    n = 0
+    for line in lines:
+        rec = pending + line if pending else line
+        if rec.count(b'"') % 2:
+            # aspas abertas: o registro continua na próxima linha
+            pending = rec
+            continue
+        pending = b""
+        n += 1
+
+        if b'"' in rec:
+            row = next(csv.reader([rec.decode("latin1")], delimiter=sep), [])
+            if len(row) <= idx:
+                out.append(rec)
+                continue
+            field = row[idx].encode("latin1")
+        else:
+            parts = rec.split(sep_b, idx + 1)
+            if len(parts) <= idx:
+                if rec.strip():
+                    out.append(rec)  # linha curta: o pandas decide
+                continue
+            field = parts[idx]
+
+        if any(k in keys for k in _mun_key_candidates(field)):
+            out.append(rec)
+    if pending:
+        out.append(pending)
+        n += 1
+    return n
+
+def read_csv_mun_filtered(
+    path: Path,
+    expected_muns: Iterable[str],
+    find_col_idx: Callable[[List[str]], Optional[int]],
+    stats: Optional[Dict] = None,
+    dtype_for: Optional[Callable[[List[str]], Dict[str, str]]] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Lê o CSV em streaming (bytes) e só entrega ao pandas as linhas cujo campo de
+    município pode cair em `expected_muns`. Para tabelas nacionais (5.570 municípios)
+    o DataFrame passa a ter só as ~60 linhas TSBio.
+
+    - trata BOM, linha `sep=;` e separador/encoding pelo mesmo `sniff_csv` do `read_csv_local`;
+    - `find_col_idx(colunas_cabecalho)` devolve o índice da coluna de município;
+    - caminho rápido: numpy sobre os bytes, em blocos de 16 MB, quando o
+      arquivo não tem aspas e uma amostra das linhas traz códigos só com dígitos
+      (ver `_filtrar_bloco_vetorizado`);
+    - caso contrário, caminho linha a linha (lida com aspas e códigos pontuados).
+
+    Retorna None se não der para pré-filtrar (ex.: coluna de município não encontrada);
+    nesse caso o chamador deve cair no `read_csv_local`. Se `stats` for passado, recebe
+    `linhas_entrada` (linhas de dados do bruto, antes do filtro). `dtype_for` como no
+    `read_csv_local`.
+    """
+    keys = {str(m).encode() for m in expected_muns}
+    d = sniff_csv(path)
+    sep = d.sep
+
+    with abrir_binario(path) as f:
+        for _ in range(d.skiprows):
+            f.readline()
+        header = f.readline()
+        if header.startswith(_BOM):
+            header = header[3:]
+        if not header.strip():
+            return None
+        header_txt = header.decode("utf-8" if d.encoding == "utf-8-sig" else d.encoding, errors="replace")
+
+        cols = next(csv.reader([header_txt.rstrip("\r\n")], delimiter=sep), [])
+        idx = find_col_idx(cols)
+        if idx is None:
+            return None
+
+        sep_b = sep.encode()
+        out = [header if header.endswith(b"\n") else header + b"\n"]
+        data_start = f.tell()
+
+        # Amostra: decide se o caminho rápido (regex) é seguro para este arquivo
+        rapido = True
+        for _, line in zip(range(_PREFILTRO_AMOSTRA), f):
+            parts = line.split(sep_b, idx + 1)
+            if b'"' in line or (len(parts) > idx and parts[idx].strip() and not _RE_MUN_SIMPLES.match(parts[idx])):
+                rapido = False
+                break
+        f.seek(data_start)
+
+        n_linhas = 0
+        if rapido:
+            resto = b""
+            while True:
+                chunk = f.read(_PREFILTRO_CHUNK)
+                if not chunk:
+                    break
+                bloco = resto + chunk
+                corte = bloco.rfind(b"\n") + 1
+                bloco, resto = bloco[:corte], bloco[corte:]
+                if b'"' in bloco:
+                    # apareceram aspas depois da amostra: termina linha a linha
+                    n_linhas += _filtrar_linhas_lento(io.BytesIO(bloco + resto + f.read()), keys, sep_b, sep, idx, out)
+                    resto = b""
+                    break
+                n_linhas += bloco.count(b"\n")
+                out.extend(_filtrar_bloco_vetorizado(bloco, sep_b, idx, keys))
+            if resto:
+                n_linhas += 1
+                out.extend(_filtrar_bloco_vetorizado(resto, sep_b, idx, keys))
+        else:
+            n_linhas = _filtrar_linhas_lento(f, keys, sep_b, sep, idx, out)
+        if stats is not None:
+            stats["linhas_entrada"] = n_linhas
+
+    buf = b"".join(out)
+    dtype = dtype_for(cols) if dtype_for is not None else None
+    last_err = None
+    for e in dict.fromkeys((d.encoding, "latin1")):
+        try:
+            return read_typed(lambda dt: read_csv_fast(io.BytesIO(buf), sep=sep, encoding=e, dtype=dt), dtype)
+        except Exception as err:
+            last_err = err
     raise last_err
 
+# ---------- Adaptador CAGED largo (Mês/Ano x métricas -> longo) ----------
+# Exportações do CAGED trazem uma coluna de município e, por mês, um bloco de colunas
+# (Estoque, Admissões, Desligamentos, Saldos, Variação). A linha de cabeçalho superior só
+# tem "Janeiro/2020" na 1ª coluna de cada bloco; a de baixo, os nomes das métricas.
+MESES_PT = {"jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6,
+            "jul": 7, "ago": 8, "set": 9, "out": 10, "nov": 11, "dez": 12}
+CAGED_METRICAS = ("Estoque", "Admissões", "Desligamentos", "Saldos")
+_RE_MES_ANO = re.compile(r"^\s*([^\W\d_]+)\s*/\s*(\d{4})\s*$")
+_CAGED_LINHAS_CAB = 5  # procura o cabeçalho Mês/Ano nas primeiras linhas
+
+class CagedLayout(NamedTuple):
+    linha_cab: int        # linha com "Mês/Ano"; a seguinte tem as métricas, dados depois
+    colunas: np.ndarray   # (n_meses, 4): coluna de cada métrica em cada bloco
+    anos: np.ndarray
+    meses: np.ndarray
+
+def parse_mes_ano(txt) -> Optional[Tuple[int, int]]:
+    """"Janeiro/2020" | "jan/2020" -> (2020, 1); None se não for Mês/Ano."""
+    m = _RE_MES_ANO.match(str(txt)) if isinstance(txt, str) else None
+    if not m:
+        return None
+    mes = MESES_PT.get(slugify(m.group(1))[:3])
+    return (int(m.group(2)), mes) if mes else None
+
+def detect_caged_wide(rows: List[List[str]]) -> Optional[CagedLayout]:
+    """
+    Reconhece o cabeçalho largo do CAGED nas primeiras linhas (listas de células).
+    As métricas são localizadas pelo nome no 1º bloco (ordem padrão se a linha vier
+    vazia) e o mesmo deslocamento vale para todos os blocos.
+    """
+    for i, row in enumerate(rows[:_CAGED_LINHAS_CAB]):
+        blocos = [(j, ma) for j, c in enumerate(row) if (ma := parse_mes_ano(c))]
+        if not blocos:
+            continue
+        inicios = np.array([j for j, _ in blocos])
+        largura = int(np.diff(inicios).min()) if len(inicios) > 1 else len(row) - inicios[0]
+        if largura < len(CAGED_METRICAS):
+            return None
+        nomes = rows[i + 1] if i + 1 < len(rows) else []
+        bloco0 = [slugify(nomes[j]) if j < len(nomes) and isinstance(nomes[j], str) else ""
+                  for j in range(inicios[0], inicios[0] + largura)]
+        desloc = []
+        for k, met in enumerate(CAGED_METRICAS):
+            alvo = slugify(met)[:5]
+            achou = [d for d, n in enumerate(bloco0) if n.startswith(alvo)]
+            desloc.append(achou[0] if achou else k)
+        colunas = inicios[:, None] + np.array(desloc)[None, :]
+        if colunas.max() >= len(row):
+            colunas = colunas[(colunas < len(row)).all(axis=1)]
+        n = len(colunas)
+        return CagedLayout(i, colunas,
+                           np.array([a for _, (a, _m) in blocos[:n]], dtype=np.int16),
+                           np.array([m for _, (_a, m) in blocos[:n]], dtype=np.int8))
+    return None
+
+def caged_wide_to_long(raw: pd.DataFrame, lookup: Optional[TsbioLookup] = None,
+                       layout: Optional[CagedLayout] = None) -> Optional[pd.DataFrame]:
+    """
+    Tabela larga do CAGED (lida com header=None, dtype=str) -> uma linha por
+    município x mês: Código do Município, Ano, Mês, Estoque, Admissões, Desligamentos, Saldos.
+
+    Com `lookup`, o filtro TSBio vem ANTES da remodelagem (só os municípios mantidos são
+    remodelados); sem ele, ficam as linhas com código numérico (tira totais/vazios).
+    A remodelagem é um único gather `valores[:, colunas]` + reshape, sem laço por mês.
+    Retorna None se o cabeçalho não for o do CAGED largo.
+    """
+    if layout is None:
+        layout = detect_caged_wide(raw.head(_CAGED_LINHAS_CAB + 1).values.tolist())
+        if layout is None:
+            return None
+    dados = raw.iloc[layout.linha_cab + 2:]
+    mun = dados.iloc[:, 0]
+    if lookup is not None:
+        _, pos = match_tsbio(mun, lookup)
+        keep = pos >= 0
+    else:
+        keep = pd.to_numeric(mun.str.strip(), errors="coerce").notna().to_numpy()
+    dados = dados.loc[keep]
+    mun = mun[keep].str.strip().to_numpy(dtype=object)
+
+    # meses em ordem cronológica e municípios em ordem de código
+    ordem_m = np.lexsort((layout.meses, layout.anos))
+    ordem_l = np.argsort(mun, kind="stable")
+    colunas = layout.colunas[ordem_m]
+    n, k = len(mun), len(colunas)
+
+    bloco = dados.to_numpy(dtype=object)[ordem_l][:, colunas]  # (n, k, 4)
+    plano = pd.Series(bloco.reshape(-1), dtype=object).str.replace(".", "", regex=False)
+    valores = (pd.to_numeric(plano, errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+               .reshape(n * k, len(CAGED_METRICAS)))
+
+    out = pd.DataFrame({
+        "Código do Município": np.repeat(mun[ordem_l], k),
+        "Ano": np.tile(layout.anos[ordem_m].astype(np.int64), n),
+        "Mês": np.tile(layout.meses[ordem_m].astype(np.int64), n),
+    })
+    for j, met in enumerate(CAGED_METRICAS):
+        out[met] = valores[:, j]
+    return out
+
+def read_caged_wide(path: Path, lookup: Optional[TsbioLookup] = None,
+                    stats: Optional[Dict] = None) -> Optional[pd.DataFrame]:
+    """
+    Adaptador de ingestão (etapa 01): se o bruto tem o cabeçalho largo do CAGED, lê sem
+    cabeçalho e devolve a tabela longa já filtrada (ver `caged_wide_to_long`).
+    Retorna None (sem ler o resto do arquivo) quando o cabeçalho não é desse formato.
+    """
+    key = _sniff_key(path)
+    d, linhas = read_header_rows(path, _CAGED_LINHAS_CAB + 1)
+    layout = detect_caged_wide(linhas)
+    if layout is None:
+        return None
+    with abrir_binario(path) as f:
+        try:
+            raw = pd.read_csv(f, sep=d.sep, header=None, dtype=str, encoding=d.encoding,
+                              skiprows=d.skiprows, skip_blank_lines=False)
+        except UnicodeDecodeError:
+            d = d._replace(encoding="latin1")
+            f.seek(0)
+            raw = pd.read_csv(f, sep=d.sep, header=None, dtype=str, encoding=d.encoding,
+                              skiprows=d.skiprows, skip_blank_lines=False)
+    SNIFF_CACHE[key] = d
+    if stats is not None:
+        stats["linhas_entrada"] = max(0, len(raw) - layout.linha_cab - 2)
+    return caged_wide_to_long(raw, lookup, layout)
+
+# ---------- Colunas categóricas (metadados repetidos) ----------
+def constant_categorical(value: str, n: int) -> pd.Categorical:
+    """Coluna de `n` linhas com o mesmo texto, como categórica (1 byte por linha)."""
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[value])
+
+def concat_frames(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    `pd.concat` que mantém categóricas: o pandas só preserva a categoria quando as
+    categorias são idênticas (senão tudo vira `object`). As colunas categóricas em
+    todos os frames são unidas à parte (`union_categoricals`) e recolocadas no lugar.
+    """
+    if len(dfs) < 2:
+        return pd.concat(dfs, ignore_index=True)
+    comuns = set.intersection(*[
+        {c for c, t in d.dtypes.items() if isinstance(t, pd.CategoricalDtype)} for d in dfs
+    ])
+    if not comuns:
+        return pd.concat(dfs, ignore_index=True)
+    out = pd.concat([d.drop(columns=list(comuns)) for d in dfs], ignore_index=True)
+    for c in comuns:
+        out[c] = union_categoricals([d[c] for d in dfs])
+    # ordem de colunas igual à do pd.concat
+    ordem = list(dict.fromkeys(c for d in dfs for c in d.columns))
+    return out[ordem]
+
+# ---------- Saídas por tema: CSV + sidecar parquet ----------
+def parquet_sidecar_path(csv_path: Path) -> Optional[Path]:
+    """<OUT_PROCESSADO_CSV>/<cat>/<tema>.csv -> <OUT_PROCESSADO_PARQUET>/<cat>/<tema>.parquet."""
+    try:
+        rel = Path(csv_path).relative_to(cfg.OUT_PROCESSADO_CSV)
+    except ValueError:
+        return None
+    return cfg.OUT_PROCESSADO_PARQUET / rel.with_suffix(".parquet")
+
+def parquet_sidecar(csv_path: Path) -> Optional[Path]:
+    """Sidecar parquet do tema, se existir e não for mais antigo que o CSV (CSV editado à mão vence)."""
+    pq = parquet_sidecar_path(csv_path)
+    if pq is None or not pq.exists():
+        return None
+    csv_path = Path(csv_path)
+    if csv_path.exists() and csv_path.stat().st_mtime_ns > pq.stat().st_mtime_ns:
+        return None
+    return pq
+
+def list_processed() -> List[Path]:
+    """CSVs por tema (caminho lógico), incluindo temas que só têm o sidecar parquet."""
+    files = set(cfg.OUT_PROCESSADO_CSV.rglob("*.csv")) if cfg.OUT_PROCESSADO_CSV.exists() else set()
+    pq_dir = cfg.OUT_PROCESSADO_PARQUET
+    if pq_dir.exists():
+        files |= {cfg.OUT_PROCESSADO_CSV / p.relative_to(pq_dir).with_suffix(".csv") for p in pq_dir.rglob("*.parquet")}
+    return sorted(files)
+
+def _rel_processado(caminho: str, raiz: Path) -> Optional[str]:
+    """Caminho lógico (CSV, relativo a OUT_PROCESSADO_CSV) de uma saída listada no relatório."""
+    p = Path(caminho)
+    try:
+        rel = p.relative_to(raiz)
+    except ValueError:
+        rel = Path(*p.parts[-2:])  # relatório gravado noutra máquina/pasta: <categoria>/<arquivo>
+    return rel.with_suffix(".csv").as_posix()
+
+def processed_index() -> Dict[str, Dict[str, str]]:
+    """
+    Índice arquivo -> metadados (`indicador_id`, categoria, fonte, tema) das saídas por tema
+    (chave = caminho relativo a OUT_PROCESSADO_CSV, posix), pelo relatório de validação da
+    etapa 01. As saídas por tema não levam essas colunas (DROP_OUTPUT_COLS): com o índice,
+    a etapa 04 escolhe os temas do dashboard sem abrir os arquivos e preenche as colunas
+    nas bases. Linha sem `indicador_id` tem o id refeito de categoria/fonte/tema
+    (`build_indicador_id`).
+    """
+    if not cfg.RELATORIO_VALIDACAO.exists():
+        return {}
+    rep = pd.read_csv(cfg.RELATORIO_VALIDACAO, encoding=cfg.OUT_ENCODING, dtype=str, keep_default_na=False)
+    vazio = [""] * len(rep)
+    cats, fontes, temas = (rep[c].tolist() if c in rep.columns else vazio for c in ("categoria", "fonte", "tema"))
+    iids = rep["indicador_id"].tolist() if "indicador_id" in rep.columns else vazio
+    iids = [iid or (build_indicador_id(c, f, t) if t else "") for iid, c, f, t in zip(iids, cats, fontes, temas)]
+    idx: Dict[str, Dict[str, str]] = {}
+    for col, raiz in (("arquivo_parquet", cfg.OUT_PROCESSADO_PARQUET), ("arquivo_csv", cfg.OUT_PROCESSADO_CSV)):
+        if col in rep.columns:
+            for caminho, iid, c, f, t in zip(rep[col], iids, cats, fontes, temas):
+                if caminho and iid:
+                    idx[_rel_processado(caminho, raiz)] = {"indicador_id": iid, "categoria": c, "fonte": f, "tema": t}
+    return idx
+
+def read_processed(csv_path: Path, columns: Optional[List[str]] = None, **csv_kw) -> pd.DataFrame:
+    """Lê a saída de um tema: sidecar parquet (tipado) se houver; senão o CSV (`csv_kw` só vale aí)."""
+    pq = parquet_sidecar(csv_path)
+    if pq is not None:
+        try:
+            with abrir_binario(pq) as f:
+                return pd.read_parquet(f, columns=columns)
+        except Exception:
+            pass
+    with abrir_binario(csv_path) as f:
+        return read_csv_fast(f, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, usecols=columns, **csv_kw)
+
+def read_processed_columns(csv_path: Path) -> List[str]:
+    """Cabeçalho da saída de um tema (schema do parquet ou 1ª linha do CSV)."""
+    pq = parquet_sidecar(csv_path)
+    if pq is not None and pa is not None:
+        try:
+            import pyarrow.parquet as pa_pq
+            return list(pa_pq.read_schema(pq).names)
+        except Exception:
+            pass
+    return list(pd.read_csv(csv_path, sep=cfg.OUT_SEP, encoding=cfg.OUT_ENCODING, nrows=0).columns)
+
+# ---------- Escrita XLSX (openpyxl write-only) ----------
+XLSX_MAX_LINHAS = 1_048_576
+
+def write_xlsx_stream(df: pd.DataFrame, path: Path, sheet_name: str = "Sheet1", chunk_rows: int = 50_000) -> None:
+    """
+    Grava `df` em XLSX no modo write-only do openpyxl (memória constante: as linhas vão
+    direto para o arquivo). Mesmo conteúdo de `df.to_excel(path, index=False)`, sem o
+    cabeçalho em negrito.
+    """
+    from openpyxl import Workbook
+
+    if len(df) + 1 > XLSX_MAX_LINHAS:
+        raise ValueError(f"This sheet is too large! Your sheet size is: {len(df) + 1}, {len(df.columns)} "
+                         f"Max sheet size is: {XLSX_MAX_LINHAS}, 16384")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append([str(c) for c in df.columns])
+    for i in range(0, len(df), chunk_rows):
+        bloco = df.iloc[i:i + chunk_rows].astype(object)
+        for row in bloco.where(bloco.notna(), None).to_numpy().tolist():
+            ws.append(row)
+    wb.save(path)
+
 # ---------- Dicionário oficial de nomes ----------
 _UNIT_SUFFIX_MAP = {
     "%": "perc",
@@ -154,6 +1189,41 @@ def load_dictionary(path: Path) -> Dict[str, str]:
                 syn_map[ss] = canonical
     return syn_map
 
+# `dtype` do dicionário -> dtype de leitura (inteiros anuláveis: brutos têm células vazias)
+_DTYPE_DICIONARIO = {"string": "string", "int": "Int32", "float": "float64"}
+_DTYPE_INT_CANONICO = {"ano": "Int16", "mes": "Int8"}
+
+def load_dtype_plan(path: Path) -> Dict[str, str]:
+    """
+    Plano de tipos pela coluna `dtype` do dicionário: canonical -> dtype do `read_csv`.
+    - `string`, `string(7)`, `string(2)` -> "string" (código de município lido como texto,
+      sem passar por float);
+    - `int` -> inteiro anulável (ano Int16, mes Int8, demais Int32);
+    - `float` -> float64.
+    Tipos ambíguos (`string/num`) ficam fora do plano e seguem inferidos.
+    """
+    if not path.exists():
+        return {}
+    df = pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    if "dtype" not in df.columns:
+        return {}
+    plano: Dict[str, str] = {}
+    for canonical, t in zip(df["canonical"].str.strip(), df["dtype"].str.strip().str.lower()):
+        base = re.sub(r"\(\d+\)$", "", t)
+        tipo = _DTYPE_DICIONARIO.get(base)
+        if canonical and tipo:
+            plano[canonical] = _DTYPE_INT_CANONICO.get(canonical, tipo) if base == "int" else tipo
+    return plano
+
+def load_column_kinds(path: Path) -> Dict[str, str]:
+    """Papel de cada coluna canônica pela coluna `kind` do dicionário (id | time | meta | measure)."""
+    if not path.exists():
+        return {}
+    df = pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    if "kind" not in df.columns:
+        return {}
+    return {c: k for c, k in zip(df["canonical"].str.strip(), df["kind"].str.strip().str.lower()) if c and k}
+
 def normalize_column_name(col: str, syn_map: Dict[str, str]) -> str:
     """
     1) Se bater no dicionário -> canonical